@@ -1,103 +1,265 @@
 #!/usr/bin/env python3
 """
 Markdown 문법 오류 자동 교정 스크립트
-mk_250924.json 파일의 reason과 content 필드에서 **가 줄바꿈과 함께 사용되어 닫히지 않는 문제를 수정
+시나리오 JSON 파일의 reason과 content 필드에서 **가 줄바꿈과 함께 사용되어 닫히지 않는 문제를 수정
+문자열을 줄 단위로 한 번만 훑으며, 규칙(--rules)을 추가로 선택할 수 있습니다.
+
+사용법:
+    python fix_markdown.py                                   # src/data/mk_250924.json, bold 규칙
+    python fix_markdown.py src/data/ljy_250923.json --rules bold,italic,code,list
+    python fix_markdown.py --verify src/data/*.json input_json/*.json
 """
 
+import argparse
 import json
+import random
 import re
 import sys
-from typing import Any, Dict
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_FILE = 'src/data/mk_250924.json'
+FIXED_FIELDS = ('reason', 'content')
+
+@dataclass(frozen=True)
+class MarkdownRule:
+    """
+    교정 규칙. fix_pair는 현재 줄과 다음 줄을 함께 보고 두 줄을 고친 결과를
+    돌려주거나(다음 줄은 소비됨) 해당 없으면 None, fix_line은 공백을 정리한 한 줄을 고칩니다.
+    """
+    name: str
+    description: str
+    fix_pair: Optional[Callable[[str, str], Optional[Tuple[str, str]]]] = None
+    fix_line: Optional[Callable[[str], str]] = None
+
+def close_bold_across_lines(line: str, next_line: str) -> Optional[Tuple[str, str]]:
+    """
+    "**텍스트" 다음 줄이 "**다른텍스트"이면 두 줄을 각각 닫습니다.
+    줄의 마지막 *가 여는 **이고 그 뒤에 글자가 있으며, 다음 줄이 **로 시작하고
+    다른 *가 없을 때만 해당합니다.
+    """
+    star = line.rfind('*')
+    if star < 1 or line[star - 1] != '*' or star + 1 == len(line):
+        return None
+    if not next_line.startswith('**') or next_line.find('*', 2) != -1:
+        return None
+    return f"{line[:star - 1]}**{line[star + 1:].strip()}**", f"**{next_line[2:].strip()}**"
+
+def close_unclosed_bold(line: str) -> str:
+    """**로 시작하지만 닫히지 않은 줄: **텍스트 → **텍스트**"""
+    if line.startswith('**') and not line.endswith('**') and line.find('**', 2) == -1:
+        return line + '**'
+    return line
+
+def close_unclosed_italic(line: str) -> str:
+    """*로 시작하지만 닫히지 않은 줄: *텍스트 → *텍스트* (**, 목록 표시 "* "는 제외)"""
+    if len(line) > 1 and line[0] == '*' and line[1] not in '* ' and line.find('*', 1) == -1:
+        return line + '*'
+    return line
+
+def close_code_span(line: str) -> str:
+    """백틱 수가 홀수인 줄의 코드 스팬을 닫습니다 (``` 코드 블록 줄은 제외)"""
+    if line.count('`') % 2 and not line.startswith('```'):
+        return line + '`'
+    return line
+
+LIST_MARKER_WITHOUT_SPACE = re.compile(r'(?:-|\+|\d{1,3}[.)])(?=[^\s\d.)+\-])')
+
+def space_list_marker(line: str) -> str:
+    """띄어쓰기가 빠진 목록 표시: -항목 → - 항목, 1.항목 → 1. 항목 (---, -1, 1.5는 그대로)"""
+    match = LIST_MARKER_WITHOUT_SPACE.match(line)
+    return f"{line[:match.end()]} {line[match.end():]}" if match else line
+
+RULES = {
+    'bold': MarkdownRule('bold', '**텍스트\\n**다른텍스트 → **텍스트**\\n**다른텍스트**, **텍스트 → **텍스트**',
+                         fix_pair=close_bold_across_lines, fix_line=close_unclosed_bold),
+    'italic': MarkdownRule('italic', '*텍스트 → *텍스트*', fix_line=close_unclosed_italic),
+    'code': MarkdownRule('code', '`코드 → `코드`', fix_line=close_code_span),
+    'list': MarkdownRule('list', '-항목 → - 항목, 1.항목 → 1. 항목', fix_line=space_list_marker),
+}
+DEFAULT_RULES = ('bold',)
+
+class MarkdownFixer:
+    """
+    선택한 규칙들을 한 번의 줄 단위 스캔으로 적용합니다. 줄마다 pair 규칙(다음 줄
+    참조)을 먼저 보고, 앞뒤 공백을 제거한 뒤 line 규칙을 순서대로 적용합니다.
+    """
+
+    def __init__(self, rule_names: Sequence[str] = DEFAULT_RULES):
+        unknown = [name for name in rule_names if name not in RULES]
+        if unknown:
+            raise ValueError(f"알 수 없는 규칙: {', '.join(unknown)} (가능: {', '.join(RULES)})")
+        rules = [RULES[name] for name in rule_names]
+        self.pair_fixes = tuple(rule.fix_pair for rule in rules if rule.fix_pair)
+        self.line_fixes = tuple(rule.fix_line for rule in rules if rule.fix_line)
+
+    def finish_line(self, line: str) -> str:
+        line = line.strip()
+        for fix_line in self.line_fixes:
+            line = fix_line(line)
+        return line
+
+    def fix(self, text: str) -> str:
+        if not isinstance(text, str):
+            return text
+
+        lines = text.split('\n')
+        fixed_lines = []
+        i = 0
+        while i < len(lines):
+            pair = None
+            if i + 1 < len(lines):
+                for fix_pair in self.pair_fixes:
+                    pair = fix_pair(lines[i], lines[i + 1])
+                    if pair is not None:
+                        break
+            if pair is None:
+                fixed_lines.append(self.finish_line(lines[i]))
+                i += 1
+            else:
+                # 다음 줄은 함께 고쳐졌으므로 건너뜀
+                fixed_lines.extend(self.finish_line(line) for line in pair)
+                i += 2
+
+        return '\n'.join(fixed_lines)
+
+_bold_fixer = MarkdownFixer()
 
 def fix_markdown_bold(text: str) -> str:
     """
     잘못된 Markdown bold 문법을 수정합니다.
-    
+
     문제: "**text\n**more text"
     수정: "**text**\n**more text**"
     """
+    return _bold_fixer.fix(text)
+
+def fix_markdown_bold_regex(text: str) -> str:
+    """
+    이전 정규식 구현 (고정점까지 re.sub 반복 후 줄 단위 처리).
+    --verify에서 fix_markdown_bold와 결과를 비교하는 기준으로만 사용합니다.
+    """
     if not isinstance(text, str):
         return text
-    
-    # 패턴: ** 시작 후 줄바꿈이 있고 다른 **로 시작하는 줄이 있는 경우
+
     pattern = r'\*\*([^*\n]+)\n\*\*([^*]*?)(?=\n|$)'
-    
+
     def replace_func(match):
-        first_part = match.group(1).strip()
-        second_part = match.group(2).strip()
-        
-        # 첫 번째 부분을 닫고, 두 번째 부분을 새로 시작
-        return f"**{first_part}**\n**{second_part}**"
-    
-    # 반복적으로 적용하여 연속된 패턴도 처리
+        return f"**{match.group(1).strip()}**\n**{match.group(2).strip()}**"
+
     fixed_text = text
     prev_text = ""
-    
     while prev_text != fixed_text:
         prev_text = fixed_text
         fixed_text = re.sub(pattern, replace_func, fixed_text)
-    
-    # 마지막에 **로 시작하지만 닫히지 않은 경우 처리
-    # 패턴: **text (끝에 ** 없음)
-    lines = fixed_text.split('\n')
+
     fixed_lines = []
-    
-    for line in lines:
+    for line in fixed_text.split('\n'):
         line = line.strip()
         if line.startswith('**') and not line.endswith('**') and '**' not in line[2:]:
-            # **로 시작하지만 닫히지 않은 경우
             line = line + '**'
         fixed_lines.append(line)
-    
+
     return '\n'.join(fixed_lines)
 
-def fix_json_object(obj: Any) -> Any:
+def fix_json_object(obj: Any, fixer: Optional[MarkdownFixer] = None) -> Any:
     """
     JSON 객체를 재귀적으로 순회하며 문자열 필드의 Markdown을 수정합니다.
     """
+    fix = fixer.fix if fixer else fix_markdown_bold
     if isinstance(obj, dict):
         for key, value in obj.items():
-            if key in ['reason', 'content'] and isinstance(value, str):
-                obj[key] = fix_markdown_bold(value)
+            if key in FIXED_FIELDS and isinstance(value, str):
+                obj[key] = fix(value)
             else:
-                obj[key] = fix_json_object(value)
+                obj[key] = fix_json_object(value, fixer)
     elif isinstance(obj, list):
         for i, item in enumerate(obj):
-            obj[i] = fix_json_object(item)
-    
+            obj[i] = fix_json_object(item, fixer)
+
     return obj
 
-def main():
-    input_file = 'src/data/mk_250924.json'
+def iter_fixed_fields(obj: Any) -> Iterator[str]:
+    """교정 대상(reason, content) 문자열을 모두 돌려줍니다."""
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if key in FIXED_FIELDS and isinstance(value, str):
+                yield value
+            else:
+                yield from iter_fixed_fields(value)
+    elif isinstance(obj, list):
+        for item in obj:
+            yield from iter_fixed_fields(item)
+
+def mutations(text: str, rng: random.Random, count: int) -> Iterator[str]:
+    """실제 문장에서 **, 줄바꿈, 공백을 무작위로 넣거나 지운 변형들"""
+    edits = ('**', '*', '\n', '\n**', ' ')
+    for _ in range(count):
+        mutated = text
+        for _ in range(rng.randint(1, 4)):
+            pos = rng.randint(0, len(mutated))
+            if mutated and rng.random() < 0.4:
+                mutated = mutated[:pos] + mutated[pos + 1:]
+            else:
+                mutated = mutated[:pos] + rng.choice(edits) + mutated[pos:]
+        yield mutated
+
+def verify(file_paths: List[str], mutation_count: int, seed: int = 0) -> bool:
+    """
+    파일들의 reason/content 문자열과 그 변형들에 대해 fix_markdown_bold가
+    이전 정규식 구현과 같은 결과를 내는지 확인하고 두 구현의 시간을 비교합니다.
+    """
+    corpus = []
+    for file_path in file_paths:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            corpus.extend(iter_fixed_fields(json.load(f)))
+    rng = random.Random(seed)
+    corpus.extend([mutated for text in corpus for mutated in mutations(text, rng, mutation_count)])
+
+    mismatches = 0
+    for text in corpus:
+        expected = fix_markdown_bold_regex(text)
+        if fix_markdown_bold(text) != expected:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"❌ 결과 불일치: {text[:80]!r}")
+
+    timings = {}
+    for name, fix in (('정규식', fix_markdown_bold_regex), ('스캐너', fix_markdown_bold)):
+        start = time.perf_counter()
+        for text in corpus:
+            fix(text)
+        timings[name] = time.perf_counter() - start
+    print(f"✓ 문자열 {len(corpus)}개 검사 (파일 {len(file_paths)}개, 변형 포함): 불일치 {mismatches}개")
+    print("  " + ', '.join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in timings.items()))
+    return mismatches == 0
+
+def fix_file(input_file: str, fixer: MarkdownFixer) -> None:
     backup_file = f'{input_file}.backup'
-    
+
     try:
         # 원본 파일 백업
         with open(input_file, 'r', encoding='utf-8') as f:
             original_content = f.read()
-        
+
         with open(backup_file, 'w', encoding='utf-8') as f:
             f.write(original_content)
-        
+
         print(f"✓ 백업 파일 생성: {backup_file}")
-        
+
         # JSON 파싱
         data = json.loads(original_content)
-        
+
         # Markdown 교정
-        fixed_data = fix_json_object(data)
-        
+        fixed_data = fix_json_object(data, fixer)
+
         # 수정된 내용을 파일에 쓰기
         with open(input_file, 'w', encoding='utf-8') as f:
             json.dump(fixed_data, f, ensure_ascii=False, indent=2)
-        
+
         print(f"✓ Markdown 문법 교정 완료: {input_file}")
-        
-        # 변경사항 요약 출력
-        print("\n수정된 패턴:")
-        print("- **텍스트\\n**다른텍스트 → **텍스트**\\n**다른텍스트**")
-        print("- **텍스트 (닫히지 않음) → **텍스트**")
-        
+
     except FileNotFoundError:
         print(f"❌ 파일을 찾을 수 없습니다: {input_file}")
         sys.exit(1)
@@ -114,5 +276,38 @@ def main():
         print(f"✓ 백업에서 복원됨: {input_file}")
         sys.exit(1)
 
+def main():
+    parser = argparse.ArgumentParser(description="시나리오 JSON의 reason/content 필드 Markdown 교정")
+    parser.add_argument('files', nargs='*', default=[DEFAULT_FILE],
+                        help=f'교정할 JSON 파일 (기본: {DEFAULT_FILE})')
+    parser.add_argument('--rules', default=','.join(DEFAULT_RULES),
+                        help=f"쉼표로 구분한 규칙: {', '.join(RULES)} (기본: {','.join(DEFAULT_RULES)})")
+    parser.add_argument('--verify', action='store_true',
+                        help='파일을 고치지 않고, bold 교정 결과가 이전 정규식 구현과 같은지 확인')
+    parser.add_argument('--mutations', type=int, default=20,
+                        help='--verify에서 문자열마다 만들 무작위 변형 수 (기본: 20)')
+    args = parser.parse_args()
+
+    if args.verify:
+        try:
+            sys.exit(0 if verify(args.files, args.mutations) else 1)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"❌ 오류 발생: {e}")
+            sys.exit(1)
+
+    rule_names = [name.strip() for name in args.rules.split(',') if name.strip()]
+    try:
+        fixer = MarkdownFixer(rule_names)
+    except ValueError as e:
+        parser.error(str(e))
+
+    for input_file in args.files:
+        fix_file(input_file, fixer)
+
+    # 변경사항 요약 출력
+    print("\n수정된 패턴:")
+    for name in rule_names:
+        print(f"- {RULES[name].description}")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,2329 @@
+"""
+Scenario steps: loading, validating, editing, indexing, diffing and merging
+scenario JSON files.
+
+This module holds the implementation behind manage_steps.py. It lives in an
+importable module so Python caches its bytecode; manage_steps.py is only the
+command-line entry point. See manage_steps.py for usage.
+"""
+
+import argparse
+import base64
+import bisect
+import contextlib
+import hashlib
+import importlib.util
+import inspect
+import io
+import json
+import mmap
+import os
+import re
+import signal
+import socketserver
+import sys
+import tempfile
+from typing import Dict, List, Any, Callable, Iterable, Iterator, Optional, Set, Tuple, Union, get_args, get_origin
+from dataclasses import MISSING, dataclass, fields
+from enum import Enum
+
+
+# Query index cache: one JSON file per scenario file, invalidated by size/mtime and content hash
+INDEX_VERSION = 2
+DEFAULT_INDEX_DIR = '.cache/manage-steps'
+
+# Where root-relative audio URLs such as /assets/deployed/abc.mp3 are served from
+DEFAULT_PUBLIC_DIR = 'public'
+
+# Step fields with a posting list in the index ('type' is the step type, the rest are action fields)
+INDEXED_FIELDS = ('type', 'from', 'to', 'senderType', 'service')
+
+
+class MessageType(str, Enum):
+    VOICE = "voice"
+    TEXT = "text"
+    DTMF = "dtmf"
+    IMAGE = "image"
+
+
+class SenderType(str, Enum):
+    AGENT = "agent"
+    CUSTOMER = "customer"
+    SERVER = "server"
+
+
+@dataclass(slots=True)
+class Message:
+    """Message data structure"""
+    from_: str
+    to: str
+    timestamp: int
+    content: str
+    type: MessageType
+    senderType: SenderType
+    id: Optional[str] = None
+    reason: Optional[str] = None
+    callSession: Optional[Dict[str, Any]] = None
+    imageUrl: Optional[str] = None
+    imageWidth: Optional[int] = None  # written by deploy-assets.py --optimize-images
+    imageHeight: Optional[int] = None
+    imageSrcSet: Optional[str] = None
+    audioUrl: Optional[str] = None
+    audioSources: Optional[List[Dict[str, Any]]] = None  # written by deploy-assets.py --transcode-audio
+    audioDuration: Optional[int] = None
+
+
+@dataclass(slots=True)
+class Call:
+    """Call data structure"""
+    from_: str
+    to: str
+    timestamp: int
+    reason: Optional[str] = None
+    senderType: Optional[SenderType] = None
+    id: Optional[str] = None
+
+
+@dataclass(slots=True)
+class APICall:
+    """API call data structure"""
+    from_: str
+    to: str
+    timestamp: int
+    service: str
+    request: str
+    reason: Optional[str] = None
+    senderType: Optional[SenderType] = None
+    id: Optional[str] = None
+
+
+@dataclass(slots=True)
+class APIResponse:
+    """API response data structure"""
+    from_: str
+    to: str
+    timestamp: int
+    service: str
+    response: str
+    reason: Optional[str] = None
+    senderType: Optional[SenderType] = None
+    id: Optional[str] = None
+
+
+class StepType(str, Enum):
+    SEND_MESSAGE = "send-message"
+    MAKE_CALL = "make-call"
+    ACCEPT_CALL = "accept-call"
+    FINISH_CALL = "finish-call"
+    API_CALL = "api-call"
+    API_RESPONSE = "api-response"
+
+
+@dataclass(slots=True)
+class AgenticStep:
+    """Base class for agentic steps"""
+    type: StepType
+    action: Union[Message, Call, APICall, APIResponse]
+
+
+@dataclass(slots=True)
+class FieldSpec:
+    """Compiled check for one action field, derived from the action dataclass"""
+    attribute: str  # dataclass attribute, e.g. from_
+    name: str  # JSON key, e.g. from
+    required: bool
+    kinds: Tuple[type, ...]
+    choices: Optional[frozenset] = None
+    enum: Optional[type] = None
+
+    def check(self, value: Any) -> Optional[str]:
+        """Return an error message for value, or None when it is valid"""
+        if not isinstance(value, self.kinds) or value is True or value is False:
+            expected = ' or '.join(dict.fromkeys(SCHEMA_TYPE_NAMES[kind] for kind in self.kinds))
+            return f"expected {expected}, got {json_type_name(value)}"
+        if self.choices is not None and value not in self.choices:
+            return f"must be one of {', '.join(sorted(self.choices))}, got {value!r}"
+        return None
+
+
+@dataclass(slots=True)
+class StepSchema:
+    """Compiled validator and serializer for one StepType"""
+    step_type: StepType
+    action_class: type
+    fields: Tuple[FieldSpec, ...]  # output order: from, to, timestamp, id, then the class order
+    by_name: Dict[str, FieldSpec]
+
+
+SCHEMA_TYPE_NAMES = {str: 'string', int: 'number', float: 'number', dict: 'object', list: 'array'}
+
+# Fields every Deliverable writes first, whatever their position in the dataclass
+LEADING_ACTION_FIELDS = ('from', 'to', 'timestamp', 'id')
+
+
+def json_type_name(value: Any) -> str:
+    """JSON type name of a parsed value, for error messages"""
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'boolean'
+    return SCHEMA_TYPE_NAMES.get(type(value), type(value).__name__)
+
+
+def compile_step_schema(step_type: StepType, action_class: type) -> StepSchema:
+    """Build the field checks for a step type from its action dataclass annotations"""
+    specs = []
+    for field in fields(action_class):
+        annotation = field.type
+        if get_origin(annotation) is Union:  # Optional[X]
+            annotation = next(arg for arg in get_args(annotation) if arg is not type(None))
+        base = get_origin(annotation) or annotation
+        spec = FieldSpec(
+            attribute=field.name,
+            name=field.name.rstrip('_'),
+            required=field.default is MISSING and field.default_factory is MISSING,
+            kinds=(int, float) if base is int else (base,),
+        )
+        if isinstance(base, type) and issubclass(base, Enum):
+            spec.kinds = (str,)
+            spec.choices = frozenset(member.value for member in base)
+            spec.enum = base
+        specs.append(spec)
+
+    specs.sort(key=lambda spec: LEADING_ACTION_FIELDS.index(spec.name)
+               if spec.name in LEADING_ACTION_FIELDS else len(LEADING_ACTION_FIELDS))
+    return StepSchema(step_type, action_class, tuple(specs), {spec.name: spec for spec in specs})
+
+
+STEP_ACTION_CLASSES = (
+    (StepType.SEND_MESSAGE, Message),
+    (StepType.MAKE_CALL, Call),
+    (StepType.ACCEPT_CALL, Call),
+    (StepType.FINISH_CALL, Call),
+    (StepType.API_CALL, APICall),
+    (StepType.API_RESPONSE, APIResponse),
+)
+
+_step_schemas: Optional[Dict[StepType, StepSchema]] = None
+
+
+def step_schemas() -> Dict[StepType, StepSchema]:
+    """
+    Schemas for every StepType, compiled on first use so read-only commands do
+    not pay for them. StepType is a str Enum, so plain strings from JSON look
+    these up directly.
+    """
+    global _step_schemas
+    if _step_schemas is None:
+        _step_schemas = {step_type: compile_step_schema(step_type, action_class)
+                         for step_type, action_class in STEP_ACTION_CLASSES}
+    return _step_schemas
+
+
+@dataclass
+class ScenarioSource:
+    """Original bytes of a loaded scenario file, kept so edits can be spliced back into them"""
+    raw: bytes
+    hasher: 'IdentityHasher'  # fingerprints below were taken with it
+    headers: Dict[str, Tuple[Any, str]]  # top-level key -> scenario_header as loaded, in file order
+    original_steps: Dict[str, List[Any]]  # scenario key -> step objects as loaded
+    step_fingerprints: Dict[str, List[str]]  # scenario key -> fingerprint of each step as loaded
+
+
+def load_scenario_json(file_path: str) -> Dict[str, Any]:
+    """Load scenario JSON file"""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"File not found: {file_path}")
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON format: {e}")
+
+
+def load_scenario_document(file_path: str) -> Tuple[Dict[str, Any], ScenarioSource]:
+    """Load scenario JSON file and keep its source bytes for save_scenario_json's splice fast path"""
+    try:
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+    except FileNotFoundError:
+        raise FileNotFoundError(f"File not found: {file_path}")
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON format: {e}")
+    except UnicodeDecodeError as e:
+        raise ValueError(f"Invalid JSON encoding: {e}")
+
+    return data, scenario_source(raw, data)
+
+
+def scenario_header(value: Any, hasher: 'IdentityHasher') -> Tuple[Any, str]:
+    """Everything of a top-level value except its steps array: member order and a fingerprint"""
+    if isinstance(value, dict) and isinstance(value.get('steps'), list):
+        return tuple(value), hasher.fingerprint({key: item for key, item in value.items() if key != 'steps'})
+    return None, hasher.fingerprint(value)
+
+
+def scenario_source(raw: bytes, data: Dict[str, Any]) -> ScenarioSource:
+    """Remember raw (the file bytes data was parsed from or saved as) for later splicing"""
+    hasher = IdentityHasher()
+    headers = {key: scenario_header(value, hasher) for key, value in data.items()}
+    original_steps = {key: list(value['steps']) for key, value in data.items()
+                      if isinstance(value, dict) and isinstance(value.get('steps'), list)}
+    step_fingerprints = {key: [hasher.fingerprint(step) for step in steps] for key, steps in original_steps.items()}
+    return ScenarioSource(raw, hasher, headers, original_steps, step_fingerprints)
+
+
+def write_bytes_atomic(file_path: str, chunks: Iterable[bytes], fsync: bool = True) -> None:
+    """
+    Write chunks through a temp file in the same directory, fsync it and rename
+    it into place, so an interrupted run leaves either the old or the new file.
+    """
+
+    directory = os.path.dirname(os.path.abspath(file_path))
+    os.makedirs(directory, exist_ok=True)
+    try:
+        mode = os.stat(file_path).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o644
+    fd, tmp_name = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(file_path) + '.', suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.chmod(tmp_name, mode)  # mkstemp creates 0600 files
+        os.replace(tmp_name, file_path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
+    if fsync:
+        # Persist the rename itself (directories cannot be opened on every platform)
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
+
+
+def save_scenario_json(file_path: str, data: Dict[str, Any], source: Optional[ScenarioSource] = None) -> None:
+    """
+    Save scenario JSON file with proper formatting. With the source of a document
+    from load_scenario_document, only changed steps arrays are re-serialized and
+    spliced into the original bytes when nothing else in the document changed.
+    """
+    try:
+        chunks = splice_steps(source, data) if source is not None else None
+        spliced = chunks is not None
+        if chunks is None:
+            chunks = [json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')]
+        write_bytes_atomic(file_path, chunks)
+        print(f"Successfully saved to {file_path}{' (steps spliced in place)' if spliced else ''}")
+    except Exception as e:
+        raise Exception(f"Failed to save file: {e}")
+
+
+# Minimal JSON scanner used to locate byte ranges without building objects (raw may
+# be bytes or an mmap).
+# Pretty-printed files take a fast path: JSON strings cannot contain raw newlines,
+# so a container opened at the end of a line closes at the first line holding only
+# the opener line's indentation plus the closing bracket.
+_WHITESPACE = re.compile(rb'[ \t\n\r]*')
+_INDENT = re.compile(rb'[ \t]*')
+_SCALAR = re.compile(rb'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?|true|false|null')
+_BRACKETS = {ord('{'): ord('}'), ord('['): ord(']'), ord('"'): ord('"')}
+
+
+def skip_whitespace(raw: bytes, pos: int) -> int:
+    return _WHITESPACE.match(raw, pos).end()
+
+
+def line_indent(raw: bytes, pos: int) -> bytes:
+    """Leading whitespace of the line containing pos"""
+    line_start = raw.rfind(b'\n', 0, pos) + 1
+    return _INDENT.match(raw, line_start).group()
+
+
+def skip_string(raw: bytes, pos: int) -> int:
+    """End offset of the JSON string starting at pos (finds the closing quote with bytes.find)"""
+    end = pos + 1
+    while True:
+        end = raw.find(b'"', end)
+        if end < 0:
+            raise ValueError(f"Unterminated string at offset {pos}")
+        backslashes = 0
+        while raw[end - 1 - backslashes] == 0x5C:  # backslash
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return end + 1
+        end += 1
+
+
+def skip_value(raw: bytes, pos: int) -> int:
+    """End offset of the JSON value starting at pos"""
+    char = raw[pos:pos + 1]
+    if char == b'"':
+        return skip_string(raw, pos)
+    if char in (b'{', b'['):
+        if raw[pos + 1:pos + 2] == b'\n':
+            closing = b'\n' + line_indent(raw, pos) + (b'}' if char == b'{' else b']')
+            end = raw.find(closing, pos)
+            if end >= 0:
+                return end + len(closing)
+        return scan_object(raw, pos)[1] if char == b'{' else scan_array(raw, pos)[1]
+    match = _SCALAR.match(raw, pos)
+    if not match:
+        raise ValueError(f"Unexpected character {char!r} at offset {pos}")
+    return match.end()
+
+
+def scan_members(raw: bytes, pos: int, visit: Callable[[str, int], Optional[int]]) -> int:
+    """
+    Call visit(key, value start) for each member of the object starting at pos.
+    visit returns the value's end offset when it scanned the value itself, or
+    None to have it skipped. Returns the end offset of the object.
+    """
+    pos = skip_whitespace(raw, pos + 1)
+    if raw[pos:pos + 1] == b'}':
+        return pos + 1
+    while True:
+        key_end = skip_string(raw, pos)
+        key = json.loads(raw[pos:key_end])
+        pos = skip_whitespace(raw, key_end)
+        if raw[pos:pos + 1] != b':':
+            raise ValueError(f"Expected ':' at offset {pos}")
+        start = skip_whitespace(raw, pos + 1)
+        end = visit(key, start)
+        pos = skip_whitespace(raw, skip_value(raw, start) if end is None else end)
+        if raw[pos:pos + 1] == b'}':
+            return pos + 1
+        if raw[pos:pos + 1] != b',':
+            raise ValueError(f"Expected ',' or '}}' at offset {pos}")
+        pos = skip_whitespace(raw, pos + 1)
+
+
+def scan_elements(raw: bytes, pos: int, visit: Callable[[int, int], Optional[int]]) -> int:
+    """Array counterpart of scan_members: visit(index, element start) for each element"""
+    pos = skip_whitespace(raw, pos + 1)
+    if raw[pos:pos + 1] == b']':
+        return pos + 1
+    index = 0
+    while True:
+        end = visit(index, pos)
+        pos = skip_whitespace(raw, skip_value(raw, pos) if end is None else end)
+        if raw[pos:pos + 1] == b']':
+            return pos + 1
+        if raw[pos:pos + 1] != b',':
+            raise ValueError(f"Expected ',' or ']' at offset {pos}")
+        pos = skip_whitespace(raw, pos + 1)
+        index += 1
+
+
+def scan_object(raw: bytes, pos: int) -> Tuple[List[Tuple[str, int, int]], int]:
+    """Return ([(key, value start, value end)], end offset) for the object starting at pos"""
+    members = []
+
+    def record(key: str, start: int) -> int:
+        end = skip_value(raw, start)
+        members.append((key, start, end))
+        return end
+
+    return members, scan_members(raw, pos, record)
+
+
+def scan_array(raw: bytes, pos: int) -> Tuple[List[Tuple[int, int]], int]:
+    """Return ([(element start, element end)], end offset) for the array starting at pos"""
+    elements = []
+
+    def record(index: int, start: int) -> int:
+        end = skip_value(raw, start)
+        elements.append((start, end))
+        return end
+
+    return elements, scan_elements(raw, pos, record)
+
+
+def array_elements(raw: bytes, start: int, end: int) -> List[Tuple[int, int]]:
+    """Element spans of the array raw[start:end], found line by line when it is pretty-printed"""
+    first = skip_whitespace(raw, start + 1)
+    if first == end - 1:
+        return []
+    indent = raw[raw.rfind(b'\n', start, first) + 1:first]
+    if not indent or raw[start + 1:start + 2] != b'\n':
+        return scan_array(raw, start)[0]
+
+    # Lines at exactly the element indentation start an element unless they close one
+    element_line = re.compile(b'\n' + re.escape(indent) + rb'(?![ \t}\]])')
+    starts = [match.end() for match in element_line.finditer(raw, start, end)]
+    separator = len(indent) + 2  # b',\n' + indent
+    ends = [next_start - separator for next_start in starts[1:]]
+    ends.append(end - len(line_indent(raw, end - 1)) - 2)
+    if any(raw[element_end] != 0x2C for element_end in ends[:-1]):  # comma
+        return scan_array(raw, start)[0]
+    # Containers and strings must close with their own bracket; anything else is a scalar
+    elements = [(element_start, element_end) for element_start, element_end in zip(starts, ends)]
+    for element_start, element_end in elements:
+        opener = raw[element_start]
+        if raw[element_end - 1] != _BRACKETS.get(opener, raw[element_end - 1]):
+            return scan_array(raw, start)[0]
+    return elements
+
+
+def render_steps(raw: bytes, start: int, end: int, elements: List[Tuple[int, int]], old_steps: List[Any],
+                 old_fingerprints: List[str], new_steps: List[Any], hasher: 'IdentityHasher') -> List[bytes]:
+    """
+    Rebuild a steps array as chunks: steps still present unchanged are views of the
+    original bytes, new or modified ones are serialized in json.dump(indent=2) style.
+    Raises ValueError unless the original array is newline-indented (compact files
+    are not spliced) or if the rebuilt array does not parse back to new_steps.
+    """
+    if not elements or raw[start + 1:start + 2] != b'\n':
+        raise ValueError("steps array is not newline-indented")
+    # Element indentation and closing indentation, taken from the original layout
+    indent = raw[start + 2:elements[0][0]]
+    if not indent or indent.strip(b' \t'):
+        raise ValueError("steps array elements are not indented with spaces or tabs")
+    if not new_steps:
+        return [b'[]']
+    closing = line_indent(raw, end - 1)
+    separator = b',\n' + indent
+
+    view = memoryview(raw)
+    reusable = {id(step): i for i, step in enumerate(old_steps)}
+    pieces = []  # [first, last] runs of consecutive original elements, or serialized bytes
+    for step in new_steps:
+        i = reusable.get(id(step))
+        # Identity says where it came from; the fingerprint catches in-place edits
+        if i is None or hasher.fingerprint(step) != old_fingerprints[i]:
+            text = json.dumps(step, ensure_ascii=False, indent=2)
+            pieces.append(text.replace('\n', '\n' + indent.decode('ascii')).encode('utf-8'))
+        elif pieces and isinstance(pieces[-1], list) and pieces[-1][1] == i - 1:
+            pieces[-1][1] = i
+        else:
+            pieces.append([i, i])
+
+    chunks = [b'[\n' + indent]
+    check = [b'[']  # the same array with reused runs as 0 placeholders
+    for position, piece in enumerate(pieces):
+        if position:
+            chunks.append(separator)
+            check.append(separator)
+        if isinstance(piece, list):
+            # A run's view includes the original separators between its elements
+            chunks.append(view[elements[piece[0]][0]:elements[piece[1]][1]])
+            check.append(b','.join([b'0'] * (piece[1] - piece[0] + 1)))
+        else:
+            chunks.append(piece)
+            check.append(piece)
+    chunks.append(b'\n' + closing + b']')
+    check.append(b']')
+
+    # Parse back only what was re-rendered plus the array's own punctuation
+    expected = []
+    for piece in pieces:
+        if isinstance(piece, list):
+            expected.extend([0] * (piece[1] - piece[0] + 1))
+        else:
+            expected.append(new_steps[len(expected)])
+    if json.loads(b''.join(check)) != expected:
+        raise ValueError("re-rendered steps array does not parse back to the edited steps")
+    return chunks
+
+
+def steps_changed(source: ScenarioSource, key: str, steps: List[Any]) -> bool:
+    old = source.original_steps[key]
+    if len(steps) != len(old) or any(step is not original for step, original in zip(steps, old)):
+        return True
+    return any(source.hasher.fingerprint(step) != fingerprint
+               for step, fingerprint in zip(steps, source.step_fingerprints[key]))
+
+
+def splice_steps(source: ScenarioSource, data: Dict[str, Any]) -> Optional[List[bytes]]:
+    """
+    Return the original bytes as chunks with only the changed steps arrays
+    rewritten, or None when anything outside the steps arrays changed or the
+    original layout cannot be located (the caller then does a full dump).
+    """
+    if not isinstance(data, dict) or list(data) != list(source.headers):
+        return None
+
+    changed = []
+    for key, value in data.items():
+        if scenario_header(value, source.hasher) != source.headers[key]:
+            return None
+        if key in source.original_steps and steps_changed(source, key, value['steps']):
+            changed.append(key)
+
+    raw = source.raw
+    if not changed:
+        return [raw]
+    try:
+        root_members, _ = scan_object(raw, skip_whitespace(raw, 0))
+        replacements = []
+        for key, value_start, _ in root_members:
+            if key not in changed:
+                continue
+            members, _ = scan_object(raw, value_start)
+            steps_start, steps_end = next((start, end) for name, start, end in members if name == 'steps')
+            elements = array_elements(raw, steps_start, steps_end)
+            if len(elements) != len(source.original_steps[key]):
+                return None
+            replacements.append((steps_start, steps_end, render_steps(
+                raw, steps_start, steps_end, elements, source.original_steps[key],
+                source.step_fingerprints[key], data[key]['steps'], source.hasher)))
+    except (ValueError, IndexError, StopIteration, UnicodeDecodeError):
+        return None
+
+    view = memoryview(raw)
+    chunks = []
+    pos = 0
+    for start, end, rendered in sorted(replacements, key=lambda replacement: replacement[0]):
+        chunks.append(view[pos:start])
+        chunks.extend(rendered)
+        pos = end
+    chunks.append(view[pos:])
+    return chunks
+
+
+def json_path_member(path: str, key: str) -> str:
+    """Append an object member to a JSON path, bracketing keys that are not identifiers"""
+    return f"{path}.{key}" if key.isidentifier() else f"{path}[{json.dumps(key, ensure_ascii=False)}]"
+
+
+def check_step(step: Any, path: str = '$') -> List[Tuple[str, str]]:
+    """Return every (JSON path, message) problem of a step, checked against its compiled schema"""
+    if not isinstance(step, dict):
+        return [(path, f"step must be an object, got {json_type_name(step)}")]
+
+    errors = []
+    step_type = step.get('type')
+    schema = step_schemas().get(step_type) if isinstance(step_type, str) else None
+    if schema is None:
+        message = "missing required field" if 'type' not in step else \
+            f"unknown step type {step_type!r}, expected one of {', '.join(t.value for t in StepType)}"
+        errors.append((f"{path}.type", message))
+    for key in step:
+        if key not in ('type', 'action'):
+            errors.append((json_path_member(path, key), "unknown field"))
+
+    action = step.get('action')
+    if not isinstance(action, dict):
+        message = "missing required field" if 'action' not in step else \
+            f"expected object, got {json_type_name(action)}"
+        errors.append((f"{path}.action", message))
+        return errors
+    if schema is None:
+        return errors
+
+    by_name = schema.by_name
+    for spec in schema.fields:
+        if spec.name not in action:
+            if spec.required:
+                errors.append((f"{path}.action.{spec.name}", f"missing required field for {schema.step_type.value}"))
+            continue
+        message = spec.check(action[spec.name])
+        if message:
+            errors.append((f"{path}.action.{spec.name}", message))
+    for key in action:
+        if key not in by_name:
+            errors.append((json_path_member(f"{path}.action", key), f"unknown field for {schema.step_type.value}"))
+    return errors
+
+
+def validate_step(step_data: Dict[str, Any]) -> AgenticStep:
+    """Validate step data against expected types"""
+    errors = check_step(step_data)
+    if errors:
+        raise ValueError("Invalid step data: " + "; ".join(f"{path}: {message}" for path, message in errors))
+
+    schema = step_schemas()[step_data['type']]
+    action_data = step_data['action']
+    action = schema.action_class(**{
+        spec.attribute: spec.enum(action_data[spec.name]) if spec.enum else action_data[spec.name]
+        for spec in schema.fields if spec.name in action_data
+    })
+    return AgenticStep(type=schema.step_type, action=action)
+
+
+def step_to_dict(validated_step: AgenticStep) -> Dict[str, Any]:
+    """Convert a validated step back to a dict for JSON storage"""
+    action = {}
+    for spec in step_schemas()[validated_step.type].fields:
+        value = getattr(validated_step.action, spec.attribute)
+        # Optional fields are only written when set
+        if spec.required or value:
+            action[spec.name] = value.value if spec.enum else value
+    return {'type': validated_step.type.value, 'action': action}
+
+
+def validate_files(file_paths: Iterable[str]) -> Tuple[List[Tuple[str, str, str]], int]:
+    """
+    Check every step of every scenario in the given files in one pass.
+    Returns ([(file, JSON path, message)], number of steps checked).
+    """
+    problems = []
+    step_count = 0
+    for file_path in file_paths:
+        try:
+            scenario_data = load_scenario_json(file_path)
+        except (FileNotFoundError, ValueError) as e:
+            problems.append((file_path, '$', str(e)))
+            continue
+        if not isinstance(scenario_data, dict):
+            problems.append((file_path, '$', f"expected object, got {json_type_name(scenario_data)}"))
+            continue
+
+        scenarios = 0
+        for key, scenario in scenario_data.items():
+            if not isinstance(scenario, dict) or 'steps' not in scenario:
+                continue
+            scenarios += 1
+            steps_path = json_path_member(json_path_member('$', key), 'steps')
+            steps = scenario['steps']
+            if not isinstance(steps, list):
+                problems.append((file_path, steps_path, f"expected array, got {json_type_name(steps)}"))
+                continue
+            step_count += len(steps)
+            for i, step in enumerate(steps):
+                for path, message in check_step(step, f"{steps_path}[{i}]"):
+                    problems.append((file_path, path, message))
+        if not scenarios:
+            problems.append((file_path, '$', "no scenario with a 'steps' array"))
+    return problems, step_count
+
+
+_deploy_assets = None
+
+
+def deploy_assets_module():
+    """scripts/deploy-assets.py, loaded on first use (its name is not importable because of the dash)"""
+    global _deploy_assets
+    if _deploy_assets is None:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts', 'deploy-assets.py')
+        spec = importlib.util.spec_from_file_location('deploy_assets', path)
+        _deploy_assets = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(_deploy_assets)
+    return _deploy_assets
+
+
+def audio_duration_ms(action: Dict[str, Any], public_dir: str = DEFAULT_PUBLIC_DIR) -> Optional[int]:
+    """
+    Length of a step's audio clip: the audioDuration recorded by deploy-assets,
+    else the MP3 behind audioUrl (a base64 data URL or a file under public_dir)
+    """
+    duration = action.get('audioDuration')
+    if isinstance(duration, (int, float)) and not isinstance(duration, bool) and duration > 0:
+        return duration
+    url = action.get('audioUrl')
+    if not isinstance(url, str) or not url:
+        return None
+
+    if url.startswith('data:'):
+        header, _, payload = url.partition(',')
+        if not header.endswith(';base64'):
+            return None
+        try:
+            data = base64.b64decode(payload)
+        except ValueError:
+            return None
+    else:
+        path = os.path.join(public_dir, url.split('?', 1)[0].lstrip('/'))
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as f:
+            data = f.read()
+    return deploy_assets_module().mp3_data_duration_ms(data)
+
+
+@dataclass
+class TimelineOptions:
+    """How much time a step occupies when checking or retiming timestamps"""
+    gap: int = 0  # minimum ms between the end of one step and the start of the next
+    audio_durations: bool = False  # a step with a voice clip lasts as long as the clip
+    public_dir: str = DEFAULT_PUBLIC_DIR
+
+    def duration(self, step: Any) -> int:
+        if not self.audio_durations or not isinstance(step, dict) or not isinstance(step.get('action'), dict):
+            return 0
+        return audio_duration_ms(step['action'], self.public_dir) or 0
+
+
+def step_timestamp(step: Any) -> Optional[float]:
+    """action.timestamp of a step, or None when it is missing or not a number"""
+    action = step.get('action') if isinstance(step, dict) else None
+    timestamp = action.get('timestamp') if isinstance(action, dict) else None
+    if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        return timestamp
+    return None
+
+
+def check_timeline(steps: List[Any], options: TimelineOptions) -> List[Tuple[int, str]]:
+    """Find missing, out-of-order and overlapping timestamps in one pass; returns [(step index, problem)]"""
+    problems = []
+    previous = None  # (index, timestamp, end of its span)
+    for i, step in enumerate(steps):
+        timestamp = step_timestamp(step)
+        if timestamp is None:
+            problems.append((i, "missing timestamp"))
+            continue
+        if previous is not None:
+            index, previous_timestamp, previous_end = previous
+            if timestamp < previous_timestamp:
+                problems.append((i, f"out of order: {timestamp} is before step {index} at {previous_timestamp}"))
+            elif timestamp < previous_end + options.gap:
+                problems.append((i, f"overlaps step {index}: starts at {timestamp}, "
+                                    f"step {index} runs until {previous_end} (gap {options.gap})"))
+        previous = (i, timestamp, timestamp + options.duration(step))
+    return problems
+
+
+def retime_steps(steps: List[Any], options: TimelineOptions, start: int = 0) -> List[Tuple[int, Any, Any]]:
+    """
+    Push each step from start on to no earlier than the end of the previous one
+    plus the gap, filling in missing timestamps. Steps already in place keep
+    their timestamps, so a push ripples only until existing slack absorbs it.
+    Returns [(step index, old timestamp, new timestamp)].
+    """
+    changes = []
+    earliest = None
+    if start > 0:
+        previous = steps[start - 1]
+        previous_timestamp = step_timestamp(previous)
+        if previous_timestamp is not None:
+            earliest = previous_timestamp + options.duration(previous) + options.gap
+    for i in range(start, len(steps)):
+        step = steps[i]
+        if not isinstance(step, dict) or not isinstance(step.get('action'), dict):
+            continue
+        timestamp = step_timestamp(step)
+        if timestamp is None or (earliest is not None and timestamp < earliest):
+            new_timestamp = earliest if earliest is not None else 0
+            changes.append((i, step['action'].get('timestamp'), new_timestamp))
+            step['action']['timestamp'] = timestamp = new_timestamp
+        earliest = timestamp + options.duration(step) + options.gap
+    return changes
+
+
+def shift_timestamps(steps: List[Any], start: int, delta: float) -> int:
+    """Move the timestamps of steps[start:] by delta ms; returns how many were moved"""
+    moved = 0
+    for step in steps[start:]:
+        if step_timestamp(step) is not None:
+            step['action']['timestamp'] += delta
+            moved += 1
+    return moved
+
+
+def scenario_key(scenario_data: Dict[str, Any], scenario_id: Optional[str] = None) -> str:
+    """
+    Key of the selected scenario: the one whose key or 'id' is scenario_id, or
+    the first key in the JSON when no ID is given
+    """
+    if not isinstance(scenario_data, dict) or not scenario_data:
+        raise ValueError("File does not contain any scenarios")
+    if scenario_id is None:
+        return next(iter(scenario_data))
+    if scenario_id in scenario_data:
+        return scenario_id
+    for key, scenario in scenario_data.items():
+        if isinstance(scenario, dict) and scenario.get('id') == scenario_id:
+            return key
+    raise ValueError(f"Unknown scenario: {scenario_id}. Available: {', '.join(scenario_data)}")
+
+
+def get_scenario(scenario_data: Dict[str, Any], scenario_id: Optional[str] = None) -> Dict[str, Any]:
+    """Return the selected scenario object (see scenario_key) and check it has steps"""
+    scenario = scenario_data[scenario_key(scenario_data, scenario_id)]
+
+    if not isinstance(scenario, dict) or 'steps' not in scenario:
+        raise ValueError("Scenario does not have a 'steps' array")
+    return scenario
+
+
+def add_step(scenario_data: Dict[str, Any], step_json: Union[str, Dict[str, Any]], insert_at: Optional[int] = None,
+             shift: Optional[TimelineOptions] = None, scenario_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Add a step (a JSON string, or an already parsed dict) to the scenario; with
+    shift, later steps move back to make room for it
+    """
+    # Parse step JSON
+    if isinstance(step_json, str):
+        try:
+            step_data = json.loads(step_json)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON for step: {e}")
+    else:
+        step_data = step_json
+
+    # Validate step
+    validated_step = validate_step(step_data)
+
+    steps = get_scenario(scenario_data, scenario_id)['steps']
+    step_dict = step_to_dict(validated_step)
+
+    # Insert at specified position or append
+    if insert_at is not None:
+        if insert_at < 0 or insert_at > len(steps):
+            raise ValueError(f"Invalid insert position: {insert_at}. Must be between 0 and {len(steps)}")
+        steps.insert(insert_at, step_dict)
+        print(f"Step inserted at position {insert_at}")
+    else:
+        steps.append(step_dict)
+        print(f"Step appended at position {len(steps) - 1}")
+
+    position = len(steps) - 1 if insert_at is None else insert_at
+    if shift is not None and position + 1 < len(steps):
+        next_timestamp = step_timestamp(steps[position + 1])
+        if next_timestamp is not None:
+            delta = step_dict['action']['timestamp'] + shift.duration(step_dict) + shift.gap - next_timestamp
+            if delta > 0:
+                moved = shift_timestamps(steps, position + 1, delta)
+                print(f"Shifted {moved} later steps by +{delta} ms")
+
+    return scenario_data
+
+
+def remove_step(scenario_data: Dict[str, Any], step_index: int, shift: bool = False,
+                scenario_id: Optional[str] = None) -> Dict[str, Any]:
+    """Remove a step from the scenario; with shift, later steps move up into its time slot"""
+    steps = get_scenario(scenario_data, scenario_id)['steps']
+
+    if step_index < 0 or step_index >= len(steps):
+        raise ValueError(f"Invalid step index: {step_index}. Must be between 0 and {len(steps) - 1}")
+
+    removed_step = steps.pop(step_index)
+    print(f"Removed step at index {step_index}: {removed_step['type']}")
+
+    if shift and step_index < len(steps):
+        removed_timestamp = step_timestamp(removed_step)
+        next_timestamp = step_timestamp(steps[step_index])
+        if removed_timestamp is not None and next_timestamp is not None and next_timestamp > removed_timestamp:
+            delta = next_timestamp - removed_timestamp
+            moved = shift_timestamps(steps, step_index, -delta)
+            print(f"Shifted {moved} later steps by -{delta} ms")
+
+    return scenario_data
+
+
+def list_steps(scenario_data: Dict[str, Any], scenario_id: Optional[str] = None) -> None:
+    """List all steps in the scenario"""
+    scenario = scenario_data[scenario_key(scenario_data, scenario_id)]
+    steps = scenario.get('steps', [])
+
+    print(f"\nScenario: {scenario.get('title', 'Unknown')}")
+    print(f"Total steps: {len(steps)}")
+    print("-" * 50)
+
+    for i, step in enumerate(steps):
+        step_type = step.get('type', 'unknown')
+        action = step.get('action', {})
+        from_ = action.get('from', 'unknown')
+        to = action.get('to', 'unknown')
+        content_preview = ""
+        if 'content' in action:
+            content = action['content']
+            content_preview = content[:50] + "..." if len(content) > 50 else content
+
+        print(f"{i:2d}. {step_type:12s} | {from_:15s} -> {to:15s} | {content_preview}")
+
+
+def list_steps_streaming(file_path: str, scenario_id: Optional[str] = None) -> None:
+    """
+    Same output as list_steps, without parsing the whole file: the document is
+    memory-mapped and walked once, decoding only the fields a listing shows.
+    Everything else, such as multi-megabyte data URLs, is skipped over with
+    bytes.find. Falls back to a full parse when the scanner cannot follow the file.
+    """
+
+    def decode(start: int, fields: Dict[str, Any], key: str) -> int:
+        end = skip_value(raw, start)
+        fields[key] = json.loads(raw[start:end])
+        return end
+
+    def expect_object(start: int) -> None:
+        if raw[start:start + 1] != b'{':
+            raise ValueError(f"Expected an object at offset {start}")
+
+    def visit_scenario(key: str, start: int) -> Optional[int]:
+        if key == 'title':
+            return decode(start, scenario, 'title')
+        if key == 'steps' and raw[start:start + 1] == b'[':
+            rows.clear()  # a repeated key replaces the earlier value, as in json.load
+            return scan_elements(raw, start, visit_step)
+        return None
+
+    def visit_step(index: int, start: int) -> int:
+        expect_object(start)
+        step = {}
+        end = scan_members(raw, start, lambda key, value_start: visit_step_member(step, key, value_start))
+        action = step.get('action', {})
+        content_preview = ""
+        if 'content' in action:
+            content = action['content']
+            content_preview = content[:50] + "..." if len(content) > 50 else content
+        rows.append(f"{index:2d}. {step.get('type', 'unknown'):12s} | {action.get('from', 'unknown'):15s} -> "
+                    f"{action.get('to', 'unknown'):15s} | {content_preview}")
+        return end
+
+    def visit_step_member(step: Dict[str, Any], key: str, start: int) -> Optional[int]:
+        if key == 'type':
+            return decode(start, step, 'type')
+        if key == 'action':
+            expect_object(start)
+            action = step['action'] = {}
+            return scan_members(raw, start, lambda name, value_start:
+                                decode(value_start, action, name) if name in ('from', 'to', 'content') else None)
+        return None
+
+    scenario: Dict[str, Any] = {}
+    rows: List[str] = []
+    try:
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError("empty file")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as raw:
+                root_start = skip_whitespace(raw, 0)
+                expect_object(root_start)
+                # Descend straight into the selected scenario; the others are skipped
+                keys = []
+
+                def visit_root(key: str, start: int) -> Optional[int]:
+                    keys.append(key)
+                    if key == scenario_id or (scenario_id is None and len(keys) == 1):
+                        expect_object(start)
+                        return scan_members(raw, start, visit_scenario)
+                    return None
+
+                scan_members(raw, root_start, visit_root)
+                if scenario_id is not None and scenario_id not in keys:
+                    # Selected by its "id" field rather than its key
+                    root, _ = scan_object(raw, root_start)
+                    ids = {}
+                    for key, value_start, _ in root:
+                        if raw[value_start:value_start + 1] == b'{':
+                            scan_members(raw, value_start, lambda name, id_start:
+                                         decode(id_start, ids, key) if name == 'id' else None)
+                    start = next(value_start for key, value_start, _ in root if ids.get(key) == scenario_id)
+                    scan_members(raw, start, visit_scenario)
+    except (ValueError, IndexError, KeyError, TypeError, AttributeError, StopIteration):
+        # Invalid JSON, unknown scenario or unexpected values: the full path reports them properly
+        list_steps(load_scenario_json(file_path), scenario_id)
+        return
+
+    print(f"\nScenario: {scenario.get('title', 'Unknown')}")
+    print(f"Total steps: {len(rows)}")
+    print("-" * 50)
+    if rows:
+        print('\n'.join(rows))
+
+
+def merge_patch(target: Any, patch: Any) -> Any:
+    """Apply a JSON merge patch (RFC 7386) without modifying target; null removes a field"""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def read_batch(lines: Iterable[str]) -> List[Tuple[int, Dict[str, Any]]]:
+    """Parse JSON Lines batch operations into (line number, operation) pairs"""
+    operations = []
+    errors = []
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            operation = json.loads(line)
+        except json.JSONDecodeError as e:
+            errors.append(f"line {line_number}: invalid JSON: {e}")
+            continue
+        if not isinstance(operation, dict):
+            errors.append(f"line {line_number}: operation must be a JSON object")
+            continue
+        operations.append((line_number, operation))
+
+    if errors:
+        raise ValueError("Invalid batch:\n  " + "\n  ".join(errors))
+    return operations
+
+
+def check_index(operation: Dict[str, Any], field: str, upper: int, name: str,
+                default: Optional[int] = None) -> int:
+    """Read an index field of a batch operation and check 0 <= value < upper"""
+    value = operation.get(field, default)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError(f"'{field}' must be an integer")
+    if value < 0 or value >= upper:
+        raise ValueError(f"Invalid {name}: {value}. Must be between 0 and {upper - 1}")
+    return value
+
+
+def apply_batch_operation(steps: List[Dict[str, Any]], operation: Dict[str, Any]) -> str:
+    """Apply one batch operation to a steps list and describe it; existing step dicts are never modified"""
+    op = operation.get('op')
+
+    if op == 'insert':
+        step = step_to_dict(validate_step(operation['step']))
+        at = check_index(operation, 'at', len(steps) + 1, 'insert position', default=len(steps))
+        steps.insert(at, step)
+        return f"inserted {step['type']} at {at}"
+
+    if op == 'remove':
+        index = check_index(operation, 'index', len(steps), 'step index')
+        removed = steps.pop(index)
+        return f"removed {removed.get('type')} at {index}"
+
+    if op == 'move':
+        source = check_index(operation, 'from', len(steps), 'source index')
+        target = check_index(operation, 'to', len(steps), 'target index')
+        steps.insert(target, steps.pop(source))
+        return f"moved step {source} to {target}"
+
+    if op == 'replace':
+        index = check_index(operation, 'index', len(steps), 'step index')
+        steps[index] = step_to_dict(validate_step(operation['step']))
+        return f"replaced step {index} with {steps[index]['type']}"
+
+    if op == 'patch':
+        index = check_index(operation, 'index', len(steps), 'step index')
+        if not isinstance(operation.get('patch'), dict):
+            raise ValueError("'patch' must be a JSON object")
+        patched = merge_patch(steps[index], operation['patch'])
+        # Problems the step already had (e.g. a missing timestamp) do not block an
+        # unrelated patch, but anything the patch breaks rejects the batch
+        existing = set(check_step(steps[index]))
+        errors = [error for error in check_step(patched) if error not in existing]
+        if errors:
+            raise ValueError("Patched step is invalid: " + "; ".join(f"{path}: {message}" for path, message in errors))
+        steps[index] = patched
+        return f"patched step {index}"
+
+    raise ValueError(f"Unknown operation: {op!r} (expected insert, remove, move, replace or patch)")
+
+
+def apply_batch(scenario_data: Dict[str, Any], operations: List[Tuple[int, Dict[str, Any]]],
+                scenario_id: Optional[str] = None) -> List[str]:
+    """
+    Apply batch operations as one transaction. Operations run in order and each
+    index refers to the steps array as left by the previous operations. Every
+    operation is checked before anything is committed; on any error the scenario
+    is left untouched and all errors are reported together.
+    """
+    scenario = get_scenario(scenario_data, scenario_id)
+    steps = list(scenario['steps'])
+    log = []
+    errors = []
+
+    for line_number, operation in operations:
+        try:
+            log.append(f"line {line_number}: {apply_batch_operation(steps, operation)}")
+        except KeyError as e:
+            errors.append(f"line {line_number}: missing field {e}")
+        except (ValueError, TypeError) as e:
+            errors.append(f"line {line_number}: {e}")
+
+    if errors:
+        raise ValueError(f"Batch rejected, nothing was changed ({len(errors)} errors):\n  " + "\n  ".join(errors))
+
+    scenario['steps'] = steps
+    return log
+
+
+def file_sha256(file_path: str) -> str:
+    """SHA-256 of a file's contents, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_json_atomic(file_path: str, data: Any, **dump_kwargs) -> None:
+    """Write JSON through a temp file in the same directory and rename it into place (no fsync; caches only)"""
+    write_bytes_atomic(file_path, [json.dumps(data, **dump_kwargs).encode('utf-8')], fsync=False)
+
+
+def summarize_step(step: Dict[str, Any]) -> Dict[str, Any]:
+    """Small, payload-free summary of a step (no data URLs), as stored in the query index"""
+    action = step.get('action', {}) if isinstance(step, dict) else {}
+    summary = {'type': step.get('type') if isinstance(step, dict) else None}
+    for field in ('from', 'to', 'senderType', 'service', 'timestamp', 'id'):
+        if field in action:
+            summary[field] = action[field]
+    content = action.get('content')
+    if isinstance(content, str):
+        summary['preview'] = content[:50] + "..." if len(content) > 50 else content
+    return summary
+
+
+def build_step_index(scenario_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Build posting lists and a sorted timeline for every scenario in a file"""
+    scenarios = {}
+    for key, scenario in scenario_data.items():
+        if not isinstance(scenario, dict) or not isinstance(scenario.get('steps'), list):
+            continue
+
+        postings = {field: {} for field in INDEXED_FIELDS}
+        timeline = []
+        summaries = []
+        for i, step in enumerate(scenario['steps']):
+            summary = summarize_step(step)
+            summaries.append(summary)
+            for field in INDEXED_FIELDS:
+                value = summary.get(field)
+                if isinstance(value, str):
+                    postings[field].setdefault(value, []).append(i)
+            timestamp = summary.get('timestamp')
+            if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+                timeline.append([timestamp, i])
+        timeline.sort()
+
+        scenarios[key] = {
+            'id': scenario.get('id'),
+            'title': scenario.get('title'),
+            'steps': summaries,
+            'postings': postings,
+            'timeline': timeline,
+        }
+    return scenarios
+
+
+def index_path_for(file_path: str, index_dir: str = DEFAULT_INDEX_DIR) -> str:
+    """Cache location of a scenario file's index (keyed by its absolute path)"""
+    key = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(index_dir, f"{stem}.{key}.json")
+
+
+def load_step_index(file_path: str, index_dir: str = DEFAULT_INDEX_DIR,
+                    scenario_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Return the index for a scenario file, rebuilding the cached copy only when the file changed"""
+    stat = os.stat(file_path)
+    cache_path = index_path_for(file_path, index_dir)
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = None
+
+    if cached and cached.get('version') == INDEX_VERSION:
+        if cached.get('size') == stat.st_size and cached.get('mtime_ns') == stat.st_mtime_ns:
+            return cached['scenarios']
+        digest = file_sha256(file_path)
+        if cached.get('sha256') == digest:
+            # Touched but unchanged: refresh the fast-path stamp only
+            cached['mtime_ns'] = stat.st_mtime_ns
+            write_json_atomic(cache_path, cached, ensure_ascii=False)
+            return cached['scenarios']
+    else:
+        digest = file_sha256(file_path)
+
+    if scenario_data is None:
+        scenario_data = load_scenario_json(file_path)
+    scenarios = build_step_index(scenario_data)
+    write_json_atomic(cache_path, {
+        'version': INDEX_VERSION,
+        'file': os.path.abspath(file_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': digest,
+        'scenarios': scenarios,
+    }, ensure_ascii=False)
+    return scenarios
+
+
+def select_indexed_scenarios(index: Dict[str, Any], scenario_id: Optional[str] = None) -> Dict[str, Any]:
+    """Narrow an index to the scenario whose key or id is scenario_id (all scenarios when None)"""
+    if scenario_id is None:
+        return index
+    selected = {key: entry for key, entry in index.items() if scenario_id in (key, entry.get('id'))}
+    if not selected:
+        raise ValueError(f"Unknown scenario: {scenario_id}. Available: {', '.join(index)}")
+    return selected
+
+
+def query_steps(index: Dict[str, Any], filters: Dict[str, str], participant: Optional[str] = None,
+                since: Optional[float] = None, until: Optional[float] = None) -> Iterator[Tuple[str, int, Dict[str, Any]]]:
+    """Yield (scenario key, step index, summary) for steps matching every given filter"""
+    for key, entry in index.items():
+        postings = entry['postings']
+        candidates = None
+
+        for field, value in filters.items():
+            hits = set(postings[field].get(value, ()))
+            candidates = hits if candidates is None else candidates & hits
+
+        if participant is not None:
+            hits = set(postings['from'].get(participant, ())) | set(postings['to'].get(participant, ()))
+            candidates = hits if candidates is None else candidates & hits
+
+        if since is not None or until is not None:
+            timeline = entry['timeline']
+            times = [timestamp for timestamp, _ in timeline]
+            lo = bisect.bisect_left(times, since) if since is not None else 0
+            hi = bisect.bisect_right(times, until) if until is not None else len(times)
+            hits = {i for _, i in timeline[lo:hi]}
+            candidates = hits if candidates is None else candidates & hits
+
+        if candidates is None:
+            candidates = range(len(entry['steps']))
+        for i in sorted(candidates):
+            yield key, i, entry['steps'][i]
+
+
+def format_step_summary(i: int, summary: Dict[str, Any]) -> str:
+    """One list line for a step summary"""
+    detail = summary.get('preview') or summary.get('service') or ''
+    return (f"{i:2d}. {summary.get('type') or 'unknown':12s} | {summary.get('from', 'unknown'):15s} -> "
+            f"{summary.get('to', 'unknown'):15s} | {detail}")
+
+
+def print_query_results(matches: List[Tuple[str, int, Dict[str, Any]]], as_json: bool = False) -> None:
+    """Print query matches grouped by scenario, or as JSON Lines"""
+    if as_json:
+        for key, i, summary in matches:
+            print(json.dumps({'scenario': key, 'index': i, **summary}, ensure_ascii=False))
+        return
+
+    current = None
+    for key, i, summary in matches:
+        if key != current:
+            print(f"\nScenario: {key}")
+            print("-" * 50)
+            current = key
+        print(format_step_summary(i, summary))
+    print(f"\nMatched steps: {len(matches)}")
+
+
+# Diff and three-way merge of steps arrays. Steps are aligned by action.id when they
+# have one and by content fingerprint otherwise; strings at least this long (data
+# URLs, long prompts) are hashed once and compared by digest, never byte by byte.
+LARGE_PAYLOAD_CHARS = 1024
+
+_ABSENT = object()  # member missing on one side of a merge
+
+
+class PayloadHasher:
+    """Canonical hashing of JSON values, with each large string hashed only once"""
+
+    def __init__(self, large: int = LARGE_PAYLOAD_CHARS):
+        self.large = large
+        self._digests = {}  # id(string) -> (string, placeholder); the string is kept so its id stays unique
+
+    def canonical(self, value: Any) -> Any:
+        """value with large strings replaced by a short placeholder holding their length and digest"""
+        if isinstance(value, str):
+            if len(value) < self.large:
+                return value
+            cached = self._digests.get(id(value))
+            if cached is None:
+                cached = self._digests[id(value)] = (value, self.large_placeholder(value))
+            return cached[1]
+        if isinstance(value, dict):
+            return {key: self.canonical(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.canonical(item) for item in value]
+        return value
+
+    def large_placeholder(self, value: str) -> str:
+        """Stand-in for a large string; called once per string object"""
+        digest = hashlib.sha256(value.encode('utf-8', 'surrogatepass')).hexdigest()
+        return f"<{len(value)} chars sha256:{digest}>"
+
+    def fingerprint(self, value: Any) -> str:
+        """Stable content hash of a JSON value (member order and large payload bytes do not matter)"""
+        text = json.dumps(self.canonical(value), ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+class IdentityHasher(PayloadHasher):
+    """
+    PayloadHasher whose large strings stand for themselves by object identity, so
+    fingerprinting a step never reads its payload bytes. Used to notice edits
+    between load and save: an equal string that is a different object only
+    costs a re-render.
+    """
+
+    def large_placeholder(self, value: str) -> str:
+        return f"<{len(value)} chars @{id(value)}>"
+
+
+def step_type_of(step: Any) -> Optional[str]:
+    return step.get('type') if isinstance(step, dict) else None
+
+
+def step_align_key(step: Any, fingerprint: str) -> Tuple[str, Any]:
+    """Identity used to align a step across revisions: its action.id, else its content"""
+    action = step.get('action') if isinstance(step, dict) else None
+    step_id = action.get('id') if isinstance(action, dict) else None
+    if isinstance(step_id, (str, int)) and not isinstance(step_id, bool):
+        return 'id', step_id
+    return 'hash', fingerprint
+
+
+def increasing_subsequence(values: List[int]) -> List[int]:
+    """Positions of a longest strictly increasing subsequence of values (patience sorting)"""
+    tails = []  # tails[k]: value ending the best run of length k + 1
+    tail_positions = []
+    previous = [-1] * len(values)
+    for position, value in enumerate(values):
+        k = bisect.bisect_left(tails, value)
+        if k == len(tails):
+            tails.append(value)
+            tail_positions.append(position)
+        else:
+            tails[k] = value
+            tail_positions[k] = position
+        previous[position] = tail_positions[k - 1] if k else -1
+
+    result = []
+    position = tail_positions[-1] if tail_positions else -1
+    while position != -1:
+        result.append(position)
+        position = previous[position]
+    return result[::-1]
+
+
+@dataclass
+class StepAlignment:
+    """Matching between an old and a new steps array"""
+    old_to_new: Dict[int, int]
+    stable: Set[int]  # old indices of matched steps that kept their order relative to each other
+    old_hashes: List[str]
+    new_hashes: List[str]
+
+    def modified(self, i: int) -> bool:
+        return self.old_hashes[i] != self.new_hashes[self.old_to_new[i]]
+
+
+def align_steps(old: List[Any], new: List[Any], hasher: PayloadHasher) -> StepAlignment:
+    """
+    Align two steps arrays: steps are paired by key (the n-th occurrence of a key
+    with its n-th occurrence), the pairs that kept their relative order are found
+    with a longest increasing subsequence, and unpaired steps of the same type
+    left in the same gap between those anchors are paired, in order, as edits of
+    each other.
+    """
+    old_hashes = [hasher.fingerprint(step) for step in old]
+    new_hashes = [hasher.fingerprint(step) for step in new]
+
+    occurrences = {}
+    for j, step in enumerate(new):
+        occurrences.setdefault(step_align_key(step, new_hashes[j]), []).append(j)
+    taken = {}
+    old_to_new = {}
+    for i, step in enumerate(old):
+        key = step_align_key(step, old_hashes[i])
+        candidates = occurrences.get(key, ())
+        n = taken.get(key, 0)
+        if n < len(candidates):
+            old_to_new[i] = candidates[n]
+            taken[key] = n + 1
+
+    matched = sorted(old_to_new)
+    stable = {matched[position] for position in increasing_subsequence([old_to_new[i] for i in matched])}
+
+    # Unpaired steps between the same two anchors: edited steps without an id
+    new_matched = set(old_to_new.values())
+    anchors = sorted(stable)
+    gap_old, gap_new = {}, {}
+    gap = 0
+    for i in range(len(old)):
+        if gap < len(anchors) and anchors[gap] == i:
+            gap += 1
+        elif i not in old_to_new:
+            gap_old.setdefault(gap, []).append(i)
+    anchor_new = [old_to_new[i] for i in anchors]
+    gap = 0
+    for j in range(len(new)):
+        if gap < len(anchor_new) and anchor_new[gap] == j:
+            gap += 1
+        elif j not in new_matched:
+            gap_new.setdefault(gap, []).append(j)
+    for gap, removed in gap_old.items():
+        inserted = gap_new.get(gap, [])
+        position = 0
+        for i in removed:
+            # Next unpaired step of the same type, keeping both sides in order
+            found = next((p for p in range(position, len(inserted))
+                          if step_type_of(new[inserted[p]]) == step_type_of(old[i])), None)
+            if found is not None:
+                old_to_new[i] = inserted[found]
+                stable.add(i)
+                position = found + 1
+
+    return StepAlignment(old_to_new, stable, old_hashes, new_hashes)
+
+
+def changed_paths(old: Any, new: Any, hasher: PayloadHasher, path: str = '$') -> List[str]:
+    """JSON paths of the members that differ between two values (objects are compared member by member)"""
+    if isinstance(old, dict) and isinstance(new, dict):
+        paths = []
+        for key in list(old) + [key for key in new if key not in old]:
+            member = json_path_member(path, key)
+            if key not in old or key not in new:
+                paths.append(member)
+            else:
+                paths.extend(changed_paths(old[key], new[key], hasher, member))
+        return paths
+    if type(old) is not type(new) or hasher.canonical(old) != hasher.canonical(new):
+        return [path]
+    return []
+
+
+@dataclass
+class StepChange:
+    """One entry of a steps diff; kind is inserted, removed, moved or modified"""
+    kind: str
+    old: Optional[int]
+    new: Optional[int]
+    fields: List[str]
+
+
+def diff_steps(old: List[Any], new: List[Any], hasher: PayloadHasher) -> List[StepChange]:
+    """Changes turning old into new, in new order with removals at their old position"""
+    alignment = align_steps(old, new, hasher)
+    new_to_old = {j: i for i, j in alignment.old_to_new.items()}
+
+    changes = []
+    removed = [i for i in range(len(old)) if i not in alignment.old_to_new]
+    flushed = 0
+    for j in range(len(new)):
+        i = new_to_old.get(j)
+        # Removed steps are reported before the first anchor that followed them
+        if i in alignment.stable:
+            while flushed < len(removed) and removed[flushed] < i:
+                changes.append(StepChange('removed', removed[flushed], None, []))
+                flushed += 1
+        if i is None:
+            changes.append(StepChange('inserted', None, j, []))
+            continue
+        fields = changed_paths(old[i], new[j], hasher) if alignment.modified(i) else []
+        if i not in alignment.stable:
+            changes.append(StepChange('moved', i, j, fields))
+        elif fields:
+            changes.append(StepChange('modified', i, j, fields))
+    changes.extend(StepChange('removed', i, None, []) for i in removed[flushed:])
+    return changes
+
+
+def diff_scenario_files(old_data: Dict[str, Any], new_data: Dict[str, Any], scenario_id: Optional[str] = None,
+                        hasher: Optional[PayloadHasher] = None) -> List[Dict[str, Any]]:
+    """
+    Diff every scenario of two scenario files (or the selected one): one record per
+    added/removed scenario, changed scenario field and step change
+    """
+    hasher = hasher or PayloadHasher()
+    if scenario_id is not None:
+        old_data = {'': get_scenario(old_data, scenario_id)}
+        new_data = {'': get_scenario(new_data, scenario_id)}
+
+    records = []
+    for key in list(old_data) + [key for key in new_data if key not in old_data]:
+        old, new = old_data.get(key, _ABSENT), new_data.get(key, _ABSENT)
+        label = key or scenario_id
+        if old is _ABSENT or new is _ABSENT:
+            records.append({'scenario': label, 'change': 'scenario-added' if old is _ABSENT else 'scenario-removed'})
+            continue
+        if not (isinstance(old, dict) and isinstance(new, dict)
+                and isinstance(old.get('steps'), list) and isinstance(new.get('steps'), list)):
+            if hasher.fingerprint(old) != hasher.fingerprint(new):
+                records.append({'scenario': label, 'change': 'changed', 'fields': ['$']})
+            continue
+        fields = [path for field in list(old) + [field for field in new if field not in old] if field != 'steps'
+                  for path in changed_paths(old.get(field, _ABSENT), new.get(field, _ABSENT),
+                                            hasher, json_path_member('$', field))]
+        if fields:
+            records.append({'scenario': label, 'change': 'changed', 'fields': fields})
+        for change in diff_steps(old['steps'], new['steps'], hasher):
+            step = new['steps'][change.new] if change.new is not None else old['steps'][change.old]
+            record = {'scenario': label, 'change': change.kind, 'old': change.old, 'new': change.new,
+                      'type': step_type_of(step)}
+            if change.fields:
+                record['fields'] = change.fields
+            records.append(record)
+    return records
+
+
+def print_diff(records: List[Dict[str, Any]], as_json: bool = False) -> None:
+    """Print diff records grouped by scenario, or as JSON Lines"""
+    if as_json:
+        for record in records:
+            print(json.dumps(record, ensure_ascii=False))
+        return
+
+    marks = {'inserted': '+', 'removed': '-', 'moved': '>', 'modified': '~', 'changed': '~'}
+    current = None
+    counts = {}
+    for record in records:
+        kind = record['change']
+        counts[kind] = counts.get(kind, 0) + 1
+        if kind.startswith('scenario-'):
+            print(f"\nScenario {kind[len('scenario-'):]}: {record['scenario']}")
+            current = None
+            continue
+        if record['scenario'] != current:
+            print(f"\nScenario: {record['scenario']}")
+            print("-" * 50)
+            current = record['scenario']
+        if kind == 'changed':
+            print(f"~ scenario fields: {', '.join(record['fields'])}")
+            continue
+        position = {'inserted': f"{record['new']}", 'removed': f"{record['old']}"}.get(
+            kind, f"{record['old']} -> {record['new']}")
+        fields = f" ({', '.join(record['fields'])})" if record.get('fields') else ''
+        print(f"{marks[kind]} {position:10s} {record['type'] or 'unknown':12s}{fields}")
+    summary = ', '.join(f"{count} {kind}" for kind, count in counts.items())
+    print(f"\n{summary or 'No differences'}")
+
+
+def merge_values(base: Any, ours: Any, theirs: Any, hasher: PayloadHasher, path: str,
+                 conflicts: List[str]) -> Any:
+    """Three-way merge of one value (_ABSENT for a missing member): a change on one side wins"""
+    fingerprint = lambda value: None if value is _ABSENT else hasher.fingerprint(value)
+    base_hash, ours_hash, theirs_hash = fingerprint(base), fingerprint(ours), fingerprint(theirs)
+    if ours_hash == theirs_hash or theirs_hash == base_hash:
+        return ours
+    if ours_hash == base_hash:
+        return theirs
+    conflicts.append(f"{path}: changed on both sides")
+    return ours
+
+
+def merge_steps(base: List[Any], ours: List[Any], theirs: List[Any], hasher: PayloadHasher, path: str,
+                conflicts: List[str]) -> List[Any]:
+    """
+    Three-way merge of steps arrays. Our order is kept; their insertions and moves
+    are placed after the step that precedes them on their side. Steps taken from
+    ours are the same objects, so saving can reuse their original bytes.
+    """
+    to_ours = align_steps(base, ours, hasher)
+    to_theirs = align_steps(base, theirs, hasher)
+    ours_base = {j: i for i, j in to_ours.old_to_new.items()}
+    theirs_base = {k: i for i, k in to_theirs.old_to_new.items()}
+
+    # Content of every base step: removed, or the version from the side that changed it
+    resolved = {}
+    for i in range(len(base)):
+        in_ours, in_theirs = i in to_ours.old_to_new, i in to_theirs.old_to_new
+        ours_step = ours[to_ours.old_to_new[i]] if in_ours else None
+        theirs_step = theirs[to_theirs.old_to_new[i]] if in_theirs else None
+        ours_changed = in_ours and to_ours.modified(i)
+        theirs_changed = in_theirs and to_theirs.modified(i)
+        if not in_ours or not in_theirs:
+            if ours_changed or theirs_changed:
+                conflicts.append(f"{path}[{i}]: removed on one side, modified on the other")
+                resolved[i] = ours_step if in_ours else theirs_step
+            continue
+        if ours_changed and theirs_changed and \
+                to_ours.new_hashes[to_ours.old_to_new[i]] != to_theirs.new_hashes[to_theirs.old_to_new[i]]:
+            conflicts.append(f"{path}[{i}]: modified on both sides")
+        resolved[i] = theirs_step if theirs_changed and not ours_changed else ours_step
+
+    # Steps only they moved leave our order and are placed like their insertions
+    pending = {i for i in resolved
+               if i in to_ours.stable and i in to_theirs.old_to_new and i not in to_theirs.stable}
+    for i in resolved:
+        if i not in to_ours.stable and i in to_theirs.old_to_new and i not in to_theirs.stable:
+            j, k = to_ours.old_to_new[i], to_theirs.old_to_new[i]
+            ours_before = to_ours.new_hashes[j - 1] if j else None
+            theirs_before = to_theirs.new_hashes[k - 1] if k else None
+            if ours_before != theirs_before:
+                conflicts.append(f"{path}[{i}]: moved to different places on both sides")
+
+    skeleton = []  # (base index or None for our insertions, step)
+    position_of = {}
+    ours_inserted = {}
+    for j, step in enumerate(ours):
+        i = ours_base.get(j)
+        if i is None:
+            skeleton.append((None, step))
+            ours_inserted[to_ours.new_hashes[j]] = ours_inserted.get(to_ours.new_hashes[j], 0) + 1
+        elif i in resolved and i not in pending:
+            position_of[i] = len(skeleton)
+            skeleton.append((i, resolved[i]))
+
+    # Their items go after their anchor and after our insertions that directly follow it
+    run_end = [0] * (len(skeleton) + 1)  # run_end[p + 1]: slot for items anchored at skeleton[p]
+    run_end[len(skeleton)] = len(skeleton) - 1
+    for p in range(len(skeleton) - 1, -1, -1):
+        run_end[p] = run_end[p + 1] if skeleton[p][0] is None else p - 1
+    buckets = {}
+    anchor = -1
+    for k, step in enumerate(theirs):
+        i = theirs_base.get(k)
+        if i is None:
+            digest = to_theirs.new_hashes[k]
+            if ours_inserted.get(digest):
+                ours_inserted[digest] -= 1  # inserted on both sides
+                continue
+            buckets.setdefault(run_end[anchor + 1], []).append(step)
+        elif i in pending:
+            buckets.setdefault(run_end[anchor + 1], []).append(resolved[i])
+        elif i in position_of:
+            anchor = position_of[i]
+
+    merged = list(buckets.get(-1, ()))
+    for p, (_, step) in enumerate(skeleton):
+        merged.append(step)
+        merged.extend(buckets.get(p, ()))
+    return merged
+
+
+def merge_scenario_files(base: Dict[str, Any], ours: Dict[str, Any], theirs: Dict[str, Any],
+                         hasher: Optional[PayloadHasher] = None) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Three-way merge of whole scenario files: steps arrays present on all three
+    sides are merged step by step, every other member as a whole value.
+    Returns the merged data (laid out like ours) and the conflicts found.
+    """
+    hasher = hasher or PayloadHasher()
+    conflicts = []
+
+    def merge_members(base_obj: Dict[str, Any], ours_obj: Dict[str, Any], theirs_obj: Dict[str, Any], path: str,
+                      merge_member: Callable[[str, Any, Any, Any, str], Any]) -> Dict[str, Any]:
+        result = {}
+        for key in list(ours_obj) + [key for key in theirs_obj if key not in ours_obj]:
+            value = merge_member(key, base_obj.get(key, _ABSENT), ours_obj.get(key, _ABSENT),
+                                 theirs_obj.get(key, _ABSENT), json_path_member(path, key))
+            if value is not _ABSENT:
+                result[key] = value
+        return result
+
+    def merge_scenario_member(key: str, base_value: Any, ours_value: Any, theirs_value: Any, path: str) -> Any:
+        if key == 'steps' and all(isinstance(value, list) for value in (base_value, ours_value, theirs_value)):
+            return merge_steps(base_value, ours_value, theirs_value, hasher, path, conflicts)
+        return merge_values(base_value, ours_value, theirs_value, hasher, path, conflicts)
+
+    def merge_scenario(key: str, base_value: Any, ours_value: Any, theirs_value: Any, path: str) -> Any:
+        if all(isinstance(value, dict) for value in (base_value, ours_value, theirs_value)):
+            return merge_members(base_value, ours_value, theirs_value, path, merge_scenario_member)
+        return merge_values(base_value, ours_value, theirs_value, hasher, path, conflicts)
+
+    if not all(isinstance(data, dict) for data in (base, ours, theirs)):
+        raise ValueError("Scenario files must contain JSON objects")
+    return merge_members(base, ours, theirs, '$', merge_scenario), conflicts
+
+
+# JSON-RPC 2.0 error codes
+RPC_PARSE_ERROR = -32700
+RPC_INVALID_REQUEST = -32600
+RPC_METHOD_NOT_FOUND = -32601
+RPC_INVALID_PARAMS = -32602
+RPC_INTERNAL_ERROR = -32603
+RPC_APPLICATION_ERROR = -32000
+
+
+class InvalidParamsError(Exception):
+    """Request params that bind to the method signature but have unusable values"""
+
+
+class ScenarioDocument:
+    """A scenario file held in memory by a session, with its splice source and a lazily built index"""
+
+    def __init__(self, file_path: str):
+        self.path = file_path
+        self.reload()
+
+    def reload(self) -> None:
+        self.data, self.source = load_scenario_document(self.path)
+        self.stamp = self.file_stamp()
+        self.dirty = False
+        self._index = None
+
+    def file_stamp(self) -> Tuple[int, int]:
+        stat = os.stat(self.path)
+        return stat.st_size, stat.st_mtime_ns
+
+    @property
+    def index(self) -> Dict[str, Any]:
+        if self._index is None:
+            self._index = build_step_index(self.data)
+        return self._index
+
+    def modified(self) -> None:
+        self.dirty = True
+        self._index = None
+
+    def save(self) -> bool:
+        """Write the document if it has unsaved edits; returns whether anything was written"""
+        if not self.dirty:
+            return False
+        save_scenario_json(self.path, self.data, self.source)
+        with open(self.path, 'rb') as f:
+            self.source = scenario_source(f.read(), self.data)
+        self.stamp = self.file_stamp()
+        self.dirty = False
+        return True
+
+
+class EditSession:
+    """
+    Long-lived editing session answering JSON-RPC 2.0 requests, one JSON object
+    per line. Parsed documents and their query indexes stay in memory between
+    requests; edits are kept until a "save" request writes them.
+    """
+
+    def __init__(self):
+        self.documents: Dict[str, ScenarioDocument] = {}
+        self.methods = {
+            'open': self.rpc_open,
+            'list': self.rpc_list,
+            'add': self.rpc_add,
+            'remove': self.rpc_remove,
+            'batch': self.rpc_batch,
+            'query': self.rpc_query,
+            'validate': self.rpc_validate,
+            'timeline': self.rpc_timeline,
+            'retime': self.rpc_retime,
+            'save': self.rpc_save,
+            'close': self.rpc_close,
+        }
+
+    def document(self, file_path: str) -> ScenarioDocument:
+        """Open (or return the open) document, reloading it if it changed on disk and has no unsaved edits"""
+        if not isinstance(file_path, str):
+            raise InvalidParamsError("'file' must be a path string")
+        key = os.path.abspath(file_path)
+        document = self.documents.get(key)
+        if document is None:
+            document = self.documents[key] = ScenarioDocument(file_path)
+        elif document.file_stamp() != document.stamp:
+            if document.dirty:
+                raise ValueError(f"{file_path} changed on disk and has unsaved edits; close it without saving first")
+            document.reload()
+        return document
+
+    def handle_line(self, line: str) -> Optional[str]:
+        """Answer one request line; returns the response line, or None for notifications"""
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            return self.response(None, error=(RPC_PARSE_ERROR, f"Parse error: {e}"))
+        if not isinstance(request, dict) or request.get('jsonrpc') != '2.0' or not isinstance(request.get('method'), str):
+            return self.response(request.get('id') if isinstance(request, dict) else None,
+                                 error=(RPC_INVALID_REQUEST, "Invalid request"))
+
+        request_id = request.get('id')
+        method = self.methods.get(request['method'])
+        params = request.get('params', {})
+        bind_error = None
+        if method is not None and isinstance(params, dict):
+            try:
+                bound = inspect.signature(method).bind(**params)
+            except TypeError as e:
+                bind_error = str(e)
+        if method is None:
+            response = self.response(request_id, error=(RPC_METHOD_NOT_FOUND, f"Method not found: {request['method']}"))
+        elif not isinstance(params, dict):
+            response = self.response(request_id, error=(RPC_INVALID_PARAMS, "params must be an object"))
+        elif bind_error is not None:
+            response = self.response(request_id, error=(RPC_INVALID_PARAMS, f"{request['method']}: {bind_error}"))
+        else:
+            # Library functions report progress with print(); it is returned as "log" instead
+            output = io.StringIO()
+            try:
+                with contextlib.redirect_stdout(output):
+                    result = method(*bound.args, **bound.kwargs)
+            except InvalidParamsError as e:
+                response = self.response(request_id, error=(RPC_INVALID_PARAMS, f"{request['method']}: {e}"))
+            except TypeError as e:
+                # A bug in the method or the code it calls, not a problem with the request
+                response = self.response(request_id, error=(RPC_INTERNAL_ERROR, f"Internal error: {e}"),
+                                         log=output.getvalue())
+            except Exception as e:
+                response = self.response(request_id, error=(RPC_APPLICATION_ERROR, str(e)),
+                                         log=output.getvalue())
+            else:
+                if isinstance(result, dict) and output.getvalue():
+                    result['log'] = output.getvalue().splitlines()
+                response = self.response(request_id, result=result)
+        return None if 'id' not in request else response
+
+    @staticmethod
+    def response(request_id: Any, result: Any = None, error: Optional[Tuple[int, str]] = None, log: str = '') -> str:
+        message = {'jsonrpc': '2.0', 'id': request_id}
+        if error is None:
+            message['result'] = result
+        else:
+            code, text = error
+            message['error'] = {'code': code, 'message': text, **({'data': {'log': log.splitlines()}} if log else {})}
+        return json.dumps(message, ensure_ascii=False)
+
+    def serve(self, lines: Iterable[str], write) -> None:
+        for line in lines:
+            if line.strip():
+                response = self.handle_line(line)
+                if response is not None:
+                    write(response + '\n')
+
+    def unsaved(self) -> List[str]:
+        return [document.path for document in self.documents.values() if document.dirty]
+
+    # RPC methods: keyword arguments are the request params
+
+    def rpc_open(self, file: str) -> Dict[str, Any]:
+        document = self.document(file)
+        return {'scenarios': [{'key': key, 'id': entry['id'], 'title': entry['title'], 'steps': len(entry['steps'])}
+                              for key, entry in document.index.items()]}
+
+    def rpc_list(self, file: str, scenario: Optional[str] = None) -> Dict[str, Any]:
+        document = self.document(file)
+        key = scenario_key(document.data, scenario)
+        return {'scenario': key, 'steps': document.index[key]['steps']}
+
+    def rpc_add(self, file: str, step: Dict[str, Any], at: Optional[int] = None, scenario: Optional[str] = None,
+                shift: bool = False, gap: int = 0, audioDurations: bool = False) -> Dict[str, Any]:
+        document = self.document(file)
+        timeline = TimelineOptions(gap, audioDurations) if shift else None
+        add_step(document.data, step, at, timeline, scenario)
+        document.modified()
+        return {'steps': len(get_scenario(document.data, scenario)['steps'])}
+
+    def rpc_remove(self, file: str, index: int, scenario: Optional[str] = None, shift: bool = False) -> Dict[str, Any]:
+        document = self.document(file)
+        remove_step(document.data, index, shift, scenario)
+        document.modified()
+        return {'steps': len(get_scenario(document.data, scenario)['steps'])}
+
+    def rpc_batch(self, file: str, operations: List[Dict[str, Any]], scenario: Optional[str] = None,
+                  dryRun: bool = False) -> Dict[str, Any]:
+        document = self.document(file)
+        data = dict(document.data) if dryRun else document.data
+        if dryRun:
+            key = scenario_key(data, scenario)
+            data[key] = dict(data[key])  # apply_batch only replaces the selected scenario's steps list
+        applied = apply_batch(data, list(enumerate(operations, 1)), scenario)
+        if not dryRun:
+            document.modified()
+        return {'applied': applied}
+
+    def rpc_query(self, file: str, scenario: Optional[str] = None, participant: Optional[str] = None,
+                  since: Optional[float] = None, until: Optional[float] = None, **filters: str) -> Dict[str, Any]:
+        unknown = set(filters) - set(INDEXED_FIELDS)
+        if unknown:
+            raise InvalidParamsError(f"unknown query filters: {', '.join(sorted(unknown))}")
+        index = select_indexed_scenarios(self.document(file).index, scenario)
+        return {'matches': [{'scenario': key, 'index': i, **summary}
+                            for key, i, summary in query_steps(index, filters, participant, since, until)]}
+
+    def rpc_validate(self, file: str) -> Dict[str, Any]:
+        document = self.document(file)
+        errors = []
+        for key, scenario in document.data.items():
+            if isinstance(scenario, dict) and isinstance(scenario.get('steps'), list):
+                steps_path = json_path_member(json_path_member('$', key), 'steps')
+                for i, step in enumerate(scenario['steps']):
+                    errors.extend({'path': path, 'message': message}
+                                  for path, message in check_step(step, f"{steps_path}[{i}]"))
+        return {'errors': errors}
+
+    def rpc_timeline(self, file: str, scenario: Optional[str] = None, gap: int = 0,
+                     audioDurations: bool = False) -> Dict[str, Any]:
+        steps = get_scenario(self.document(file).data, scenario)['steps']
+        problems = check_timeline(steps, TimelineOptions(gap, audioDurations))
+        return {'problems': [{'index': i, 'message': message} for i, message in problems]}
+
+    def rpc_retime(self, file: str, scenario: Optional[str] = None, gap: int = 0,
+                   audioDurations: bool = False) -> Dict[str, Any]:
+        document = self.document(file)
+        changes = retime_steps(get_scenario(document.data, scenario)['steps'], TimelineOptions(gap, audioDurations))
+        if changes:
+            document.modified()
+        return {'changes': [{'index': i, 'old': old, 'new': new} for i, old, new in changes]}
+
+    def rpc_save(self, file: Optional[str] = None) -> Dict[str, Any]:
+        documents = [self.document(file)] if file is not None else list(self.documents.values())
+        return {'saved': [document.path for document in documents if document.save()]}
+
+    def rpc_close(self, file: str, discard: bool = False) -> Dict[str, Any]:
+        document = self.documents.get(os.path.abspath(file))
+        if document is None:
+            return {'closed': False}
+        if document.dirty and not discard:
+            raise ValueError(f"{file} has unsaved edits; save it or close with discard")
+        del self.documents[os.path.abspath(file)]
+        return {'closed': True}
+
+
+def serve_session(socket_path: Optional[str] = None) -> int:
+    """Run an EditSession over stdin/stdout, or over a Unix socket (one client at a time) until interrupted"""
+
+    session = EditSession()
+    if socket_path is None:
+        session.serve(sys.stdin, lambda text: (sys.stdout.write(text), sys.stdout.flush()))
+    else:
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                lines = (line.decode('utf-8') for line in self.rfile)
+                session.serve(lines, lambda text: (self.wfile.write(text.encode('utf-8')), self.wfile.flush()))
+
+        def stop(signum, frame):
+            raise KeyboardInterrupt
+
+        signal.signal(signal.SIGTERM, stop)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        with socketserver.UnixStreamServer(socket_path, Handler) as server:
+            print(f"Serving on {socket_path}", file=sys.stderr)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.unlink(socket_path)
+
+    unsaved = session.unsaved()
+    if unsaved:
+        print(f"Warning: discarded unsaved edits to {', '.join(unsaved)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Manage steps in scenario JSON files",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Add a step at the beginning
+  python manage_steps.py --add-step '{"type": "send-message", "action": {"from": "customer", "to": "agent", "timestamp": 1234567890, "content": "Hello", "type": "text", "senderType": "customer"}}' --insert-at 0
+
+  # Remove a step at index 5
+  python manage_steps.py --remove-step 5
+
+  # List all steps
+  python manage_steps.py --list
+
+  # Use custom file
+  python manage_steps.py --file custom_scenario.json --list
+
+  # Apply a JSON Lines batch of edits in one transaction (use - for stdin)
+  python manage_steps.py --file ljy_250923.json --batch edits.jsonl
+    {"op": "insert", "at": 3, "step": {"type": "make-call", "action": {...}}}
+    {"op": "remove", "index": 7}
+    {"op": "move", "from": 2, "to": 5}
+    {"op": "replace", "index": 4, "step": {...}}
+    {"op": "patch", "index": 4, "patch": {"action": {"content": "New text", "reason": null}}}
+
+  # Check every step of several files against the step schemas
+  python manage_steps.py --validate src/data/*.json input_json/*.json
+
+  # Check the timeline, then fill in and spread out timestamps (clips count as step durations)
+  python manage_steps.py --timeline --audio-durations --gap 500
+  python manage_steps.py --retime --audio-durations --gap 500
+
+  # Insert a step and move later steps back to make room for it
+  python manage_steps.py --add-step '{...}' --insert-at 3 --shift
+
+  # Work on one scenario of a merged multi-scenario file
+  python manage_steps.py --file src/data/scenarios.json --scenario use_case_1_restaurant_reservation --list
+
+  # Keep documents in memory across many edits (JSON-RPC 2.0, one request per line)
+  python manage_steps.py --serve
+    {"jsonrpc": "2.0", "id": 1, "method": "add", "params": {"file": "src/data/scenarios.json", "scenario": "use_case_1_restaurant_reservation", "step": {...}, "at": 3}}
+    {"jsonrpc": "2.0", "id": 2, "method": "save", "params": {}}
+  Methods: open, list, add, remove, batch, query, validate, timeline, retime, save, close
+
+  # Compare two revisions step by step (exit status 1 when they differ)
+  python manage_steps.py --diff old/ljy_250923.json src/data/ljy_250923.json
+    + inserted   - removed   > moved   ~ modified (changed fields listed)
+
+  # Three-way merge of scenario files; the result replaces OURS unless --output is given.
+  # On conflicts nothing is written. As a git merge driver:
+  #   git config merge.scenario-steps.driver "python manage_steps.py --merge %O %A %B"
+  #   echo "src/data/*.json merge=scenario-steps" >> .gitattributes
+  python manage_steps.py --merge base.json ours.json theirs.json --output merged.json
+
+  # Query steps (filters combine with AND; the index is cached in .cache/manage-steps)
+  python manage_steps.py --file src/data/scenarios.json --query --type api-call --service uber
+  python manage_steps.py --file src/data/scenarios.json --query --from customer_agent --to restaurant_1_staff
+  python manage_steps.py --query --participant lifemate_agent --since 1000 --until 5000 --json
+        """
+    )
+
+    parser.add_argument(
+        '--file',
+        default='ljy_250923.json',
+        help='Path to the scenario JSON file (default: ljy_250923.json)'
+    )
+
+    parser.add_argument(
+        '--scenario',
+        metavar='ID',
+        help='Scenario to work on, by key or id, in files holding several (default: the first one)'
+    )
+
+    parser.add_argument(
+        '--add-step',
+        help='JSON string of the step to add'
+    )
+
+    parser.add_argument(
+        '--insert-at',
+        type=int,
+        help='Position to insert the new step (0-based index). If not specified, appends to the end'
+    )
+
+    parser.add_argument(
+        '--remove-step',
+        type=int,
+        help='Index of the step to remove (0-based)'
+    )
+
+    parser.add_argument(
+        '--list',
+        action='store_true',
+        help='List all steps in the scenario'
+    )
+
+    parser.add_argument(
+        '--query',
+        action='store_true',
+        help='List steps matching the filter options below, using the cached index'
+    )
+
+    parser.add_argument(
+        '--batch',
+        metavar='FILE',
+        help='Apply JSON Lines edit operations from FILE (- for stdin) in one transaction and save once'
+    )
+
+    parser.add_argument(
+        '--validate',
+        nargs='*',
+        metavar='FILE',
+        help='Check every step in the given scenario files (default: --file) and report all errors'
+    )
+
+    parser.add_argument(
+        '--timeline',
+        action='store_true',
+        help='Report missing, out-of-order and overlapping step timestamps'
+    )
+
+    parser.add_argument(
+        '--retime',
+        action='store_true',
+        help='Fill in missing timestamps and push overlapping steps later so the timeline is sorted'
+    )
+
+    parser.add_argument(
+        '--diff',
+        nargs=2,
+        metavar=('OLD', 'NEW'),
+        help='Report inserted, removed, moved and modified steps between two scenario files'
+    )
+
+    parser.add_argument(
+        '--merge',
+        nargs=3,
+        metavar=('BASE', 'OURS', 'THEIRS'),
+        help='Three-way merge the steps of OURS and THEIRS, both edited from BASE'
+    )
+
+    parser.add_argument(
+        '--output',
+        metavar='PATH',
+        help='With --merge, write the result here instead of over OURS'
+    )
+
+    parser.add_argument(
+        '--serve',
+        action='store_true',
+        help='Run an editing session answering JSON-RPC 2.0 requests (one per line) on stdin/stdout'
+    )
+
+    parser.add_argument(
+        '--socket',
+        metavar='PATH',
+        help='With --serve, listen on this Unix socket instead of stdin/stdout'
+    )
+
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='With --batch, --retime or --merge, report the changes without saving'
+    )
+
+    timeline_group = parser.add_argument_group('timeline options')
+    timeline_group.add_argument(
+        '--shift',
+        action='store_true',
+        help='With --add-step/--remove-step, move later timestamps to make room for or close up after the step'
+    )
+    timeline_group.add_argument('--gap', type=int, default=0, help='Minimum ms between consecutive steps (default: 0)')
+    timeline_group.add_argument(
+        '--audio-durations',
+        action='store_true',
+        help='Steps with an audio clip last as long as the clip (audioDuration, or the MP3 behind audioUrl)'
+    )
+    timeline_group.add_argument(
+        '--public-dir',
+        default=DEFAULT_PUBLIC_DIR,
+        help=f'Directory serving root-relative audio URLs (default: {DEFAULT_PUBLIC_DIR})'
+    )
+
+    query_group = parser.add_argument_group('query filters')
+    query_group.add_argument('--type', dest='step_type', help='Step type, e.g. api-call')
+    query_group.add_argument('--from', dest='from_', help='Sender (action.from)')
+    query_group.add_argument('--to', help='Receiver (action.to)')
+    query_group.add_argument('--participant', help='Sender or receiver')
+    query_group.add_argument('--sender-type', help='action.senderType (agent, customer, server)')
+    query_group.add_argument('--service', help='action.service of api-call/api-response steps')
+    query_group.add_argument('--since', type=float, help='Earliest action.timestamp (inclusive)')
+    query_group.add_argument('--until', type=float, help='Latest action.timestamp (inclusive)')
+    query_group.add_argument('--json', action='store_true', help='Print query matches or --diff changes as JSON Lines')
+    query_group.add_argument(
+        '--index-dir',
+        default=DEFAULT_INDEX_DIR,
+        help=f'Directory for cached query indexes (default: {DEFAULT_INDEX_DIR})'
+    )
+
+    args = parser.parse_args()
+
+    # Validate arguments
+    actions = [args.add_step, args.remove_step, args.list, args.query, args.batch, args.validate,
+               args.timeline, args.retime, args.diff, args.merge, args.serve]
+    if sum(action is not None and action is not False for action in actions) != 1:
+        parser.error("Exactly one action must be specified: --add-step, --remove-step, --list, --query, "
+                     "--batch, --validate, --timeline, --retime, --diff, --merge, or --serve")
+
+    if args.output and not args.merge:
+        parser.error("--output only applies to --merge")
+    if args.merge and args.scenario:
+        parser.error("--merge works on whole files; --scenario does not apply")
+
+    if args.socket and not args.serve:
+        parser.error("--socket only applies to --serve")
+
+    if args.shift and not (args.add_step or args.remove_step is not None):
+        parser.error("--shift only applies to --add-step and --remove-step")
+    if args.gap < 0:
+        parser.error("--gap must be a non-negative integer")
+    timeline = TimelineOptions(args.gap, args.audio_durations, args.public_dir)
+
+    if args.add_step and args.insert_at is not None and args.insert_at < 0:
+        parser.error("--insert-at must be a non-negative integer")
+
+    if args.serve:
+        return serve_session(args.socket)
+
+    try:
+        if args.query:
+            # Answered from the index; the scenario file is only parsed when it changed
+            filters = {field: value for field, value in (
+                ('type', args.step_type), ('from', args.from_), ('to', args.to),
+                ('senderType', args.sender_type), ('service', args.service),
+            ) if value is not None}
+            index = select_indexed_scenarios(load_step_index(args.file, args.index_dir), args.scenario)
+            matches = list(query_steps(index, filters, args.participant, args.since, args.until))
+            print_query_results(matches, args.json)
+            return 0
+
+        if args.validate is not None:
+            file_paths = args.validate or [args.file]
+            problems, step_count = validate_files(file_paths)
+            for file_path, path, message in problems:
+                print(f"{file_path}: {path}: {message}")
+            print(f"Checked {step_count} steps in {len(file_paths)} files: "
+                  f"{len(problems)} error{'s' if len(problems) != 1 else ''}")
+            return 1 if problems else 0
+
+        if args.diff:
+            old_path, new_path = args.diff
+            records = diff_scenario_files(load_scenario_json(old_path), load_scenario_json(new_path), args.scenario)
+            print_diff(records, args.json)
+            return 1 if records else 0
+
+        if args.merge:
+            base_path, ours_path, theirs_path = args.merge
+            ours_data, ours_source = load_scenario_document(ours_path)
+            merged, conflicts = merge_scenario_files(load_scenario_json(base_path), ours_data,
+                                                     load_scenario_json(theirs_path))
+            for conflict in conflicts:
+                print(f"Conflict: {conflict}")
+            if conflicts:
+                print(f"Merge has {len(conflicts)} conflict{'s' if len(conflicts) != 1 else ''}, nothing written")
+                return 1
+            if args.dry_run:
+                print_diff(diff_scenario_files(ours_data, merged))
+                print("Dry run, nothing saved")
+            else:
+                save_scenario_json(args.output or ours_path, merged, ours_source)
+            return 0
+
+        if args.list:
+            # Read-only, so the file is scanned instead of parsed
+            list_steps_streaming(args.file, args.scenario)
+            return 0
+
+        # Load scenario data
+        scenario_data, source = load_scenario_document(args.file)
+
+        # Perform requested action
+        if args.add_step:
+            scenario_data = add_step(scenario_data, args.add_step, args.insert_at,
+                                     timeline if args.shift else None, args.scenario)
+            save_scenario_json(args.file, scenario_data, source)
+        elif args.remove_step is not None:
+            scenario_data = remove_step(scenario_data, args.remove_step, args.shift, args.scenario)
+            save_scenario_json(args.file, scenario_data, source)
+        elif args.timeline:
+            steps = get_scenario(scenario_data, args.scenario)['steps']
+            problems = check_timeline(steps, timeline)
+            for i, problem in problems:
+                step_type = steps[i].get('type', 'unknown') if isinstance(steps[i], dict) else 'invalid'
+                print(f"step {i} ({step_type}): {problem}")
+            print(f"Checked {len(steps)} steps: "
+                  f"{len(problems) or 'no'} timeline problem{'s' if len(problems) != 1 else ''}")
+            return 1 if problems else 0
+        elif args.retime:
+            changes = retime_steps(get_scenario(scenario_data, args.scenario)['steps'], timeline)
+            for i, old, new in changes:
+                print(f"step {i}: {'missing' if old is None else old} -> {new}")
+            if not changes:
+                print("Timeline already consistent, nothing changed")
+            elif args.dry_run:
+                print(f"Would retime {len(changes)} steps. Dry run, nothing saved")
+            else:
+                print(f"Retimed {len(changes)} steps")
+                save_scenario_json(args.file, scenario_data, source)
+        elif args.batch:
+            if args.batch == '-':
+                operations = read_batch(sys.stdin)
+            else:
+                with open(args.batch, 'r', encoding='utf-8') as f:
+                    operations = read_batch(f)
+            for line in apply_batch(scenario_data, operations, args.scenario):
+                print(line)
+            print(f"Applied {len(operations)} operations")
+            if args.dry_run:
+                print("Dry run, nothing saved")
+            else:
+                save_scenario_json(args.file, scenario_data, source)
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
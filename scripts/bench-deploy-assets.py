@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for deploy-assets.py
+
+Generates synthetic scenario JSON in the same shape as input_json/*.json and times
+each phase of the deploy pipeline. Every run deploys in a fresh process, so peak RSS
+covers one deploy. Results are written as JSON and can be compared with an earlier run.
+
+Usage:
+    python scripts/bench-deploy-assets.py
+    python scripts/bench-deploy-assets.py --preset large --repeat 5
+    python scripts/bench-deploy-assets.py --scenarios 4 --steps 60 --data-urls 30 --payload-kb 200
+    python scripts/bench-deploy-assets.py --stream --output bench-new.json --compare bench-old.json
+"""
+
+import argparse
+import base64
+import contextlib
+import importlib.util
+import io
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# deploy-assets.py is not importable by name because of the dash
+_spec = importlib.util.spec_from_file_location('deploy_assets', Path(__file__).with_name('deploy-assets.py'))
+deploy_assets = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(deploy_assets)
+
+# name -> (scenarios, steps per scenario, data URLs per scenario, payload KB)
+PRESETS = {
+    'small': (2, 30, 12, 60),
+    'medium': (4, 60, 30, 150),
+    'large': (8, 120, 60, 300),
+}
+
+DEFAULT_RESULTS_PATH = f'{deploy_assets.DEFAULT_CACHE_DIR}/bench.json'
+
+# Reported phases in pipeline order, from the deployer's own instrumentation.
+# extract+replace is finding data URLs and swapping in asset paths (the tree walk
+# in memory, the byte scanner with --stream); decode+store is the per-asset work
+# it calls, reported separately. In streaming mode parse only sees the small
+# rewritten JSON.
+PHASES = ('parse', 'extract+replace', 'decode+store', 'dump')
+
+def synthetic_payload(rng: random.Random, size: int, mime_type: str) -> bytes:
+    """Random bytes behind a plausible magic number, so payloads never dedupe."""
+    magic = {'audio/mpeg': b'ID3\x04\x00\x00', 'image/png': b'\x89PNG\r\n\x1a\n'}[mime_type]
+    return magic + rng.randbytes(max(0, size - len(magic)))
+
+def step_types(rng: random.Random, steps: int) -> List[str]:
+    """
+    Lay out `steps` step types the way src/data scenarios run: calls opened with
+    make-call/accept-call and closed with finish-call, messages in between and
+    occasional api-call/api-response pairs. Over a long scenario this comes to
+    roughly 60% send-message, 10% each call step and 4% each API step.
+    """
+    types = ['make-call', 'accept-call'][:steps]
+    in_call = True
+    while len(types) < steps:
+        roll = rng.random()
+        room = steps - len(types)
+        if in_call and roll < 0.15:
+            types.append('finish-call')
+            in_call = False
+        elif not in_call and roll < 0.6 and room >= 2:
+            types += ['make-call', 'accept-call']
+            in_call = True
+        elif 0.95 < roll and room >= 2:
+            types += ['api-call', 'api-response']
+        else:
+            types.append('send-message')
+    return types
+
+def generate_scenario(index: int, steps: int, data_urls: int, payload_kb: int, seed: int) -> Dict[str, Any]:
+    """
+    Build one scenario file: {id: {id, title, description, agents, customer, servers, steps}}.
+    Voice messages carry audioUrl data URLs; every fifth one is an image message instead.
+    Only send-message steps carry data URLs, so a scenario has at most as many as it
+    has messages.
+    """
+    rng = random.Random(seed * 1000 + index)
+    scenario_id = f"bench_scenario_{index}"
+    agents = ['customer', 'assistant_agent', 'restaurant_agent']
+    service = 'booking_api'
+
+    types = step_types(rng, steps)
+    messages = [n for n, step_type in enumerate(types) if step_type == 'send-message']
+    voice_steps = set(rng.sample(messages, min(data_urls, len(messages))))
+    step_list = []
+    caller, callee = agents[0], agents[1]
+    for n, step_type in enumerate(types):
+        if step_type == 'make-call':
+            caller, callee = rng.sample(agents, 2)
+            step_list.append({'type': step_type, 'action': {'from': caller, 'to': callee}})
+            continue
+        if step_type in ('accept-call', 'finish-call'):
+            action = {'from': caller, 'to': callee}
+            if step_type == 'finish-call' and rng.random() < 0.5:
+                action['reason'] = '*Synthetic call summary ' + 'z' * rng.randint(20, 80)
+            step_list.append({'type': step_type, 'action': action})
+            continue
+        if step_type == 'api-call':
+            step_list.append({'type': step_type, 'action': {
+                'from': agents[1], 'to': service, 'service': 'booking',
+                'request': f"**Synthetic request {n}**  \n" + 'r' * rng.randint(20, 120),
+                'reason': '*Synthetic API reasoning ' + 'y' * rng.randint(20, 80)}})
+            continue
+        if step_type == 'api-response':
+            step_list.append({'type': step_type, 'action': {
+                'from': service, 'to': agents[1], 'service': 'booking',
+                'response': f"Synthetic response {n} " + 'r' * rng.randint(10, 60)}})
+            continue
+
+        sender, receiver = rng.sample(agents, 2)
+        action = {'from': sender, 'to': receiver, 'content': f"Synthetic message {n} " + 'x' * rng.randint(20, 200)}
+        if n in voice_steps:
+            if len(step_list) % 5 == 0:
+                mime_type, key = 'image/png', 'imageUrl'
+                action['type'] = 'image'
+            else:
+                mime_type, key = 'audio/mpeg', 'audioUrl'
+                action['type'] = 'voice'
+            size = int(payload_kb * 1024 * rng.uniform(0.5, 1.5))
+            encoded = base64.b64encode(synthetic_payload(rng, size, mime_type)).decode('ascii')
+            action[key] = f"data:{mime_type};base64,{encoded}"
+            if rng.random() < 0.5:
+                action['reason'] = '*Synthetic reasoning  \n*' + 'y' * rng.randint(20, 120)
+        step_list.append({'type': 'send-message', 'action': action})
+
+    return {scenario_id: {
+        'id': scenario_id,
+        'title': f"Benchmark scenario {index}",
+        'description': 'Synthetic scenario generated by bench-deploy-assets.py',
+        'agents': [{'id': agent, 'name': agent.replace('_', ' ').title()} for agent in agents],
+        'customer': {'id': agents[0], 'name': 'Customer'},
+        'servers': [],
+        'steps': step_list,
+    }}
+
+def write_inputs(input_dir: Path, params: Dict[str, Any]) -> int:
+    """Write the synthetic input files and return their total size in bytes."""
+    total = 0
+    for index in range(params['scenarios']):
+        scenario = generate_scenario(index, params['steps'], params['data_urls'], params['payload_kb'], params['seed'])
+        path = input_dir / f"bench_{index:03d}.json"
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(scenario, f, indent=2, ensure_ascii=False)
+        total += path.stat().st_size
+    return total
+
+class PhaseTimer(deploy_assets.Instrumentation):
+    """Sum the wall time of every deployer phase by name."""
+
+    def __init__(self):
+        self.totals = Counter()
+
+    @contextlib.contextmanager
+    def phase(self, name: str, category: str = 'deploy', **args):
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.totals[name] += time.perf_counter() - start
+
+def peak_rss_kb() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss  # bytes on macOS, KB on Linux
+
+def run_once(input_dir: Path, work_dir: Path, stream: bool) -> Dict[str, Any]:
+    """Deploy input_dir into a fresh work_dir; runs in its own process (see run_case)."""
+    startup_rss = peak_rss_kb()
+    timer = PhaseTimer()
+    deployer = deploy_assets.AssetDeployer(str(input_dir), str(work_dir / 'scenarios.json'),
+                                           str(work_dir / 'assets'), stream=stream, instrumentation=timer)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if not deployer.deploy_assets():
+            raise RuntimeError("Benchmark deploy failed")
+    total = time.perf_counter() - start
+
+    phases = timer.totals
+    return {
+        'parse': phases['parse'],
+        'extract+replace': phases['rewrite data URLs'] - phases['asset'],
+        'decode+store': phases['asset'],
+        'dump': phases['dump'],
+        'total': total,
+        'assets': len(deployer.processed_files),
+        'asset_bytes': sum(asset.size for asset in deployer.processed_files.values()),
+        'startup_rss_kb': startup_rss,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+def run_case(name: str, params: Dict[str, Any], repeat: int, stream: bool) -> Dict[str, Any]:
+    """Generate inputs, deploy them `repeat` times and keep the median of each phase."""
+    # Spawned, not forked, so a run's RSS holds neither the generator's memory nor earlier runs
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory(prefix='bench-deploy-') as tmp:
+        input_dir = Path(tmp) / 'input'
+        input_dir.mkdir()
+        input_bytes = write_inputs(input_dir, params)
+
+        runs = []
+        for n in range(repeat):
+            work_dir = Path(tmp) / f"run{n}"
+            work_dir.mkdir()
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                runs.append(pool.submit(run_once, input_dir, work_dir, stream).result())
+
+    phases = {key: round(statistics.median(run[key] for run in runs), 6) for key in (*PHASES, 'total')}
+    return {
+        'name': f"{name} (stream)" if stream else name,
+        'params': params,
+        'stream': stream,
+        'input_bytes': input_bytes,
+        'assets': runs[0]['assets'],
+        'asset_bytes': runs[0]['asset_bytes'],
+        'phases': phases,
+        'throughput_mb_s': round(input_bytes / 1024 / 1024 / phases['total'], 2) if phases['total'] else None,
+        'peak_rss_kb': max(run['peak_rss_kb'] for run in runs),
+        'startup_rss_kb': round(statistics.median(run['startup_rss_kb'] for run in runs)),
+    }
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_case(case: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> None:
+    params = case['params']
+    print(f"\n📊 {case['name']}: {params['scenarios']} scenarios x {params['steps']} steps, "
+          f"{case['assets']} assets, {case['input_bytes'] / 1024 / 1024:.1f} MB input")
+    for phase, seconds in case['phases'].items():
+        line = f"  {phase:<18} {seconds * 1000:9.1f} ms"
+        if previous and phase in previous['phases'] and previous['phases'][phase]:
+            change = (seconds - previous['phases'][phase]) / previous['phases'][phase] * 100
+            line += f"  ({change:+.1f}%)"
+        print(line)
+    line = (f"  {'peak RSS':<18} {case['peak_rss_kb'] / 1024:9.1f} MB"
+            f"  ({case['startup_rss_kb'] / 1024:.1f} MB before deploying)")
+    if previous:
+        line += f"  (was {previous['peak_rss_kb'] / 1024:.1f} MB)"
+    print(line)
+    if case['throughput_mb_s']:
+        print(f"  {'throughput':<18} {case['throughput_mb_s']:9.1f} MB/s")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the deploy-assets pipeline on synthetic scenarios",
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+
+    parser.add_argument(
+        '--preset', '-p',
+        choices=sorted(PRESETS) + ['all'],
+        default='all',
+        help='Predefined case(s) to run when no custom sizes are given (default: all)'
+    )
+
+    parser.add_argument('--scenarios', type=int, help='Custom case: number of scenario files')
+    parser.add_argument('--steps', type=int, help='Custom case: steps per scenario')
+    parser.add_argument('--data-urls', type=int, help='Custom case: data URLs per scenario')
+    parser.add_argument('--payload-kb', type=int, help='Custom case: average decoded payload size in KB')
+
+    parser.add_argument(
+        '--repeat', '-r',
+        type=int,
+        default=3,
+        help='Runs per case; the median of each phase is reported (default: 3)'
+    )
+
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=1,
+        help='Random seed for the generator (default: 1)'
+    )
+
+    parser.add_argument(
+        '--stream', '-s',
+        action='store_true',
+        help='Also run every case in streaming mode (deploy-assets.py --stream), reported as "<case> (stream)"'
+    )
+
+    parser.add_argument(
+        '--output', '-o',
+        default=DEFAULT_RESULTS_PATH,
+        help=f'Results JSON path (default: {DEFAULT_RESULTS_PATH})'
+    )
+
+    parser.add_argument(
+        '--compare',
+        metavar='PATH',
+        help='Earlier results JSON to print per-phase changes against'
+    )
+
+    args = parser.parse_args()
+    if args.repeat < 1:
+        parser.error("--repeat must be a positive integer")
+
+    custom = [args.scenarios, args.steps, args.data_urls, args.payload_kb]
+    if any(value is not None for value in custom):
+        defaults = PRESETS['small']
+        values = [value if value is not None else default for value, default in zip(custom, defaults)]
+        if min(values) < 1:
+            parser.error("--scenarios, --steps, --data-urls and --payload-kb must be positive")
+        cases = {'custom': values}
+    elif args.preset == 'all':
+        cases = PRESETS
+    else:
+        cases = {args.preset: PRESETS[args.preset]}
+
+    previous = {}
+    if args.compare:
+        try:
+            with open(args.compare, 'r', encoding='utf-8') as f:
+                previous = {case['name']: case for case in json.load(f)['cases']}
+        except (OSError, ValueError, KeyError) as e:
+            parser.error(f"Cannot read --compare results: {e}")
+
+    print("⏱️  Benchmarking deploy-assets.py")
+    results = []
+    for name, (scenarios, steps, data_urls, payload_kb) in cases.items():
+        params = {'scenarios': scenarios, 'steps': steps, 'data_urls': data_urls,
+                  'payload_kb': payload_kb, 'seed': args.seed}
+        for stream in (False, True) if args.stream else (False,):
+            case = run_case(name, params, args.repeat, stream)
+            print_case(case, previous.get(case['name']))
+            results.append(case)
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'cases': results,
+    }
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Saved results to: {output_path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Step dedup index for scenario files
+
+Hashes every step and every action payload of the given scenario files with the
+canonical step hash from scenario_steps.py and reports what recurs: identical
+steps, identical payloads (voice lines, API requests and responses, images) and
+near-duplicate steps that differ only in timestamps, ids, whitespace or Markdown
+emphasis. Voice clips and images are hashed by their decoded bytes, using the
+deployer's content addresses, so a data URL and the deployed asset URL of the
+same clip count as one payload.
+
+Optionally writes copies of the files in which repeated payloads are replaced by
+{"$payload": KEY} references into one shared payloads.json table.
+
+Usage:
+    python scripts/dedup-steps.py
+    python scripts/dedup-steps.py input_json src/data/ljy_250923.json src/data/mk_250924.json
+    python scripts/dedup-steps.py --min-bytes 200 --limit 20 --index .cache/dedup-index.json
+    python scripts/dedup-steps.py --rewrite build/dedup
+"""
+
+import argparse
+import binascii
+import importlib.util
+import json
+import re
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# deploy-assets.py is not importable by name because of the dash
+_spec = importlib.util.spec_from_file_location('deploy_assets', Path(__file__).with_name('deploy-assets.py'))
+deploy_assets = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(deploy_assets)
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import scenario_steps  # noqa: E402
+
+# Action members that change between otherwise identical steps
+VOLATILE_FIELDS = ('timestamp', 'id')
+
+# Payload reference left in rewritten files; KEY indexes the shared table
+PAYLOAD_REF = '$payload'
+PAYLOAD_KEY_CHARS = 16
+
+DEPLOYED_ASSET_URL = re.compile(re.escape(deploy_assets.ASSET_URL_PREFIX) + r'/[0-9a-f]{2}/([0-9a-f]{64})\.\w+$')
+
+class AssetAwareHasher(scenario_steps.PayloadHasher):
+    """
+    Canonical hashing in which a data URL and a deployed asset URL stand for the
+    content address of their bytes (the digest AssetStore names files by).
+    """
+
+    def canonical(self, value: Any) -> Any:
+        if isinstance(value, str) and value.startswith(deploy_assets.ASSET_URL_PREFIX):
+            match = DEPLOYED_ASSET_URL.match(value)
+            if match:
+                return f"<asset {match.group(1)}>"
+        return super().canonical(value)
+
+    def large_placeholder(self, value: str) -> str:
+        address = data_url_address(value)
+        return f"<asset {address}>" if address else super().large_placeholder(value)
+
+def data_url_address(value: str) -> Optional[str]:
+    """Content address of a base64 data URL's decoded bytes, decoded block by block."""
+    match = deploy_assets.AssetDeployer.DATA_URL_HEADER.match(value, 0, deploy_assets.MAX_DATA_URL_HEADER)
+    if not match:
+        return None
+    decoder = deploy_assets.Base64StreamDecoder()
+    digest = deploy_assets.new_asset_digest()
+    try:
+        for chunk in deploy_assets.data_url_chunks(value, match.end()):
+            digest.update(decoder.feed(chunk))
+        digest.update(decoder.finish())
+    except (binascii.Error, ValueError, UnicodeEncodeError):
+        return None
+    return digest.hexdigest()
+
+def payload_size(value: Any) -> int:
+    """Bytes the value takes in a scenario file (JSON text, UTF-8)."""
+    if isinstance(value, str):
+        return len(value) + 2 if value.isascii() else len(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+    return len(json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+def normalized_text(value: str) -> str:
+    return ' '.join(value.replace('**', '').split()).casefold()
+
+def near_duplicate_form(step: Any, large: int) -> Any:
+    """The step without volatile action members, with short strings normalized."""
+    def normalize(value: Any) -> Any:
+        if isinstance(value, str):
+            return normalized_text(value) if len(value) < large else value
+        if isinstance(value, dict):
+            return {key: normalize(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [normalize(item) for item in value]
+        return value
+
+    if isinstance(step, dict) and isinstance(step.get('action'), dict):
+        step = dict(step, action={key: value for key, value in step['action'].items() if key not in VOLATILE_FIELDS})
+    return normalize(step)
+
+def scenario_files(paths: List[str]) -> List[Path]:
+    """Expand directories to the JSON files directly inside them."""
+    files = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.glob('*.json')) if path.is_dir() else [path])
+    return files
+
+def iter_steps(data: Any) -> Iterator[Tuple[str, int, Any]]:
+    """(scenario key, step index, step) for every step of every scenario in a file."""
+    if not isinstance(data, dict):
+        return
+    for key, scenario in data.items():
+        if isinstance(scenario, dict) and isinstance(scenario.get('steps'), list):
+            for i, step in enumerate(scenario['steps']):
+                yield key, i, step
+
+class DedupIndex:
+    """Step and payload hashes across files, mapped to every place they occur."""
+
+    def __init__(self, min_bytes: int = 64):
+        self.min_bytes = min_bytes
+        self.hasher = AssetAwareHasher()
+        self.steps = {}  # step hash -> [location]
+        self.near = {}  # near-duplicate hash -> {step hash}
+        self.payloads = {}  # payload hash -> {'field', 'bytes' (first seen), 'totalBytes', 'refs'}
+        self.step_count = 0
+        self.files = []
+
+    def add_file(self, path: Path, data: Any) -> None:
+        self.files.append(str(path))
+        for key, i, step in iter_steps(data):
+            self.step_count += 1
+            location = [str(path), key, i]
+            step_hash = self.hasher.fingerprint(step)
+            self.steps.setdefault(step_hash, []).append(location)
+            near_hash = self.hasher.fingerprint(near_duplicate_form(step, self.hasher.large))
+            self.near.setdefault(near_hash, set()).add(step_hash)
+
+            action = step.get('action') if isinstance(step, dict) else None
+            if not isinstance(action, dict):
+                continue
+            for field, value in action.items():
+                size = payload_size(value)
+                if field in VOLATILE_FIELDS or size < self.min_bytes:
+                    continue
+                entry = self.payloads.setdefault(self.hasher.fingerprint(value),
+                                                 {'field': field, 'bytes': size, 'totalBytes': 0, 'refs': []})
+                entry['totalBytes'] += size
+                entry['refs'].append(location + [field])
+
+    def duplicate_steps(self) -> List[Tuple[str, List[List[Any]]]]:
+        return sorted(((digest, locations) for digest, locations in self.steps.items() if len(locations) > 1),
+                      key=lambda item: -len(item[1]))
+
+    def near_duplicates(self) -> List[List[str]]:
+        """Groups of distinct step hashes that are equal once normalized."""
+        return sorted((sorted(group) for group in self.near.values() if len(group) > 1), key=len, reverse=True)
+
+    def duplicate_payloads(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Payloads occurring more than once, by bytes that sharing them would save."""
+        return sorted(((digest, entry) for digest, entry in self.payloads.items() if len(entry['refs']) > 1),
+                      key=lambda item: item[1]['bytes'] - item[1]['totalBytes'])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'version': 1,
+            'minBytes': self.min_bytes,
+            'files': self.files,
+            'steps': self.steps,
+            'nearDuplicates': self.near_duplicates(),
+            'payloads': self.payloads,
+        }
+
+def format_location(location: List[Any]) -> str:
+    path, key, i = location[:3]
+    return f"{path} {key} step {i}" + (f" .{location[3]}" if len(location) > 3 else '')
+
+def print_report(index: DedupIndex, limit: int) -> None:
+    duplicate_steps = index.duplicate_steps()
+    near_groups = index.near_duplicates()
+    duplicate_payloads = index.duplicate_payloads()
+
+    print(f"\n🔁 Identical steps: {len(duplicate_steps)} groups")
+    for digest, locations in duplicate_steps[:limit]:
+        print(f"   {digest[:12]} x{len(locations)}: " + '; '.join(map(format_location, locations[:4]))
+              + (' ...' if len(locations) > 4 else ''))
+
+    print(f"\n≈  Near-duplicate steps (differ in {', '.join(VOLATILE_FIELDS)}, whitespace, case or **): "
+          f"{len(near_groups)} groups")
+    for group in near_groups[:limit]:
+        print('   ' + ' ~ '.join(format_location(index.steps[digest][0]) for digest in group[:4])
+              + (' ...' if len(group) > 4 else ''))
+
+    print(f"\n📦 Repeated payloads (>= {index.min_bytes} bytes): {len(duplicate_payloads)}")
+    for digest, entry in duplicate_payloads[:limit]:
+        refs = entry['refs']
+        print(f"   {entry['field']:<12} {entry['totalBytes'] / len(refs) / 1024:>9.1f} KB x{len(refs):<3} "
+              f"first at {format_location(refs[0])}")
+
+    total = sum(entry['totalBytes'] for entry in index.payloads.values())
+    unique = sum(entry['bytes'] for entry in index.payloads.values())
+    print(f"\n📊 {index.step_count} steps in {len(index.files)} files, {len(index.steps)} unique")
+    if total:
+        print(f"   Payload bytes: {total / 1024:.1f} KB total, {unique / 1024:.1f} KB unique "
+              f"({(total - unique) / total * 100:.1f}% repeated)")
+
+class PayloadTable:
+    """
+    Shared table of repeated payloads. Keys come from the plain canonical hash
+    (not the asset-aware one), so expanding a reference gives back exactly the
+    value it replaced.
+    """
+
+    def __init__(self, min_bytes: int):
+        self.min_bytes = min_bytes
+        self.hasher = scenario_steps.PayloadHasher()
+        self.counts = Counter()
+        self.values = {}
+
+    def key_for(self, value: Any) -> str:
+        return self.hasher.fingerprint(value)[:PAYLOAD_KEY_CHARS]
+
+    def count(self, data: Any) -> None:
+        for _, _, step in iter_steps(data):
+            action = step.get('action') if isinstance(step, dict) else None
+            if isinstance(action, dict):
+                for field, value in action.items():
+                    if field not in VOLATILE_FIELDS and payload_size(value) >= self.min_bytes:
+                        self.counts[self.key_for(value)] += 1
+
+    def rewrite(self, data: Any) -> int:
+        """Replace payloads counted more than once with references, in place; returns how many."""
+        replaced = 0
+        for _, _, step in iter_steps(data):
+            action = step.get('action') if isinstance(step, dict) else None
+            if not isinstance(action, dict):
+                continue
+            for field, value in action.items():
+                if field in VOLATILE_FIELDS or payload_size(value) < self.min_bytes:
+                    continue
+                key = self.key_for(value)
+                if self.counts[key] < 2:
+                    continue
+                stored = self.values.setdefault(key, value)
+                if stored is not value and self.hasher.fingerprint(stored) != self.hasher.fingerprint(value):
+                    raise ValueError(f"Payload key collision: {key}")
+                action[field] = {PAYLOAD_REF: key}  # same key, so safe while iterating
+                replaced += 1
+        return replaced
+
+def expand_payload_refs(data: Any, table: Dict[str, Any]) -> Any:
+    """Inverse of PayloadTable.rewrite: a copy of data with every reference replaced by its payload."""
+    if isinstance(data, dict):
+        if len(data) == 1 and PAYLOAD_REF in data:
+            return table[data[PAYLOAD_REF]]
+        return {key: expand_payload_refs(value, table) for key, value in data.items()}
+    if isinstance(data, list):
+        return [expand_payload_refs(item, table) for item in data]
+    return data
+
+def write_rewritten(files: List[Tuple[Path, Any]], output_dir: Path, min_bytes: int) -> None:
+    """Write every file with repeated payloads as references, plus payloads.json."""
+    table = PayloadTable(min_bytes)
+    for _, data in files:
+        table.count(data)
+
+    rewritten = []
+    replaced = 0
+    for path, data in files:
+        original = scenario_steps.PayloadHasher().fingerprint(data)
+        replaced += table.rewrite(data)
+        if scenario_steps.PayloadHasher().fingerprint(expand_payload_refs(data, table.values)) != original:
+            raise ValueError(f"Rewritten {path} does not expand back to the original")
+        rewritten.append((output_dir / path.name, data))
+    if len({target for target, _ in rewritten}) != len(rewritten):
+        raise ValueError("Input files share a name; rewrite them into separate directories")
+
+    before = sum(path.stat().st_size for path, _ in files)
+    after = 0
+    for target, data in rewritten + [(output_dir / 'payloads.json', table.values)]:
+        body = json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+        scenario_steps.write_bytes_atomic(str(target), [body])
+        after += len(body)
+    print(f"\n✅ Wrote {len(rewritten)} files + payloads.json to: {output_dir} "
+          f"({replaced} references to {len(table.values)} shared payloads, "
+          f"{before / 1024:.1f} KB -> {after / 1024:.1f} KB)")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Find repeated steps and payloads across scenario files",
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+
+    parser.add_argument(
+        'paths',
+        nargs='*',
+        default=['input_json'],
+        help='Scenario files, or directories of them (default: input_json)'
+    )
+
+    parser.add_argument(
+        '--min-bytes',
+        type=int,
+        default=64,
+        help='Smallest action payload, in bytes of JSON, that is indexed and shared (default: 64)'
+    )
+
+    parser.add_argument(
+        '--limit',
+        type=int,
+        default=10,
+        help='Groups listed per report section (default: 10)'
+    )
+
+    parser.add_argument(
+        '--index',
+        metavar='PATH',
+        help='Also write the dedup index (hash -> locations) as JSON to PATH'
+    )
+
+    parser.add_argument(
+        '--rewrite',
+        metavar='DIR',
+        help='Write copies of the files with repeated payloads replaced by references into DIR/payloads.json'
+    )
+
+    args = parser.parse_args()
+    if args.min_bytes < 1 or args.limit < 0:
+        parser.error("--min-bytes must be positive and --limit non-negative")
+
+    try:
+        files = [(path, scenario_steps.load_scenario_json(str(path))) for path in scenario_files(args.paths)]
+    except (OSError, ValueError) as e:
+        print(f"💥 {e}")
+        sys.exit(1)
+    if not files:
+        print("💥 No scenario files found")
+        sys.exit(1)
+
+    print(f"🔎 Indexing {len(files)} scenario files")
+    index = DedupIndex(args.min_bytes)
+    for path, data in files:
+        index.add_file(path, data)
+    print_report(index, args.limit)
+
+    if args.index:
+        scenario_steps.write_json_atomic(args.index, index.to_dict(), ensure_ascii=False)
+        print(f"\n✅ Saved index to: {args.index}")
+    if args.rewrite:
+        try:
+            write_rewritten(files, Path(args.rewrite), args.min_bytes)
+        except (OSError, ValueError) as e:
+            print(f"💥 {e}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -7,20 +7,56 @@ It extracts audio and image data URLs, saves them as files, and replaces the URL
 
 Usage:
     python scripts/deploy-assets.py
-    python scripts/deploy-assets.py --clean  # Clean existing assets first
+    python scripts/deploy-assets.py --clean  # Remove assets no longer referenced by any input
+    python scripts/deploy-assets.py --force  # Ignore the build manifest and reprocess everything
+    python scripts/deploy-assets.py --stream # Decode data URLs chunk by chunk (bounded memory)
+    python scripts/deploy-assets.py --jobs 4 # Process input files on a 4-process pool
+    python scripts/deploy-assets.py --write-behind --write-queue-mb 64  # Overlap decoding and disk writes
+    python scripts/deploy-assets.py --optimize-images --image-format webp --responsive-widths 480,960
+    python scripts/deploy-assets.py --transcode-audio --opus-bitrate 24 --mp3-bitrate 48
+    python scripts/deploy-assets.py --split public/scenarios --precompress gzip,br
+    python scripts/deploy-assets.py --preload-manifest public/scenarios/preload.json
+    python scripts/deploy-assets.py --output-format minified --precompress gzip,br --format-report
+    python scripts/deploy-assets.py --watch  # Rebuild changed inputs on save
+    python scripts/deploy-assets.py --profile --profile-memory  # Chrome trace in .cache/deploy-assets/trace.json
     python scripts/deploy-assets.py --input input_json --output src/data --assets public/assets/deployed
 """
 
 import argparse
 import base64
+import binascii
+import contextlib
+import filecmp
+import functools
+import gzip
 import hashlib
+import io
 import json
 import os
 import re
 import shutil
+import statistics
+import struct
+import subprocess
 import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Any, Tuple, Optional
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Any, Tuple, Optional
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; only --optimize-images needs it
+    Image = None
+
+try:
+    import brotli
+except ImportError:  # Optional; only --precompress br needs it
+    brotli = None
 
 # MIME type to file extension mapping
 MIME_TO_EXT = {
@@ -35,170 +71,1621 @@ MIME_TO_EXT = {
     'image/webp': '.webp'
 }
 
+# JSON keys whose string values may hold embedded data URLs
+DATA_URL_KEYS = ('audioUrl', 'imageUrl')
+
+# Read size for streaming mode; peak memory stays around a few of these
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Longest "data:<mime>;base64," header accepted in streaming mode
+MAX_DATA_URL_HEADER = 256
+
+# Build manifest and transform caches used to skip unchanged work between runs
+DEFAULT_CACHE_DIR = '.cache/deploy-assets'
+DEFAULT_MANIFEST_PATH = f'{DEFAULT_CACHE_DIR}/manifest.json'
+DEFAULT_TRACE_PATH = f'{DEFAULT_CACHE_DIR}/trace.json'
+
+# Public URL under which the assets directory is served
+ASSET_URL_PREFIX = '/assets/deployed'
+
+def new_asset_digest():
+    """Hash object used for content addresses (full 256-bit BLAKE2b, faster than SHA-256)."""
+    return hashlib.blake2b(digest_size=32)
+
 class AssetFile:
-    def __init__(self, data: bytes, mime_type: str, original_url: str):
+    def __init__(self, data: Optional[bytes], mime_type: str, original_url: Optional[str],
+                 digest: Optional[str] = None, size: Optional[int] = None):
         self.data = data
         self.mime_type = mime_type
         self.original_url = original_url
         self.extension = MIME_TO_EXT.get(mime_type, '.bin')
-        self.hash = hashlib.md5(data).hexdigest()[:8]  # Short hash for filename
-        self.filename = f"{self.hash}{self.extension}"
+        if digest is None:
+            hasher = new_asset_digest()
+            hasher.update(data)
+            digest = hasher.hexdigest()
+        self.hash = digest
+        self.size = size if size is not None else len(data)
+        # Fan out by the first two hex digits to keep directories small
+        self.filename = f"{self.hash[:2]}/{self.hash}{self.extension}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'hash': self.hash, 'mime_type': self.mime_type, 'size': self.size}
+
+    @classmethod
+    def from_dict(cls, entry: Dict[str, Any]) -> 'AssetFile':
+        return cls(None, entry['mime_type'], None, digest=entry['hash'], size=entry['size'])
 
 class ProcessResult:
-    def __init__(self, original_url: str, new_url: str, file_path: str):
-        self.original_url = original_url
+    def __init__(self, original_size: int, new_url: str, file_path: str, asset_hash: str):
+        self.original_size = original_size
         self.new_url = new_url
         self.file_path = file_path
+        self.asset_hash = asset_hash
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, entry: Dict[str, Any]) -> 'ProcessResult':
+        return cls(**entry)
+
+class AssetCollisionError(Exception):
+    """Different content was found under an existing content address."""
+
+class AssetStore:
+    """
+    Content-addressed asset files: <root>/<aa>/<digest><ext>. Writes go through a
+    temp file and rename, and are skipped when identical content is already on
+    disk, so repeated or concurrent deploys can share one directory safely.
+    """
+
+    def __init__(self, root: Path, url_prefix: str = ASSET_URL_PREFIX, verify: bool = False):
+        self.root = root
+        self.url_prefix = url_prefix
+        self.verify = verify
+
+    def path_for(self, asset: AssetFile) -> Path:
+        return self.root / asset.filename
+
+    def url_for(self, asset: AssetFile) -> str:
+        return f"{self.url_prefix}/{asset.filename}"
+
+    @staticmethod
+    def digest_file(path: Path) -> str:
+        hasher = new_asset_digest()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def contains(self, asset: AssetFile, candidate: Optional[Path] = None) -> bool:
+        """
+        True if the asset's content is already stored. A stored file of the wrong
+        size (or, with verify, different bytes) is rewritten if it no longer hashes
+        to its own name, and reported as a collision if it does.
+        """
+        path = self.path_for(asset)
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return False
+
+        if size == asset.size and not self.verify:
+            return True
+        if size == asset.size:
+            if candidate is not None:
+                identical = filecmp.cmp(candidate, path, shallow=False)
+            else:
+                with open(path, 'rb') as f:
+                    identical = f.read() == asset.data
+            if identical:
+                return True
+
+        if self.digest_file(path) == asset.hash:
+            raise AssetCollisionError(f"Content collision at {asset.filename}")
+        print(f"  Replacing damaged asset: {asset.filename}")
+        return False
+
+    def _install(self, tmp_name: str, asset: AssetFile) -> None:
+        path = self.path_for(asset)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.chmod(tmp_name, 0o644)  # mkstemp creates 0600 files
+        os.replace(tmp_name, path)
+
+    def put(self, asset: AssetFile) -> bool:
+        """Store an in-memory asset; returns False if identical content already existed."""
+        if self.contains(asset):
+            return False
+        self.write(asset, asset.data)
+        return True
+
+    def write(self, asset: AssetFile, data: bytes, fsync: bool = False) -> Path:
+        """Write data to the asset's address unconditionally; returns the directory it landed in."""
+        fd, tmp_name = tempfile.mkstemp(dir=self.root, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._install(tmp_name, asset)
+        except Exception:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+        return self.path_for(asset).parent
+
+    def put_file(self, source: Path, mime_type: str) -> Tuple[AssetFile, bool]:
+        """Move a finished file (in the same filesystem) into the store."""
+        hasher = new_asset_digest()
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                hasher.update(chunk)
+        asset = AssetFile(None, mime_type, None, digest=hasher.hexdigest(), size=source.stat().st_size)
+        if self.contains(asset, candidate=source):
+            source.unlink()
+            return asset, False
+        self._install(str(source), asset)
+        return asset, True
+
+    def put_stream(self, mime_type: str, chunks: Iterator[bytes]) -> Tuple[AssetFile, bool]:
+        """
+        Store decoded chunks while hashing them. The digest is only known at the
+        end, so the temp file is discarded if the content turns out to exist.
+        """
+        hasher = new_asset_digest()
+        size = 0
+        fd, tmp_name = tempfile.mkstemp(dir=self.root, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    hasher.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+
+            asset = AssetFile(None, mime_type, None, digest=hasher.hexdigest(), size=size)
+            if self.contains(asset, candidate=Path(tmp_name)):
+                os.unlink(tmp_name)
+                return asset, False
+            self._install(tmp_name, asset)
+            return asset, True
+        except Exception:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+
+def fsync_directory(path: Path) -> None:
+    """Make renames into a directory durable (skipped where directories can't be opened)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class WriteBehindQueue:
+    """
+    Runs asset writes on background threads so base64 decoding and disk I/O
+    overlap. submit() blocks while more than max_bytes of payload are queued or
+    being written, which caps memory; flush() waits for every write and fsyncs
+    the directories that received files.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, workers: int = 4):
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='asset-writer')
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.pending = []  # futures submitted since the last flush
+
+    def submit(self, size: int, write: Callable[[], Path]) -> None:
+        with self.condition:
+            # An empty queue always accepts one write, however large
+            while self.in_flight and self.in_flight + size > self.max_bytes:
+                self.condition.wait()
+            self.in_flight += size
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        future = self.pool.submit(write)
+        future.add_done_callback(lambda _: self._release(size))
+        self.pending.append(future)
+
+    def _release(self, size: int) -> None:
+        with self.condition:
+            self.in_flight -= size
+            self.condition.notify_all()
+
+    def flush(self) -> None:
+        """Wait for all submitted writes; re-raise the first failure after fsyncing the rest."""
+        pending, self.pending = self.pending, []
+        directories = set()
+        error = None
+        for future in pending:
+            try:
+                directories.add(future.result())
+            except Exception as e:
+                error = error or e
+        for directory in directories:
+            fsync_directory(directory)
+        if error:
+            raise error
+
+class OptimizedImage:
+    def __init__(self, main: AssetFile, variants: List[Tuple[int, AssetFile]], width: int, height: int):
+        self.main = main
+        self.variants = variants  # (width, asset) pairs, narrowest first
+        self.width = width
+        self.height = height
+
+class ImageOptimizer:
+    """
+    Optional Pillow stage: re-encode images, cap their dimensions and produce
+    narrower responsive variants. The re-encoded image only replaces the
+    original when it is smaller or the original had to be resized.
+    """
+
+    FORMATS = {
+        'webp': ('WEBP', 'image/webp'),
+        'png': ('PNG', 'image/png'),
+        'jpeg': ('JPEG', 'image/jpeg'),
+    }
+    SOURCE_TYPES = ('image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp')
+
+    def __init__(self, image_format: str = 'webp', max_dimension: int = 1600, quality: int = 80,
+                 widths: Tuple[int, ...] = ()):
+        self.image_format = image_format
+        self.max_dimension = max_dimension
+        self.quality = quality
+        self.widths = tuple(sorted(set(widths)))
+
+    def settings(self) -> Dict[str, Any]:
+        return {'format': self.image_format, 'max_dimension': self.max_dimension,
+                'quality': self.quality, 'widths': list(self.widths)}
+
+    def handles(self, mime_type: str) -> bool:
+        return mime_type in self.SOURCE_TYPES
+
+    def _target(self, source_mime: str, has_alpha: bool) -> Tuple[str, str]:
+        name = self.image_format
+        if name == 'auto':
+            name = {'image/png': 'png', 'image/gif': 'png', 'image/webp': 'webp'}.get(source_mime, 'jpeg')
+        if name == 'jpeg' and has_alpha:
+            name = 'png'  # JPEG would drop transparency
+        return self.FORMATS[name]
+
+    def _encode(self, image: Any, pil_format: str) -> bytes:
+        buf = io.BytesIO()
+        if pil_format == 'WEBP':
+            image.save(buf, 'WEBP', quality=self.quality, method=6)
+        elif pil_format == 'JPEG':
+            image.convert('RGB').save(buf, 'JPEG', quality=self.quality, optimize=True, progressive=True)
+        else:
+            image.save(buf, 'PNG', optimize=True)
+        return buf.getvalue()
+
+    def optimize(self, data: bytes, mime_type: str) -> Optional[OptimizedImage]:
+        """Return the optimized image and its variants, or None to keep the original as-is."""
+        try:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+        except Exception as e:
+            print(f"  Could not decode image for optimization: {e}")
+            return None
+        if getattr(image, 'n_frames', 1) > 1:
+            return None  # Keep animations untouched
+
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        resized = max(image.size) > self.max_dimension
+        if resized:
+            image.thumbnail((self.max_dimension, self.max_dimension), Image.LANCZOS)
+
+        pil_format, out_mime = self._target(mime_type, has_alpha)
+        encoded = self._encode(image, pil_format)
+        if resized or len(encoded) < len(data):
+            main = AssetFile(encoded, out_mime, None)
+        else:
+            main = AssetFile(data, mime_type, None)
+
+        variants = []
+        width, height = image.size
+        for target_width in self.widths:
+            if target_width >= width:
+                break
+            target_height = max(1, round(height * target_width / width))
+            variant = image.resize((target_width, target_height), Image.LANCZOS)
+            variants.append((target_width, AssetFile(self._encode(variant, pil_format), out_mime, None)))
+
+        return OptimizedImage(main, variants, width, height)
+
+# MPEG audio Layer III tables: bitrates (kbps) by MPEG-1 / MPEG-2(.5), sample rates by version bits
+MP3_BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+def mp3_duration_ms(path: Path) -> Optional[int]:
+    """Duration of an MP3 file (see mp3_data_duration_ms). Returns None if not MP3."""
+    with open(path, 'rb') as f:
+        return mp3_data_duration_ms(f.read())
+
+def mp3_data_duration_ms(data: bytes) -> Optional[int]:
+    """
+    Duration of MP3 bytes without decoding them: read the Xing/Info frame count
+    when present, otherwise walk the frame headers. Returns None if not MP3.
+    Also used by manage_steps.py --audio-durations.
+    """
+    pos = 0
+    if data[:3] == b'ID3' and len(data) >= 10:
+        tag_size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        pos = 10 + tag_size + (10 if data[5] & 0x10 else 0)
+
+    frames = 0
+    samples = 0
+    sample_rate = 0
+    first_frame = True
+    while pos + 4 <= len(data):
+        b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+        version = (b1 >> 3) & 3
+        if data[pos] != 0xFF or (b1 & 0xE0) != 0xE0 or version == 1 or ((b1 >> 1) & 3) != 1:
+            pos += 1  # Lost sync: scan for the next frame header
+            continue
+        bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 3
+        if bitrate_index in (0, 15) or rate_index == 3:
+            pos += 1
+            continue
+
+        mpeg1 = version == 3
+        bitrate = MP3_BITRATES[1 if mpeg1 else 2][bitrate_index] * 1000
+        sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+        frame_samples = 1152 if mpeg1 else 576
+        frame_length = (144 if mpeg1 else 72) * bitrate // sample_rate + ((b2 >> 1) & 1)
+
+        if first_frame:
+            first_frame = False
+            mono = (b3 >> 6) == 3
+            side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+            xing = pos + 4 + side_info
+            if len(data) >= xing + 12 and data[xing:xing + 4] in (b'Xing', b'Info') and data[xing + 7] & 1:
+                total_frames = int.from_bytes(data[xing + 8:xing + 12], 'big')
+                if total_frames:  # Encoders writing to a pipe leave the count at zero
+                    return round(total_frames * frame_samples * 1000 / sample_rate)
+
+        frames += 1
+        samples += frame_samples
+        pos += frame_length
+
+    if not frames:
+        return None
+    return round(samples * 1000 / sample_rate)
+
+class AudioTranscoder:
+    """
+    Optional ffmpeg stage: loudness-normalize voice clips and encode them with a
+    compact mono speech profile (Opus, plus an MP3 fallback). Results are cached
+    on disk by source digest, so unchanged clips are never re-encoded.
+    """
+
+    OPUS_TYPE = 'audio/ogg; codecs=opus'
+
+    def __init__(self, ffmpeg: Optional[str], cache_dir: str = DEFAULT_CACHE_DIR, opus_bitrate: int = 24,
+                 mp3_bitrate: int = 48, loudness: float = -16.0, workers: int = 4):
+        self.ffmpeg = ffmpeg
+        self.cache_dir = Path(cache_dir)
+        self.opus_bitrate = opus_bitrate
+        self.mp3_bitrate = mp3_bitrate
+        self.loudness = loudness
+        self.workers = workers
+
+    def settings(self) -> Dict[str, Any]:
+        return {'ffmpeg': bool(self.ffmpeg), 'opus_bitrate': self.opus_bitrate,
+                'mp3_bitrate': self.mp3_bitrate, 'loudness': self.loudness}
+
+    def profiles(self) -> List[Tuple[str, str, List[str]]]:
+        """(asset MIME type, ffmpeg muxer, codec arguments) per output, preferred first."""
+        return [
+            ('audio/ogg', 'ogg', ['-c:a', 'libopus', '-b:a', f'{self.opus_bitrate}k', '-application', 'voip']),
+            ('audio/mpeg', 'mp3', ['-c:a', 'libmp3lame', '-b:a', f'{self.mp3_bitrate}k', '-ar', '24000']),
+        ]
+
+    def cache_path(self, source_hash: str) -> Path:
+        profile = hashlib.sha256(json.dumps(self.settings(), sort_keys=True).encode()).hexdigest()[:12]
+        return self.cache_dir / 'audio' / profile / f'{source_hash}.json'
+
+    def transcode(self, source: AssetFile, store: AssetStore) -> Optional[Dict[str, Any]]:
+        """
+        Return {'outputs': [asset dicts, preferred first], 'duration_ms': int,
+        'cached': bool}, or None when ffmpeg is unavailable or fails.
+        """
+        if not self.ffmpeg:
+            return None
+
+        cache_path = self.cache_path(source.hash)
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if all(store.path_for(AssetFile.from_dict(output)).exists() for output in cached['outputs']):
+                return dict(cached, cached=True)
+        except (OSError, ValueError, KeyError):
+            pass
+
+        outputs = []
+        duration_ms = None
+        for mime_type, muxer, codec_args in self.profiles():
+            fd, tmp_name = tempfile.mkstemp(dir=store.root, suffix='.part')
+            os.close(fd)
+            command = [
+                self.ffmpeg, '-hide_banner', '-loglevel', 'error', '-y',
+                '-i', str(store.path_for(source)), '-vn', '-map_metadata', '-1', '-ac', '1',
+                '-af', f'loudnorm=I={self.loudness}:TP=-1.5:LRA=11',
+                *codec_args, '-f', muxer, tmp_name,
+            ]
+            result = subprocess.run(command, capture_output=True, text=True)
+            if result.returncode != 0:
+                os.unlink(tmp_name)
+                print(f"  ffmpeg failed for {source.filename}: {result.stderr.strip()[:200]}")
+                return None
+            if mime_type == 'audio/mpeg':
+                duration_ms = mp3_duration_ms(Path(tmp_name))
+            asset, _ = store.put_file(Path(tmp_name), mime_type)
+            outputs.append(asset.to_dict())
+
+        transcoded = {'outputs': outputs, 'duration_ms': duration_ms}
+        write_json_atomic(cache_path, transcoded)
+        return dict(transcoded, cached=False)
+
+def write_bytes_atomic(path: Path, data: bytes) -> None:
+    """Write bytes through a temp file in the same directory and rename it into place."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_name, 0o644)  # mkstemp creates 0600 files
+        os.replace(tmp_name, path)
+    except Exception:
+        os.unlink(tmp_name)
+        raise
+
+def write_bytes_if_changed(path: Path, data: bytes) -> bool:
+    """Atomically write data unless the file already holds exactly it; returns whether it wrote."""
+    try:
+        if path.stat().st_size == len(data) and path.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        pass
+    write_bytes_atomic(path, data)
+    return True
+
+def write_json_atomic(path: Path, data: Any, **dump_kwargs) -> None:
+    """Write JSON through a temp file in the same directory and rename it into place."""
+    write_bytes_atomic(path, json.dumps(data, **dump_kwargs).encode('utf-8'))
+
+def minified_json(data: Any) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def precompressed_suffixes(encodings: Tuple[str, ...]) -> List[str]:
+    """File suffixes precompressed() will produce for these encodings."""
+    return [suffix for encoding, suffix in (('gzip', '.gz'), ('br', '.br'))
+            if encoding in encodings and (encoding != 'br' or brotli is not None)]
+
+def precompressed(data: bytes, encodings: Tuple[str, ...]) -> Dict[str, bytes]:
+    """Map of file suffix -> compressed bytes for the requested encodings."""
+    variants = {}
+    if 'gzip' in encodings:
+        variants['.gz'] = gzip.compress(data, compresslevel=9, mtime=0)  # mtime=0 keeps output stable
+    if 'br' in encodings and brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    return variants
+
+# Compact binary encoding of the merged scenarios (--output-format binary). Experimental:
+# the frontend bundles scenarios.json and has no SCN1 loader, so this is for size and
+# decode-time comparisons (--format-report) until one is written.
+#   b'SCN1', varint string count, strings (varint byte length + UTF-8), root value.
+# Values start with a tag byte; lengths, counts and table indices are LEB128
+# varints. All object keys and every string value seen more than once live in
+# the string table, most frequent first, so common keys cost one or two bytes.
+COMPACT_MAGIC = b'SCN1'
+TAG_NULL, TAG_FALSE, TAG_TRUE, TAG_INT, TAG_FLOAT, TAG_STR, TAG_REF, TAG_LIST, TAG_DICT = range(9)
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def encode_compact(data: Any) -> bytes:
+    """Encode JSON-compatible data in the compact binary format described above."""
+    counts = Counter()
+
+    def count(node: Any) -> None:
+        if isinstance(node, dict):
+            for key, value in node.items():
+                counts[key] += 2  # keys are always interned
+                count(value)
+        elif isinstance(node, list):
+            for item in node:
+                count(item)
+        elif isinstance(node, str):
+            counts[node] += 1
+
+    count(data)
+    table = [text for text, n in counts.most_common() if n > 1]
+    index = {text: i for i, text in enumerate(table)}
+
+    out = bytearray(COMPACT_MAGIC)
+    _write_varint(out, len(table))
+    for text in table:
+        encoded = text.encode('utf-8')
+        _write_varint(out, len(encoded))
+        out += encoded
+
+    def write(node: Any) -> None:
+        if node is None:
+            out.append(TAG_NULL)
+        elif node is True or node is False:
+            out.append(TAG_TRUE if node else TAG_FALSE)
+        elif isinstance(node, int):
+            out.append(TAG_INT)
+            _write_varint(out, node * 2 if node >= 0 else -node * 2 - 1)  # zigzag
+        elif isinstance(node, float):
+            out.append(TAG_FLOAT)
+            out.extend(struct.pack('>d', node))
+        elif isinstance(node, str):
+            if node in index:
+                out.append(TAG_REF)
+                _write_varint(out, index[node])
+            else:
+                encoded = node.encode('utf-8')
+                out.append(TAG_STR)
+                _write_varint(out, len(encoded))
+                out.extend(encoded)
+        elif isinstance(node, list):
+            out.append(TAG_LIST)
+            _write_varint(out, len(node))
+            for item in node:
+                write(item)
+        elif isinstance(node, dict):
+            out.append(TAG_DICT)
+            _write_varint(out, len(node))
+            for key, value in node.items():
+                _write_varint(out, index[key])
+                write(value)
+        else:
+            raise TypeError(f"Cannot encode {type(node).__name__}")
+
+    write(data)
+    return bytes(out)
+
+def decode_compact(data: bytes) -> Any:
+    """Inverse of encode_compact."""
+    if data[:4] != COMPACT_MAGIC:
+        raise ValueError("Not a compact scenarios file")
+    size, pos = _read_varint(data, 4)
+    table = []
+    for _ in range(size):
+        length, pos = _read_varint(data, pos)
+        table.append(data[pos:pos + length].decode('utf-8'))
+        pos += length
+
+    def read(pos: int) -> Tuple[Any, int]:
+        tag = data[pos]
+        pos += 1
+        if tag == TAG_REF:
+            i, pos = _read_varint(data, pos)
+            return table[i], pos
+        if tag == TAG_STR:
+            length, pos = _read_varint(data, pos)
+            return data[pos:pos + length].decode('utf-8'), pos + length
+        if tag == TAG_DICT:
+            length, pos = _read_varint(data, pos)
+            node = {}
+            for _ in range(length):
+                i, pos = _read_varint(data, pos)
+                node[table[i]], pos = read(pos)
+            return node, pos
+        if tag == TAG_LIST:
+            length, pos = _read_varint(data, pos)
+            node = []
+            for _ in range(length):
+                item, pos = read(pos)
+                node.append(item)
+            return node, pos
+        if tag == TAG_INT:
+            value, pos = _read_varint(data, pos)
+            return (value >> 1) ^ -(value & 1), pos
+        if tag == TAG_FLOAT:
+            return struct.unpack_from('>d', data, pos)[0], pos + 8
+        if tag in (TAG_NULL, TAG_FALSE, TAG_TRUE):
+            return (None, False, True)[tag], pos
+        raise ValueError(f"Unknown tag {tag} at offset {pos - 1}")
+
+    return read(pos)[0]
+
+def file_digest(path: Path) -> str:
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+BASE64_WHITESPACE = b' \t\n\r\x0b\x0c'
+
+class Base64StreamDecoder:
+    """Decode base64 text fed in arbitrary slices, carrying partial quanta over."""
+
+    def __init__(self):
+        self.pending = b''
+
+    def feed(self, chunk: bytes) -> bytes:
+        # Wrapped payloads (MIME-style line breaks) must not shift the 4-byte quanta
+        data = self.pending + bytes(chunk).translate(None, BASE64_WHITESPACE)
+        usable = len(data) - len(data) % 4
+        self.pending = data[usable:]
+        return binascii.a2b_base64(data[:usable]) if usable else b''
+
+    def finish(self) -> bytes:
+        data, self.pending = self.pending, b''
+        return binascii.a2b_base64(data) if data else b''
+
+def data_url_chunks(data_url: str, start: int, block_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield the base64 payload of an in-memory data URL in fixed-size ASCII blocks."""
+    for pos in range(start, len(data_url), block_size):
+        yield data_url[pos:pos + block_size].encode('ascii')
+
+class StreamingDataUrlRewriter:
+    """
+    Copy a JSON document from src to dst without parsing it into memory.
+
+    Byte-level scanning is safe because JSON structure and base64 are ASCII and
+    UTF-8 never encodes non-ASCII characters with ASCII bytes. String values of
+    DATA_URL_KEYS that hold data URLs are not copied; their base64 payload is handed
+    to the handler as an iterator of chunks and replaced with the URL it returns,
+    followed by any extra members the handler wants to add to the same object.
+    A handler that returns None keeps the original string: src is rewound to it
+    and it is copied unchanged.
+    """
+
+    HEADER_PATTERN = re.compile(rb'data:((?:[^;",\\]|\\/)+);base64,')
+    STRING_STOP = re.compile(rb'["\\]')
+    KEY_CAPTURE_LIMIT = 64
+
+    def __init__(self, src: BinaryIO, dst: BinaryIO,
+                 handler: Callable[[str, str, Iterator[bytes]], Optional[Tuple[str, Dict[str, Any]]]],
+                 chunk_size: int = STREAM_CHUNK_SIZE):
+        self.src = src
+        self.dst = dst
+        self.handler = handler
+        self.chunk_size = chunk_size
+        self.buf = b''
+        self.pos = 0
+        self.offset = 0  # position of buf[0] in src
+        self.eof = False
+
+    def _fill(self) -> bool:
+        """Drop consumed bytes and read the next chunk. Returns False at EOF."""
+        if self.eof:
+            return False
+        chunk = self.src.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.offset += self.pos
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _rewind(self, offset: int) -> None:
+        """Continue reading src from an earlier offset."""
+        self.src.seek(offset)
+        self.buf = b''
+        self.pos = 0
+        self.offset = offset
+        self.eof = False
+        self._fill()
+
+    def rewrite(self) -> int:
+        """Rewrite the whole document and return the number of data URLs replaced."""
+        replaced = 0
+        last_significant = b''
+        last_string = None
+
+        while True:
+            quote = self.buf.find(b'"', self.pos)
+            if quote < 0:
+                segment = self.buf[self.pos:]
+                self.dst.write(segment)
+                if segment.strip():
+                    last_significant = segment.strip()[-1:]
+                self.pos = len(self.buf)
+                if not self._fill():
+                    return replaced
+                continue
+
+            segment = self.buf[self.pos:quote]
+            self.dst.write(segment)
+            if segment.strip():
+                last_significant = segment.strip()[-1:]
+            self.pos = quote
+
+            key = last_string if last_significant == b':' else None
+            if key in DATA_URL_KEYS:
+                header = self._match_header()
+                if header is not None:
+                    mime_type, header_end = header
+                    string_start = self.offset + self.pos
+                    self.pos = header_end
+                    result = self.handler(key, mime_type, self._payload_chunks())
+                    if result is None:
+                        # Keep the data URL: copy it again from its opening quote
+                        self._rewind(string_start)
+                        self._copy_string()
+                        last_significant = b'"'
+                        last_string = None
+                        continue
+                    new_url, extra = result
+                    self.dst.write(json.dumps(new_url).encode('utf-8'))
+                    for extra_key, extra_value in extra.items():
+                        member = f", {json.dumps(extra_key)}: {json.dumps(extra_value, ensure_ascii=False)}"
+                        self.dst.write(member.encode('utf-8'))
+                    replaced += 1
+                    last_significant = b'"'
+                    last_string = None
+                    continue
+
+            last_string = self._copy_string()
+            last_significant = b'"'
+
+    def _match_header(self) -> Optional[Tuple[str, int]]:
+        """Return (mime_type, payload offset) if the string at pos is a supported data URL."""
+        while len(self.buf) - self.pos < MAX_DATA_URL_HEADER + 1 and self._fill():
+            pass
+        window = self.buf[self.pos + 1:self.pos + 1 + MAX_DATA_URL_HEADER]
+        match = self.HEADER_PATTERN.match(window)
+        if not match:
+            return None
+        mime_type = match.group(1).replace(b'\\/', b'/').decode('ascii', 'replace')
+        if mime_type not in MIME_TO_EXT:
+            print(f"Unsupported MIME type: {mime_type}")
+            return None
+        return mime_type, self.pos + 1 + match.end()
+
+    def _payload_chunks(self) -> Iterator[bytes]:
+        """Yield the base64 payload up to the closing quote, consuming it."""
+        while True:
+            stop = self.STRING_STOP.search(self.buf, self.pos)
+            if stop is None:
+                if self.pos < len(self.buf):
+                    yield memoryview(self.buf)[self.pos:]
+                self.pos = len(self.buf)
+                if not self._fill():
+                    raise ValueError("Unterminated data URL string")
+                continue
+
+            end = stop.start()
+            if end > self.pos:
+                yield memoryview(self.buf)[self.pos:end]
+            if self.buf[end:end + 1] == b'"':
+                self.pos = end + 1
+                return
+
+            # Base64 text can only hold the optional "\/" escape and escaped line breaks
+            self.pos = end
+            if len(self.buf) - self.pos < 2 and not self._fill():
+                raise ValueError("Unterminated data URL string")
+            escaped = self.buf[self.pos + 1:self.pos + 2]
+            if escaped == b'/':
+                yield b'/'
+            elif escaped not in (b'n', b'r', b't'):
+                raise ValueError("Unexpected escape sequence in data URL")
+            self.pos += 2
+
+    def _copy_string(self) -> Optional[bytes]:
+        """Copy the string starting at pos verbatim; return its raw text if short."""
+        start = self.pos
+        captured = []
+        captured_len = 0
+        scan = self.pos + 1
+        while True:
+            stop = self.STRING_STOP.search(self.buf, scan)
+            if stop is None:
+                piece = self.buf[start:]
+                self.dst.write(piece)
+                if captured_len <= self.KEY_CAPTURE_LIMIT:
+                    captured.append(piece)
+                    captured_len += len(piece)
+                self.pos = len(self.buf)
+                if not self._fill():
+                    raise ValueError("Unterminated string")
+                start = scan = self.pos
+                continue
+
+            end = stop.start()
+            if self.buf[end:end + 1] == b'\\':
+                if end + 1 >= len(self.buf):
+                    # Escape split across chunks: keep the backslash for the next pass
+                    piece = self.buf[start:end]
+                    self.dst.write(piece)
+                    captured.append(piece)
+                    captured_len += len(piece)
+                    self.pos = end
+                    if not self._fill():
+                        raise ValueError("Unterminated string")
+                    start = self.pos
+                    scan = self.pos + 2
+                    continue
+                scan = end + 2
+                continue
+
+            piece = self.buf[start:end + 1]
+            self.dst.write(piece)
+            self.pos = end + 1
+            if captured_len + len(piece) > self.KEY_CAPTURE_LIMIT:
+                return None
+            raw = b''.join(captured) + piece
+            # raw includes both quotes; keys we care about never contain escapes
+            return raw[1:-1].decode('utf-8', 'replace')
+
+class Instrumentation:
+    """
+    Hooks AssetDeployer reports its work through. This base class does nothing;
+    subclass it and override phase() to collect timings somewhere else.
+    """
+    enabled = False
+
+    @contextlib.contextmanager
+    def phase(self, name: str, category: str = 'deploy', **args) -> Iterator[Dict[str, Any]]:
+        """Wrap one unit of work. Callers may add fields (e.g. bytes) to the yielded dict."""
+        yield args
+
+    def worker_options(self) -> Optional[Dict[str, Any]]:
+        """Options for a PhaseProfiler in pool workers, or None to not profile them."""
+        return None
+
+    def absorb(self, events: List[Dict[str, Any]]) -> None:
+        """Take over events recorded in a pool worker."""
+
+    def take_events(self) -> List[Dict[str, Any]]:
+        return []
+
+    def report(self) -> None:
+        pass
+
+class PhaseProfiler(Instrumentation):
+    """
+    Records wall and CPU time of every phase as Chrome trace events
+    (chrome://tracing, Perfetto). With trace_memory, tracemalloc's peak since
+    the previous phase ended is sampled as a counter track; this slows the run.
+    """
+    enabled = True
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.events = []
+        self.peak_memory = 0
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def phase(self, name: str, category: str = 'deploy', **args) -> Iterator[Dict[str, Any]]:
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            yield args
+        finally:
+            wall = time.perf_counter() - start_wall
+            args['cpu_ms'] = round((time.thread_time() - start_cpu) * 1000, 3)
+            pid, tid = os.getpid(), threading.get_ident()
+            # perf_counter is system-wide monotonic, so worker timestamps line up
+            self.events.append({'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': tid,
+                                'ts': round(start_wall * 1e6, 1), 'dur': round(wall * 1e6, 1), 'args': args})
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                self.peak_memory = max(self.peak_memory, peak)
+                self.events.append({'name': 'tracemalloc', 'ph': 'C', 'pid': pid, 'tid': tid,
+                                    'ts': round((start_wall + wall) * 1e6, 1),
+                                    'args': {'current_kb': current // 1024, 'peak_kb': peak // 1024}})
+
+    def worker_options(self) -> Optional[Dict[str, Any]]:
+        return {'trace_memory': self.trace_memory}
+
+    def absorb(self, events: List[Dict[str, Any]]) -> None:
+        self.events.extend(events)
+        for event in events:
+            if event['ph'] == 'C':
+                self.peak_memory = max(self.peak_memory, event['args']['peak_kb'] * 1024)
+
+    def take_events(self) -> List[Dict[str, Any]]:
+        events, self.events = self.events, []
+        return events
+
+    def save(self, path: Path) -> None:
+        main_pid = os.getpid()
+        names = [{'name': 'process_name', 'ph': 'M', 'pid': pid,
+                  'args': {'name': 'deploy-assets' if pid == main_pid else f'worker {pid}'}}
+                 for pid in sorted({event['pid'] for event in self.events})]
+        write_json_atomic(Path(path), {'traceEvents': names + self.events, 'displayTimeUnit': 'ms'})
+        print(f"✅ Saved profile trace to: {path} (open in chrome://tracing or ui.perfetto.dev)")
+
+    def report(self) -> None:
+        """Print inclusive wall/CPU totals per phase, in order of first appearance."""
+        totals = {}
+        for event in self.events:
+            if event['ph'] != 'X':
+                continue
+            total = totals.setdefault(event['name'], Counter())
+            total['count'] += 1
+            total['wall'] += event['dur'] / 1000
+            total['cpu'] += event['args']['cpu_ms']
+            total['bytes'] += event['args'].get('bytes', 0)
+        if not totals:
+            return
+        print(f"\n⏱️  Phase timings (inclusive, summed over files and workers)")
+        for name, total in totals.items():
+            line = (f"   {name:<18} {total['count']:>5}x {total['wall']:>10.1f} ms wall "
+                    f"{total['cpu']:>10.1f} ms cpu")
+            if total['bytes']:
+                line += f" {total['bytes'] / 1024 / 1024:>9.2f} MB"
+            print(line)
+        if self.trace_memory:
+            print(f"   tracemalloc peak: {self.peak_memory / 1024 / 1024:.2f} MB (largest single process)")
+
+class FileResult:
+    """Processed output of one input file plus the assets it references (metadata only)."""
+
+    def __init__(self, scenario: Optional[Dict[str, Any]], assets: List[AssetFile],
+                 replacements: List[ProcessResult], log: str = '', stats: Optional[Counter] = None,
+                 transient: Optional[List[str]] = None, events: Optional[List[Dict[str, Any]]] = None):
+        self.scenario = scenario
+        self.assets = assets
+        self.replacements = replacements
+        self.log = log
+        self.stats = stats or Counter()  # work done this run (not persisted)
+        self.transient = transient or []  # intermediate asset files to remove unless still live
+        self.events = events or []  # instrumentation events from a pool worker (not persisted)
+
+def process_file_in_worker(config: Dict[str, Any], file_path: Path) -> FileResult:
+    """Process one JSON file in a pool worker with its own deployer."""
+    config = dict(config)
+    profile = config.pop('profile', None)
+    deployer = AssetDeployer(**config, instrumentation=PhaseProfiler(**profile) if profile else None)
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        result = deployer.process_file_tracked(file_path)
+        deployer.flush_writes()
+    result.log = log.getvalue()
+    result.events = deployer.instrumentation.take_events()
+    return result
+
+class DeployManifest:
+    """
+    Persistent record of what each input file produced: its content hash, the
+    assets it references and its processed scenario object. Inputs whose hash
+    matches (and whose assets are still on disk) are not reprocessed.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: Path, settings: Dict[str, Any]):
+        self.path = path
+        self.settings = settings
+        self.previous = {}  # input name -> entry from the last run
+        self.entries = {}  # input name -> entry for this run
+        self.fingerprints = {}  # input name -> (hash, size, mtime_ns) computed this run
+
+    def load(self) -> None:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Ignoring unreadable build manifest {self.path}: {e}")
+            return
+
+        if manifest.get('version') != self.VERSION or manifest.get('settings') != self.settings:
+            print("⚠️  Build settings changed, rebuilding all inputs")
+            # Keep asset lists so garbage collection still knows what we produced
+            self.previous = {name: {'assets': entry.get('assets', [])}
+                             for name, entry in manifest.get('files', {}).items()}
+            return
+        self.previous = manifest.get('files', {})
+
+    def fingerprint(self, file_path: Path) -> Tuple[str, int, int]:
+        """Content hash of an input, skipping the read when size and mtime are unchanged."""
+        stat = file_path.stat()
+        entry = self.previous.get(file_path.name, {})
+        if entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns and 'hash' in entry:
+            file_hash = entry['hash']
+        else:
+            file_hash = file_digest(file_path)
+        fingerprint = (file_hash, stat.st_size, stat.st_mtime_ns)
+        self.fingerprints[file_path.name] = fingerprint
+        return fingerprint
+
+    def lookup(self, file_path: Path, assets_dir: Path) -> Optional[FileResult]:
+        """Return the cached result for an unchanged input, or None if it must be rebuilt."""
+        entry = self.previous.get(file_path.name)
+        file_hash = self.fingerprint(file_path)[0]
+        if not entry or entry.get('hash') != file_hash or 'scenario' not in entry:
+            return None
+
+        assets = [AssetFile.from_dict(asset) for asset in entry['assets']]
+        if not all((assets_dir / asset.filename).exists() for asset in assets):
+            return None
+
+        self.entries[file_path.name] = dict(entry, mtime_ns=self.fingerprints[file_path.name][2])
+        replacements = [ProcessResult.from_dict(r) for r in entry['replacements']]
+        return FileResult(entry['scenario'], assets, replacements)
+
+    def record(self, file_path: Path, result: FileResult) -> None:
+        file_hash, size, mtime_ns = self.fingerprints.get(file_path.name) or self.fingerprint(file_path)
+        self.entries[file_path.name] = {
+            'hash': file_hash,
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'assets': [asset.to_dict() for asset in result.assets],
+            'replacements': [r.to_dict() for r in result.replacements],
+            'scenario': result.scenario,
+        }
+
+    def save(self) -> None:
+        manifest = {'version': self.VERSION, 'settings': self.settings, 'files': self.entries}
+        write_json_atomic(self.path, manifest, ensure_ascii=False)
+
+    @staticmethod
+    def asset_filenames(entries: Dict[str, Dict[str, Any]]) -> set:
+        return {AssetFile.from_dict(asset).filename
+                for entry in entries.values() for asset in entry.get('assets', [])}
 
 class AssetDeployer:
-    def __init__(self, input_dir: str, output_path: str, assets_dir: str):
+    def __init__(self, input_dir: str, output_path: str, assets_dir: str, stream: bool = False,
+                 jobs: int = 1, manifest_path: Optional[str] = None, verify_assets: bool = False,
+                 image_options: Optional[Dict[str, Any]] = None,
+                 audio_options: Optional[Dict[str, Any]] = None,
+                 split_dir: Optional[str] = None, precompress: Tuple[str, ...] = (),
+                 preload_path: Optional[str] = None, instrumentation: Optional[Instrumentation] = None,
+                 output_format: str = 'pretty', format_report: bool = False,
+                 write_behind: Optional[Dict[str, Any]] = None):
         self.input_dir = Path(input_dir)
         self.output_path = Path(output_path)
         self.assets_dir = Path(assets_dir)
+        self.store = AssetStore(self.assets_dir, verify=verify_assets)
+        self.verify_assets = verify_assets
+        self.stream = stream
+        self.jobs = jobs
+        self.manifest_path = Path(manifest_path) if manifest_path else None
+        self.cache_hits = 0
+        self.removed_assets = 0
+        self.stats = Counter()  # skipped writes, image bytes before/after, ...
         self.processed_files = {}  # hash -> AssetFile mapping for deduplication
+        self.referenced = {}  # hash -> AssetFile used by the file being processed
         self.replacements = []  # List of ProcessResult objects
 
+        # Optional optimization stages
+        self.image_options = image_options
+        self.image_optimizer = ImageOptimizer(**image_options) if image_options else None
+        self.optimized_images = {}  # source hash -> OptimizedImage (or None to keep as-is)
+        self.audio_options = audio_options
+        self.audio_transcoder = AudioTranscoder(**audio_options) if audio_options else None
+        self.transcoded_audio = {}  # source hash -> transcode result (or None)
+        self.transient = set()  # filenames of intermediate assets
+
+        # Optional per-scenario output for lazy loading
+        self.split_dir = Path(split_dir) if split_dir else None
+        self.precompress = precompress
+        self.preload_path = Path(preload_path) if preload_path else None
+        self.output_format = output_format
+        self.format_report = format_report
+        if output_format == 'binary' and self.output_path.suffix != '.bin':
+            self.output_path = self.output_path.with_suffix('.bin')
+            print(f"⚠️  Binary output format: writing merged scenarios to {self.output_path}")
+        self.instrumentation = instrumentation or Instrumentation()
+        self.write_behind = write_behind
+        self.writer = WriteBehindQueue(**write_behind) if write_behind else None
+
+        # Last published state, kept for --watch rebuilds
+        self.results = {}  # input path -> FileResult
+        self.manifest = None
+        self.live = set()  # asset filenames referenced by the published output
+
         # Ensure directories exist
         self.assets_dir.mkdir(parents=True, exist_ok=True)
         self.output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    def extract_data_urls(self, obj: Any, path: str = "") -> List[Tuple[str, str, List[str]]]:
+    DATA_URL_HEADER = re.compile(r'data:([^;,]+);base64,')
+
+    def parse_data_url_header(self, data_url: str) -> Optional[Tuple[str, int]]:
         """
-        Recursively extract data URLs from nested JSON objects.
-        Returns list of (field_name, data_url, json_path) tuples.
+        Parse only the "data:<mime>;base64," prefix and return (MIME type, payload
+        offset), so the payload itself is never scanned or copied here.
         """
-        results = []
-
-        if isinstance(obj, dict):
-            for key, value in obj.items():
-                current_path = f"{path}.{key}" if path else key
-                if key in ['audioUrl', 'imageUrl'] and isinstance(value, str) and value.startswith('data:'):
-                    results.append((key, value, current_path.split('.')))
-                elif isinstance(value, (dict, list)):
-                    results.extend(self.extract_data_urls(value, current_path))
-        elif isinstance(obj, list):
-            for i, item in enumerate(obj):
-                current_path = f"{path}[{i}]"
-                if isinstance(item, (dict, list)):
-                    results.extend(self.extract_data_urls(item, current_path))
+        match = self.DATA_URL_HEADER.match(data_url, 0, MAX_DATA_URL_HEADER)
+        if not match or match.end() == len(data_url):
+            print(f"Invalid data URL format: {data_url[:100]}...")
+            return None
 
-        return results
+        mime_type = match.group(1)
+        if mime_type not in MIME_TO_EXT:
+            print(f"Unsupported MIME type: {mime_type}")
+            return None
+        return mime_type, match.end()
 
     def parse_data_url(self, data_url: str) -> Optional[AssetFile]:
-        """Parse data URL and return AssetFile object."""
-        try:
-            # Extract MIME type and base64 data
-            match = re.match(r'data:([^;]+);base64,(.+)', data_url)
-            if not match:
-                print(f"Invalid data URL format: {data_url[:100]}...")
-                return None
-
-            mime_type = match.group(1)
-            base64_data = match.group(2)
-
-            # Validate MIME type
-            if mime_type not in MIME_TO_EXT:
-                print(f"Unsupported MIME type: {mime_type}")
-                return None
-
-            # Decode base64 data
-            try:
-                data = base64.b64decode(base64_data)
-            except Exception as e:
-                print(f"Failed to decode base64 data: {e}")
-                return None
-
-            return AssetFile(data, mime_type, data_url)
+        """Parse data URL and return AssetFile object holding the decoded bytes."""
+        header = self.parse_data_url_header(data_url)
+        if not header:
+            return None
+        mime_type, offset = header
 
-        except Exception as e:
-            print(f"Error parsing data URL: {e}")
+        try:
+            with self.instrumentation.phase('base64 decode', 'asset', bytes=len(data_url) - offset):
+                decoder = Base64StreamDecoder()
+                blocks = [decoder.feed(chunk) for chunk in data_url_chunks(data_url, offset)]
+                blocks.append(decoder.finish())
+                data = b''.join(blocks)
+                del blocks
+        except (binascii.Error, ValueError) as e:
+            print(f"Failed to decode base64 data: {e}")
             return None
 
+        with self.instrumentation.phase('hash', 'asset', bytes=len(data)):
+            return AssetFile(data, mime_type, None)
+
     def save_asset_file(self, asset: AssetFile) -> str:
         """Save asset file to disk and return relative path."""
         # Check if we already have this file (deduplication)
         if asset.hash in self.processed_files:
             existing = self.processed_files[asset.hash]
             print(f"  Duplicate file found, reusing: {existing.filename}")
-            return f"/assets/deployed/{existing.filename}"
+            self.referenced[existing.hash] = existing
+            asset.data = None
+            return self.store.url_for(existing)
 
-        # Save new file
-        file_path = self.assets_dir / asset.filename
         try:
-            with open(file_path, 'wb') as f:
-                f.write(asset.data)
+            with self.instrumentation.phase('write', 'asset', bytes=asset.size, file=asset.filename,
+                                            queued=bool(self.writer)):
+                if self.writer:
+                    # Decide now so reporting stays in order; errors surface at flush
+                    written = not self.store.contains(asset)
+                    if written:
+                        self.writer.submit(asset.size, functools.partial(self.store.write, asset, asset.data,
+                                                                         fsync=True))
+                        self.stats['queued_writes'] += 1
+                else:
+                    written = self.store.put(asset)
+        except OSError as e:
+            print(f"Error saving file {asset.filename}: {e}")
+            return None
+        # Only metadata is kept once the bytes are on disk
+        asset.data = None
+        asset.original_url = None
 
-            # Store for deduplication
-            self.processed_files[asset.hash] = asset
+        # Store for deduplication
+        self.processed_files[asset.hash] = asset
+        self.referenced[asset.hash] = asset
+        self.report_saved(asset, written)
+        return self.store.url_for(asset)
 
-            size_kb = len(asset.data) / 1024
-            print(f"  Saved: {asset.filename} ({size_kb:.1f} KB)")
+    def report_saved(self, asset: AssetFile, written: bool) -> None:
+        if written:
+            print(f"  Saved: {asset.filename} ({asset.size / 1024:.1f} KB)")
+        else:
+            self.stats['skipped_writes'] += 1
+            print(f"  Already stored, skipped write: {asset.filename}")
 
-            return f"/assets/deployed/{asset.filename}"
+    def process_asset(self, asset: AssetFile) -> Tuple[Optional[AssetFile], Optional[str], Dict[str, Any]]:
+        """
+        Run optional optimization stages on a decoded asset and store the result.
+        Returns (stored asset, its URL, extra fields for the owning JSON object).
+        """
+        if self.image_optimizer and self.image_optimizer.handles(asset.mime_type):
+            if asset.hash not in self.optimized_images:
+                with self.instrumentation.phase('optimize image', 'asset', bytes=asset.size):
+                    optimized = self.image_optimizer.optimize(asset.data, asset.mime_type)
+                self.optimized_images[asset.hash] = optimized
+                if optimized:
+                    self.stats['images_optimized'] += 1
+                    self.stats['image_bytes_before'] += asset.size
+                    self.stats['image_bytes_after'] += optimized.main.size
+                    self.stats['image_variants'] += len(optimized.variants)
+                    print(f"  Optimized image: {asset.size / 1024:.1f} KB -> "
+                          f"{optimized.main.size / 1024:.1f} KB, {len(optimized.variants)} variants")
+            optimized = self.optimized_images[asset.hash]
 
-        except Exception as e:
-            print(f"Error saving file {asset.filename}: {e}")
-            return None
+            if optimized:
+                new_url = self.save_asset_file(optimized.main)
+                if not new_url:
+                    return None, None, {}
+                extra = {'imageWidth': optimized.width, 'imageHeight': optimized.height}
+                srcset = []
+                for width, variant in optimized.variants:
+                    variant_url = self.save_asset_file(variant)
+                    if variant_url:  # a variant that failed to store is left out
+                        srcset.append(f"{variant_url} {width}w")
+                if srcset:
+                    srcset.append(f"{new_url} {optimized.width}w")
+                    extra['imageSrcSet'] = ', '.join(srcset)
+                return optimized.main, new_url, extra
+
+        return asset, self.save_asset_file(asset), {}
+
+    def save_asset_stream(self, mime_type: str, chunks: Iterator[bytes]) -> Tuple[AssetFile, str, int]:
+        """
+        Decode a base64 payload chunk by chunk straight into the asset store.
+        Returns (asset, relative path, base64 length); the asset carries no data.
+        """
+        decoder = Base64StreamDecoder()
+        encoded_len = 0
 
-    def replace_urls_in_object(self, obj: Any, replacements: Dict[str, str]) -> Any:
-        """Recursively replace URLs in nested JSON objects."""
+        def decoded_chunks() -> Iterator[bytes]:
+            nonlocal encoded_len
+            for chunk in chunks:
+                encoded_len += len(chunk)
+                yield decoder.feed(chunk)
+            yield decoder.finish()
+
+        with self.instrumentation.phase('decode+hash+write', 'asset') as args:
+            asset, written = self.store.put_stream(mime_type, decoded_chunks())
+            args.update(bytes=asset.size, file=asset.filename)
+        if asset.hash in self.processed_files:
+            existing = self.processed_files[asset.hash]
+            print(f"  Duplicate file found, reusing: {existing.filename}")
+            self.referenced[existing.hash] = existing
+            return existing, self.store.url_for(existing), encoded_len
+
+        self.processed_files[asset.hash] = asset
+        self.referenced[asset.hash] = asset
+        self.report_saved(asset, written)
+        return asset, self.store.url_for(asset), encoded_len
+
+    def store_data_url(self, field_name: str, data_url: str) -> Tuple[Optional[str], Dict[str, Any]]:
+        """
+        Decode and store one data URL. Returns its asset path (None on failure)
+        and any extra fields to add next to it.
+        """
+        print(f"  Processing {field_name} ({len(data_url)} chars)")
+        with self.instrumentation.phase('asset', 'asset', field=field_name, chars=len(data_url)) as args:
+            header = self.parse_data_url_header(data_url)
+            if not header:
+                return None, {}
+            mime_type, offset = header
+
+            new_url, extra = None, {}
+            if self.writer or (self.image_optimizer and self.image_optimizer.handles(mime_type)):
+                # Images are re-encoded and queued writes need their bytes, so decode whole;
+                # the write-behind queue bounds how many decoded assets are held at once
+                asset = self.parse_data_url(data_url)
+                if asset:
+                    stored, new_url, extra = self.process_asset(asset)
+            else:
+                # Decode block by block straight into the store, hashing as we go
+                try:
+                    stored, new_url, _ = self.save_asset_stream(mime_type, data_url_chunks(data_url, offset))
+                except (binascii.Error, ValueError) as e:
+                    print(f"Failed to decode base64 data: {e}")
+                except OSError as e:
+                    print(f"Error saving file: {e}")
+            if new_url:
+                args.update(bytes=stored.size, mime_type=mime_type)
+        if not new_url:
+            # The data URL stays in the output as it was
+            self.stats['failed_assets'] += 1
+            return None, {}
+        # Track for reporting
+        result = ProcessResult(len(data_url), new_url, str(self.assets_dir / stored.filename), stored.hash)
+        self.replacements.append(result)
+        return new_url, extra
+
+    def rewrite_data_urls(self, obj: Any) -> int:
+        """
+        Walk the tree once, decoding, storing and swapping each audioUrl/imageUrl
+        data URL for its asset path in place. Returns the number of URLs replaced.
+        """
+        replaced = 0
         if isinstance(obj, dict):
-            result = {}
+            added = {}
             for key, value in obj.items():
-                if isinstance(value, str) and value in replacements:
-                    result[key] = replacements[value]
-                    print(f"    Replaced {key}: {value[:50]}... -> {replacements[value]}")
+                if isinstance(value, str):
+                    if key in DATA_URL_KEYS and value.startswith('data:'):
+                        new_url, extra = self.store_data_url(key, value)
+                        if new_url:
+                            obj[key] = new_url  # same key, so safe while iterating
+                            if extra:
+                                added[key] = extra
+                            replaced += 1
                 elif isinstance(value, (dict, list)):
-                    result[key] = self.replace_urls_in_object(value, replacements)
-                else:
-                    result[key] = value
-            return result
+                    replaced += self.rewrite_data_urls(value)
+            if added:
+                # Place extra fields right after their URL, as streaming mode does
+                items = list(obj.items())
+                obj.clear()
+                for key, value in items:
+                    obj[key] = value
+                    obj.update(added.get(key, {}))
         elif isinstance(obj, list):
-            return [self.replace_urls_in_object(item, replacements) for item in obj]
-        else:
-            return obj
+            for item in obj:
+                if isinstance(item, (dict, list)):
+                    replaced += self.rewrite_data_urls(item)
+        return replaced
+
+    def process_json_file_streaming(self, file_path: Path) -> Dict[str, Any]:
+        """
+        Process a JSON file without loading it: data URLs are decoded chunk by chunk
+        into asset files while the rewritten (small) JSON is emitted to a buffer.
+        """
+        print(f"\nProcessing (streaming): {file_path.name}")
+
+        def handle(field_name: str, mime_type: str,
+                   chunks: Iterator[bytes]) -> Optional[Tuple[str, Dict[str, Any]]]:
+            header_len = len(f"data:{mime_type};base64,")
+            new_url, extra = None, {}
+            with self.instrumentation.phase('asset', 'asset', field=field_name, mime_type=mime_type) as args:
+                try:
+                    if self.image_optimizer and self.image_optimizer.handles(mime_type):
+                        # Images must be decoded whole for re-encoding anyway
+                        encoded = b''.join(bytes(chunk) for chunk in chunks)
+                        asset, new_url, extra = self.process_asset(
+                            AssetFile(base64.b64decode(encoded), mime_type, None))
+                        encoded_len = len(encoded)
+                    else:
+                        asset, new_url, encoded_len = self.save_asset_stream(mime_type, chunks)
+                except (binascii.Error, ValueError) as e:
+                    print(f"Failed to decode base64 data: {e}")
+                except OSError as e:
+                    print(f"Error saving file: {e}")
+                if not new_url:
+                    # As in memory: the rewriter copies the data URL through unchanged
+                    self.stats['failed_assets'] += 1
+                    return None
+                args.update(bytes=asset.size, chars=header_len + encoded_len)
+            print(f"  Processed {field_name} ({header_len + encoded_len} chars)")
+            self.replacements.append(
+                ProcessResult(header_len + encoded_len, new_url, str(self.assets_dir / asset.filename), asset.hash)
+            )
+            return new_url, extra
+
+        output = io.BytesIO()
+        try:
+            with open(file_path, 'rb') as f, self.instrumentation.phase('rewrite data URLs'):
+                count = StreamingDataUrlRewriter(f, output, handle).rewrite()
+            with self.instrumentation.phase('parse', bytes=output.tell()):
+                data = json.loads(output.getvalue())
+        except Exception as e:
+            print(f"Error reading {file_path}: {e}")
+            return None
+
+        print(f"  Replaced {count} data URLs")
+        return data
+
+    def transcode_audio(self, data: Any, replacements: List[ProcessResult]) -> None:
+        """
+        Transcode every audio clip the file referenced on a thread pool, then point
+        each audioUrl at the MP3 fallback and add audioSources and audioDuration (ms).
+        """
+        sources = {}
+        for replacement in replacements:
+            asset = self.processed_files[replacement.asset_hash]
+            if asset.mime_type.startswith('audio/'):
+                sources[replacement.new_url] = asset
+        if not sources:
+            return
+
+        pending = {asset.hash: asset for asset in sources.values() if asset.hash not in self.transcoded_audio}
+        if pending:
+            def transcode(asset: AssetFile) -> Optional[Dict[str, Any]]:
+                with self.instrumentation.phase('transcode audio', 'asset', bytes=asset.size, file=asset.filename):
+                    return self.audio_transcoder.transcode(asset, self.store)
+
+            with ThreadPoolExecutor(max_workers=self.audio_transcoder.workers) as pool:
+                outcomes = pool.map(transcode, pending.values())
+                for asset, outcome in zip(pending.values(), outcomes):
+                    self.transcoded_audio[asset.hash] = outcome
+                    if outcome:
+                        outputs = [AssetFile.from_dict(o) for o in outcome['outputs']]
+                        self.stats['audio_cache_hits' if outcome['cached'] else 'audio_transcoded'] += 1
+                        self.stats['audio_bytes_before'] += asset.size
+                        self.stats['audio_bytes_opus'] += outputs[0].size
+                        self.stats['audio_bytes_mp3'] += outputs[-1].size
+                        print(f"  Transcoded {asset.filename}: {asset.size / 1024:.1f} KB -> "
+                              f"{outputs[0].size / 1024:.1f} KB opus / {outputs[-1].size / 1024:.1f} KB mp3"
+                              f"{' (cached)' if outcome['cached'] else ''}")
+
+        def patch(node: Any) -> None:
+            if isinstance(node, dict):
+                source = sources.get(node.get('audioUrl'))
+                if source:
+                    outcome = self.transcoded_audio.get(source.hash)
+                    if outcome:
+                        outputs = [AssetFile.from_dict(o) for o in outcome['outputs']]
+                        node['audioUrl'] = self.store.url_for(outputs[-1])
+                        node['audioSources'] = [
+                            {'url': self.store.url_for(output),
+                             'type': AudioTranscoder.OPUS_TYPE if output.mime_type == 'audio/ogg' else output.mime_type}
+                            for output in outputs
+                        ]
+                        duration_ms = outcome['duration_ms']
+                    else:
+                        duration_ms = mp3_duration_ms(self.store.path_for(source)) \
+                            if source.mime_type in ('audio/mpeg', 'audio/mp3') else None
+                    if duration_ms is not None:
+                        node['audioDuration'] = duration_ms
+                for value in node.values():
+                    patch(value)
+            elif isinstance(node, list):
+                for item in node:
+                    patch(item)
+
+        patch(data)
+
+        # Repoint reporting and asset tracking at the shipped outputs
+        for replacement in replacements:
+            outcome = self.transcoded_audio.get(replacement.asset_hash)
+            if not outcome:
+                continue
+            source = self.referenced.pop(replacement.asset_hash, None)
+            if source:
+                self.transient.add(source.filename)
+            for output in map(AssetFile.from_dict, outcome['outputs']):
+                self.processed_files.setdefault(output.hash, output)
+                self.referenced[output.hash] = self.processed_files[output.hash]
+            fallback = AssetFile.from_dict(outcome['outputs'][-1])
+            replacement.new_url = self.store.url_for(fallback)
+            replacement.file_path = str(self.store.path_for(fallback))
+            replacement.asset_hash = fallback.hash
+
+    def apply_post_stages(self, data: Optional[Dict[str, Any]], first_replacement: int) -> Optional[Dict[str, Any]]:
+        """Run stages that need the whole processed file (currently audio transcoding)."""
+        if data is not None and self.audio_transcoder:
+            self.flush_writes()  # ffmpeg reads the stored sources
+            self.transcode_audio(data, self.replacements[first_replacement:])
+        return data
 
     def process_json_file(self, file_path: Path) -> Dict[str, Any]:
         """Process a single JSON file and return the processed data."""
+        first_replacement = len(self.replacements)
+        if self.stream:
+            return self.apply_post_stages(self.process_json_file_streaming(file_path), first_replacement)
+
         print(f"\nProcessing: {file_path.name}")
 
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with self.instrumentation.phase('parse', bytes=file_path.stat().st_size):
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
         except Exception as e:
             print(f"Error reading {file_path}: {e}")
             return None
 
-        # Extract all data URLs
-        data_urls = self.extract_data_urls(data)
-        print(f"  Found {len(data_urls)} data URLs")
+        # Decode, store and replace every data URL in one in-place pass
+        with self.instrumentation.phase('rewrite data URLs'):
+            count = self.rewrite_data_urls(data)
+        print(f"  Replaced {count} data URLs")
+        return self.apply_post_stages(data, first_replacement)
 
-        if not data_urls:
-            return data
+    def process_file_tracked(self, file_path: Path) -> FileResult:
+        """Process one file and collect the assets and replacements it contributed."""
+        first_replacement = len(self.replacements)
+        stats_before = self.stats.copy()
+        transient_before = set(self.transient)
+        self.referenced = {}
+        with self.instrumentation.phase('file', 'file', file=file_path.name, bytes=file_path.stat().st_size):
+            scenario = self.process_json_file(file_path)
+        replacements = self.replacements[first_replacement:]
 
-        # Process each data URL
-        url_replacements = {}
-        for field_name, data_url, json_path in data_urls:
-            print(f"  Processing {field_name} ({len(data_url)} chars)")
+        for asset in self.referenced.values():
+            # Drop payloads; only metadata is cached or sent between processes
+            asset.data = None
+            asset.original_url = None
+        return FileResult(scenario, list(self.referenced.values()), replacements,
+                          stats=self.stats - stats_before,
+                          transient=sorted(self.transient - transient_before))
 
-            # Parse and save asset
-            asset = self.parse_data_url(data_url)
-            if asset:
-                new_url = self.save_asset_file(asset)
-                if new_url:
-                    url_replacements[data_url] = new_url
+    def absorb_result(self, result: FileResult) -> None:
+        """Fold a result produced elsewhere (worker or cache) into this deployer."""
+        for asset in result.assets:
+            self.processed_files.setdefault(asset.hash, asset)
+        self.replacements.extend(result.replacements)
+        self.stats.update(result.stats)
+        self.transient.update(result.transient)
+        self.instrumentation.absorb(result.events)
+        result.events = []
 
-                    # Track for reporting
-                    result = ProcessResult(data_url, new_url, str(self.assets_dir / asset.filename))
-                    self.replacements.append(result)
+    def process_files_parallel(self, json_files: List[Path]) -> List[FileResult]:
+        """
+        Fan input files out to a process pool. Results are collected in input order,
+        and asset metadata is folded into processed_files by hash so deduplication
+        holds across workers (identical content always maps to the same filename).
+        """
+        workers = min(self.jobs, len(json_files))
+        print(f"⚙️  Processing on {workers} worker processes")
+        config = {
+            'input_dir': str(self.input_dir),
+            'output_path': str(self.output_path),
+            'assets_dir': str(self.assets_dir),
+            'stream': self.stream,
+            'verify_assets': self.verify_assets,
+            'image_options': self.image_options,
+            'audio_options': self.audio_options,
+            'profile': self.instrumentation.worker_options(),
+            'write_behind': self.write_behind,
+        }
 
-        # Replace URLs in the data
-        if url_replacements:
-            print(f"  Replacing {len(url_replacements)} URLs...")
-            processed_data = self.replace_urls_in_object(data, url_replacements)
-            return processed_data
+        results = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            worker_results = pool.map(process_file_in_worker, [config] * len(json_files), json_files)
+            for worker_result in worker_results:
+                print(worker_result.log, end='')
+                for asset in worker_result.assets:
+                    if asset.hash in self.processed_files:
+                        print(f"  Shared with an earlier file: {asset.filename}")
+                self.absorb_result(worker_result)
+                results.append(worker_result)
 
-        return data
+        return results
+
+    def cache_settings(self) -> Dict[str, Any]:
+        """Options that change processed output; any change invalidates the manifest."""
+        return {
+            'assets_dir': str(self.assets_dir),
+            'store': 'blake2b-256/fanout-2',
+            'images': self.image_optimizer.settings() if self.image_optimizer else None,
+            'audio': self.audio_transcoder.settings() if self.audio_transcoder else None,
+        }
+
+    def collect_garbage(self, live: set, previous: set, clean: bool) -> None:
+        """
+        Remove assets the previous run produced that no current input references.
+        With clean, also remove any untracked file left in the assets directory.
+        """
+        orphans = (previous | self.transient) - live
+        if clean:
+            orphans |= {path.relative_to(self.assets_dir).as_posix()
+                        for path in self.assets_dir.rglob('*') if path.is_file()} - live
+
+        for filename in sorted(orphans):
+            path = self.assets_dir / filename
+            if path.exists():
+                path.unlink()
+                self.removed_assets += 1
+                print(f"  Removed orphaned asset: {filename}")
+                # Drop fan-out directories that became empty
+                if path.parent != self.assets_dir and not any(path.parent.iterdir()):
+                    path.parent.rmdir()
+        self.forget_assets(orphans)
+
+    def forget_assets(self, filenames: set) -> None:
+        """Drop in-memory records of deleted assets so a later rebuild stores them again."""
+        for digest, asset in list(self.processed_files.items()):
+            if asset.filename in filenames:
+                del self.processed_files[digest]
+        for digest, optimized in list(self.optimized_images.items()):
+            if optimized and {optimized.main.filename, *(v.filename for _, v in optimized.variants)} & filenames:
+                del self.optimized_images[digest]
+        for digest, outcome in list(self.transcoded_audio.items()):
+            if outcome and {AssetFile.from_dict(o).filename for o in outcome['outputs']} & filenames:
+                del self.transcoded_audio[digest]
 
     def merge_scenarios(self, scenarios: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Merge multiple scenario objects into a single scenarios.json structure."""
@@ -220,33 +1707,232 @@ class AssetDeployer:
 
         return merged
 
-    def deploy_assets(self, clean: bool = False) -> bool:
+    def encode_output(self, merged_data: Dict[str, Any]) -> bytes:
+        """Serialize the merged scenarios in the configured output format."""
+        if self.output_format == 'minified':
+            return minified_json(merged_data)
+        if self.output_format == 'binary':
+            return encode_compact(merged_data)
+        return json.dumps(merged_data, indent=2, ensure_ascii=False).encode('utf-8')
+
+    def report_output_formats(self, merged_data: Dict[str, Any], runs: int = 5) -> None:
+        """
+        Print the size of every output format and how long decoding it takes here
+        (median of `runs`; decompression included). Python timings are only a rough
+        guide to browser cost, but the ranking between formats carries over.
+        """
+        pretty = json.dumps(merged_data, indent=2, ensure_ascii=False).encode('utf-8')
+        minified = minified_json(merged_data)
+        compact = encode_compact(merged_data)
+        if decode_compact(compact) != merged_data:
+            raise ValueError("Compact encoding did not round-trip")
+
+        decoders = {'gzip': gzip.decompress}
+        if brotli is not None:
+            decoders['br'] = brotli.decompress
+        candidates = [('pretty JSON', pretty, json.loads),
+                      ('minified JSON', minified, json.loads),
+                      ('compact binary', compact, decode_compact)]
+        for name, body, parse in candidates[1:]:
+            for encoding, decompress in decoders.items():
+                compressed = precompressed(body, (encoding,))
+                candidates.append((f"{name} + {encoding}", next(iter(compressed.values())),
+                                   lambda data, d=decompress, p=parse: p(d(data))))
+
+        print(f"\n📏 Output formats (decode time: median of {runs} runs in Python)")
+        for name, body, decode in candidates:
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                decode(body)
+                timings.append(time.perf_counter() - start)
+            print(f"   {name:<24} {len(body) / 1024:>9.1f} KB {statistics.median(timings) * 1000:>8.2f} ms "
+                  f"({len(body) / len(pretty) * 100:5.1f}% of pretty)")
+
+    SPLIT_CHUNK_PATTERN = re.compile(r'.+\.[0-9a-f]{12}\.json(\.gz|\.br)?$')
+
+    def scenario_index_entry(self, key: str, scenario: Dict[str, Any], filename: str) -> Dict[str, Any]:
+        """Summary fields a scenario picker needs without loading the scenario itself."""
+        return {
+            'id': scenario.get('id', key),
+            'title': scenario.get('title'),
+            'description': scenario.get('description'),
+            'stepCount': len(scenario.get('steps', [])),
+            'agents': [
+                {field: agent[field] for field in ('name', 'displayName', 'avatarUrl') if field in agent}
+                for agent in scenario.get('agents', [])
+            ],
+            'file': filename,
+        }
+
+    def write_split_output(self, merged_data: Dict[str, Any]) -> None:
+        """
+        Write an index plus one minified, content-hashed JSON file per scenario
+        (optionally with .gz/.br siblings), then drop chunks from earlier runs.
+        """
+        index = {'scenarios': []}
+        current = set()
+        total_size = 0
+        compressed_sizes = Counter()
+
+        for key, scenario in merged_data.items():
+            body = minified_json({key: scenario})
+            digest = hashlib.sha256(body).hexdigest()[:12]
+            filename = f"{key}.{digest}.json"
+            outputs = {filename: body}
+            for suffix, compressed in precompressed(body, self.precompress).items():
+                outputs[filename + suffix] = compressed
+                compressed_sizes[suffix] += len(compressed)
+
+            for name, content in outputs.items():
+                current.add(name)
+                path = self.split_dir / name
+                # Content-hashed names never change content, so existing files are final
+                if not path.exists():
+                    write_bytes_atomic(path, content)
+            total_size += len(body)
+            index['scenarios'].append(self.scenario_index_entry(key, scenario, filename))
+
+        index_body = minified_json(index)
+        write_bytes_if_changed(self.split_dir / 'index.json', index_body)
+        current.add('index.json')
+        for suffix, compressed in precompressed(index_body, self.precompress).items():
+            write_bytes_if_changed(self.split_dir / f'index.json{suffix}', compressed)
+            current.add(f'index.json{suffix}')
+
+        for path in self.split_dir.iterdir():
+            if path.name not in current and self.SPLIT_CHUNK_PATTERN.match(path.name):
+                path.unlink()
+
+        sizes = ', '.join(f"{suffix[1:]} {size / 1024:.1f} KB" for suffix, size in compressed_sizes.items())
+        print(f"✅ Wrote {len(merged_data)} scenario chunks + index to: {self.split_dir} "
+              f"(index {len(index_body) / 1024:.1f} KB, chunks {total_size / 1024:.1f} KB"
+              f"{', ' + sizes if sizes else ''})")
+
+    def build_preload_manifest(self, merged_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        For each scenario, list the deployed assets in order of first use and, per
+        step, which assets it needs plus the byte offset at which its new assets
+        start. A player can prefetch ahead of playback until the offset of the
+        step it is on plus its byte budget.
+        """
+        live_assets = {asset.hash: asset for result in self.results.values() for asset in result.assets}
+        by_url = {replacement.new_url: live_assets[replacement.asset_hash]
+                  for result in self.results.values() for replacement in result.replacements
+                  if replacement.asset_hash in live_assets}
+
+        scenarios = {}
+        for key, scenario in merged_data.items():
+            assets = []
+            asset_index = {}
+            steps = []
+            offset = 0
+            for step_number, step in enumerate(scenario.get('steps', [])):
+                action = step.get('action', {}) if isinstance(step, dict) else {}
+                needed = []
+                new_bytes = 0
+                for field in DATA_URL_KEYS:
+                    url = action.get(field)
+                    asset = by_url.get(url)
+                    if asset is None:
+                        continue
+                    if url not in asset_index:
+                        asset_index[url] = len(assets)
+                        assets.append({'url': url, 'mimeType': asset.mime_type,
+                                       'bytes': asset.size, 'firstStep': step_number})
+                        new_bytes += asset.size
+                    needed.append(asset_index[url])
+                steps.append({'assets': needed, 'offset': offset, 'bytes': new_bytes})
+                offset += new_bytes
+            scenarios[scenario.get('id', key)] = {'totalBytes': offset, 'assets': assets, 'steps': steps}
+
+        return {'version': 1, 'scenarios': scenarios}
+
+    def deploy_assets(self, clean: bool = False, force: bool = False) -> bool:
         """Main deployment function."""
         print("🚀 Starting Asset Deployment")
         print(f"Input directory: {self.input_dir}")
         print(f"Output file: {self.output_path}")
         print(f"Assets directory: {self.assets_dir}")
 
-        # Clean existing assets if requested
-        if clean and self.assets_dir.exists():
-            print(f"\n🧹 Cleaning existing assets...")
-            shutil.rmtree(self.assets_dir)
-            self.assets_dir.mkdir(parents=True, exist_ok=True)
+        manifest = None
+        if self.manifest_path:
+            manifest = DeployManifest(self.manifest_path, self.cache_settings())
+            if force:
+                print("Ignoring build manifest (--force)")
+            with self.instrumentation.phase('load manifest'):
+                manifest.load()
+            if force:
+                # Keep asset lists for garbage collection, but never reuse outputs
+                manifest.previous = {name: {'assets': entry.get('assets', [])}
+                                     for name, entry in manifest.previous.items()}
 
-        # Find all JSON files in input directory
-        json_files = list(self.input_dir.glob("*.json"))
+        # Find all JSON files in input directory (sorted so merge order is deterministic)
+        json_files = sorted(self.input_dir.glob("*.json"))
         if not json_files:
             print(f"❌ No JSON files found in {self.input_dir}")
             return False
 
         print(f"\n📁 Found {len(json_files)} JSON files")
 
-        # Process each JSON file
-        processed_scenarios = []
+        # Reuse cached output for unchanged inputs
+        results = {}
+        pending = []
         for json_file in json_files:
-            result = self.process_json_file(json_file)
-            if result:
-                processed_scenarios.append(result)
+            with self.instrumentation.phase('cache lookup', 'file', file=json_file.name):
+                cached = manifest.lookup(json_file, self.assets_dir) if manifest else None
+            if cached:
+                print(f"♻️  Unchanged, reusing cached output: {json_file.name}")
+                self.absorb_result(cached)
+                self.cache_hits += 1
+                results[json_file] = cached
+            else:
+                pending.append(json_file)
+
+        # Process each changed JSON file
+        for json_file, result in zip(pending, self.process_files(pending)):
+            results[json_file] = result
+            if manifest and result.scenario:
+                manifest.record(json_file, result)
+
+        self.results = results
+        self.manifest = manifest
+        previous = DeployManifest.asset_filenames(manifest.previous) if manifest else set()
+        if not self.publish(previous, clean):
+            return False
+
+        # Print summary
+        self.print_summary()
+        return True
+
+    def flush_writes(self) -> None:
+        """Wait until every queued asset write is on disk and fsynced."""
+        if self.writer:
+            with self.instrumentation.phase('flush writes'):
+                self.writer.flush()
+
+    def process_files(self, json_files: List[Path]) -> List[FileResult]:
+        """Process input files serially or on the process pool; results in input order."""
+        with self.instrumentation.phase('process files', files=len(json_files)):
+            if self.jobs > 1 and len(json_files) > 1:
+                return self.process_files_parallel(json_files)
+            return [self.process_file_tracked(json_file) for json_file in json_files]
+
+    def publish(self, previous: set, clean: bool) -> bool:
+        """
+        Merge the current results and write every output, rewriting files only
+        when their content changed, then remove assets that are no longer live.
+        """
+        # Assets must be durable before anything that references them is published
+        try:
+            self.flush_writes()
+        except OSError as e:
+            print(f"❌ Error writing assets: {e}")
+            return False
+
+        results = self.results
+        manifest = self.manifest
+        processed_scenarios = [results[f].scenario for f in sorted(results) if results[f].scenario]
 
         if not processed_scenarios:
             print("❌ No scenarios were processed successfully")
@@ -258,15 +1944,156 @@ class AssetDeployer:
 
         # Save merged result
         try:
-            with open(self.output_path, 'w', encoding='utf-8') as f:
-                json.dump(merged_data, f, indent=2, ensure_ascii=False)
-            print(f"✅ Saved merged scenarios to: {self.output_path}")
+            with self.instrumentation.phase('dump', format=self.output_format) as args:
+                body = self.encode_output(merged_data)
+                args['bytes'] = len(body)
+                # Leave an identical file untouched so dev servers don't reload
+                written = write_bytes_if_changed(self.output_path, body)
+                siblings = [self.output_path.with_name(self.output_path.name + suffix)
+                            for suffix in precompressed_suffixes(self.precompress)]
+                if written or not all(path.exists() for path in siblings):
+                    for suffix, compressed in precompressed(body, self.precompress).items():
+                        write_bytes_atomic(self.output_path.with_name(self.output_path.name + suffix), compressed)
+            if written:
+                print(f"✅ Saved merged scenarios to: {self.output_path}")
+            else:
+                print(f"✅ Merged scenarios unchanged: {self.output_path}")
         except Exception as e:
             print(f"❌ Error saving merged file: {e}")
             return False
 
-        # Print summary
-        self.print_summary()
+        if self.format_report:
+            try:
+                with self.instrumentation.phase('format report'):
+                    self.report_output_formats(merged_data)
+            except Exception as e:
+                print(f"❌ Error comparing output formats: {e}")
+                return False
+
+        if self.split_dir:
+            try:
+                with self.instrumentation.phase('split output'):
+                    self.write_split_output(merged_data)
+            except Exception as e:
+                print(f"❌ Error writing split output: {e}")
+                return False
+
+        if self.preload_path:
+            try:
+                with self.instrumentation.phase('preload manifest'):
+                    preload = self.build_preload_manifest(merged_data)
+                    if write_bytes_if_changed(self.preload_path, minified_json(preload)):
+                        print(f"✅ Saved preload manifest to: {self.preload_path}")
+            except Exception as e:
+                print(f"❌ Error writing preload manifest: {e}")
+                return False
+
+        # Garbage-collect instead of wiping, so unchanged assets are never rewritten
+        live = {asset.filename for result in results.values() for asset in result.assets}
+        if clean or (previous | self.transient) - live:
+            print("\n🧹 Collecting orphaned assets...")
+            with self.instrumentation.phase('garbage collection'):
+                self.collect_garbage(live, previous, clean)
+        self.live = live
+        if manifest:
+            with self.instrumentation.phase('save manifest'):
+                manifest.save()
+        return True
+
+    def snapshot_inputs(self) -> Dict[Path, Tuple[int, int]]:
+        """(size, mtime_ns) of every input file, for change polling."""
+        snapshot = {}
+        for path in self.input_dir.glob("*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # deleted between glob and stat
+            snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def watch(self, clean: bool = False, interval: float = 0.5, debounce: float = 0.3) -> None:
+        """
+        Poll the input directory and rebuild after each burst of changes. A burst
+        ends once the directory has been quiet for `debounce` seconds, so an
+        editor's save sequence (temp file, rename, touch) triggers one rebuild.
+        """
+        known = self.snapshot_inputs()
+        print(f"\n👀 Watching {self.input_dir} for changes (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(interval)
+                current = self.snapshot_inputs()
+                if current == known:
+                    continue
+                while True:
+                    time.sleep(debounce)
+                    settled = self.snapshot_inputs()
+                    if settled == current:
+                        break
+                    current = settled
+
+                changed = sorted(path for path in current if known.get(path) != current[path])
+                removed = sorted(set(known) - set(current))
+                known = current
+                self.rebuild(changed, removed, clean)
+                print(f"\n👀 Watching {self.input_dir} for changes (Ctrl+C to stop)")
+        except KeyboardInterrupt:
+            print("\n⏹️  Stopped watching")
+
+    def reset_build_state(self, kept: Iterable[FileResult]) -> None:
+        """
+        Start a rebuild from the results that stay published, so counters, the
+        replacement list and cross-file deduplication describe one build and a
+        reprocessed file never meets its own assets from the previous build.
+        """
+        self.processed_files = {}
+        self.replacements = []
+        self.stats = Counter()
+        self.transient = set()
+        self.cache_hits = 0
+        self.removed_assets = 0
+        for result in kept:
+            self.absorb_result(result)
+
+    def rebuild(self, changed: List[Path], removed: List[Path], clean: bool = False) -> bool:
+        """Reprocess only the changed inputs, drop removed ones and republish."""
+        start = time.perf_counter()
+        manifest = self.manifest
+        for path in removed:
+            print(f"\n🗑️  Input removed: {path.name}")
+            self.results.pop(path, None)
+            if manifest:
+                manifest.entries.pop(path.name, None)
+
+        pending = []
+        for path in changed:
+            if manifest and path in self.results:
+                entry = manifest.entries.get(path.name, {})
+                manifest.fingerprints.pop(path.name, None)
+                # Touched or re-saved without edits: nothing to do
+                if manifest.fingerprint(path)[0] == entry.get('hash'):
+                    entry['mtime_ns'] = manifest.fingerprints[path.name][2]
+                    continue
+            pending.append(path)
+
+        self.reset_build_state(result for path, result in self.results.items() if path not in pending)
+        for path, result in zip(pending, self.process_files(pending)):
+            last = self.results.get(path)
+            if result.scenario is None and last and last.scenario:
+                print(f"⚠️  Keeping the last good output for {path.name}")
+                self.absorb_result(last)
+                continue
+            self.results[path] = result
+            if manifest and result.scenario:
+                manifest.record(path, result)
+
+        if not pending and not removed:
+            print("\n♻️  Inputs touched but unchanged, nothing to rebuild")
+            return True
+        if not self.publish(self.live, clean):
+            return False
+        print(f"⚡ Rebuilt {len(pending)} changed / {len(removed)} removed input(s) "
+              f"in {time.perf_counter() - start:.2f}s")
         return True
 
     def print_summary(self):
@@ -274,9 +2101,34 @@ class AssetDeployer:
         print(f"\n📊 Deployment Summary")
         print(f"├─ Processed files: {len(self.processed_files)}")
         print(f"├─ URL replacements: {len(self.replacements)}")
+        if self.manifest_path:
+            print(f"├─ Cached inputs reused: {self.cache_hits}")
+            print(f"├─ Orphaned assets removed: {self.removed_assets}")
+        print(f"├─ Writes skipped (already stored): {self.stats['skipped_writes']}")
+        if self.stats['failed_assets']:
+            print(f"├─ Data URLs left in place (could not be stored): {self.stats['failed_assets']}")
+        if self.writer:
+            print(f"├─ Write-behind: {self.stats['queued_writes']} writes fsynced before publishing "
+                  f"(queue cap {self.writer.max_bytes / 1024 / 1024:.0f} MB, "
+                  f"{self.writer.workers} writer threads)")
+        if self.stats['images_optimized']:
+            before = self.stats['image_bytes_before']
+            after = self.stats['image_bytes_after']
+            print(f"├─ Images optimized: {self.stats['images_optimized']} "
+                  f"({before / 1024 / 1024:.2f} MB -> {after / 1024 / 1024:.2f} MB, "
+                  f"{(before - after) / before * 100:.1f}% smaller, "
+                  f"{self.stats['image_variants']} responsive variants)")
+        if self.audio_transcoder:
+            clips = self.stats['audio_transcoded'] + self.stats['audio_cache_hits']
+            if clips:
+                mb = 1024 * 1024
+                print(f"├─ Audio clips: {clips} ({self.stats['audio_cache_hits']} from cache), "
+                      f"{self.stats['audio_bytes_before'] / mb:.2f} MB -> "
+                      f"{self.stats['audio_bytes_opus'] / mb:.2f} MB opus / "
+                      f"{self.stats['audio_bytes_mp3'] / mb:.2f} MB mp3")
 
         # Calculate space savings
-        original_size = sum(len(r.original_url) for r in self.replacements)
+        original_size = sum(r.original_size for r in self.replacements)
         new_size = sum(len(r.new_url) for r in self.replacements)
         if original_size > 0:
             savings_pct = ((original_size - new_size) / original_size) * 100
@@ -287,7 +2139,7 @@ class AssetDeployer:
         total_size = 0
         for asset in self.processed_files.values():
             file_types[asset.mime_type] = file_types.get(asset.mime_type, 0) + 1
-            total_size += len(asset.data)
+            total_size += asset.size
 
         print(f"├─ Total asset size: {total_size / 1024 / 1024:.2f} MB")
         print(f"└─ File types:")
@@ -295,6 +2147,8 @@ class AssetDeployer:
             ext = MIME_TO_EXT.get(mime_type, '.bin')
             print(f"   ├─ {mime_type} ({ext}): {count} files")
 
+        self.instrumentation.report()
+
 def main():
     parser = argparse.ArgumentParser(
         description="Deploy assets from JSON data URLs to static files",
@@ -322,16 +2176,271 @@ def main():
     parser.add_argument(
         '--clean', '-c',
         action='store_true',
-        help='Clean existing assets before deployment'
+        help='Also remove untracked files from the assets directory (orphaned assets are always removed)'
+    )
+
+    parser.add_argument(
+        '--force', '-f',
+        action='store_true',
+        help='Reprocess every input even if the build manifest says it is unchanged'
+    )
+
+    parser.add_argument(
+        '--manifest', '-m',
+        default=DEFAULT_MANIFEST_PATH,
+        help=f'Build manifest path for incremental deploys (default: {DEFAULT_MANIFEST_PATH})'
+    )
+
+    parser.add_argument(
+        '--optimize-images',
+        action='store_true',
+        help='Re-encode images, cap their dimensions and generate responsive variants (requires Pillow)'
+    )
+
+    parser.add_argument(
+        '--image-format',
+        choices=['webp', 'png', 'jpeg', 'auto'],
+        default='webp',
+        help='Output format for optimized images; auto keeps the source family (default: webp)'
+    )
+
+    parser.add_argument(
+        '--max-image-size',
+        type=int,
+        default=1600,
+        help='Maximum width/height of optimized images in pixels (default: 1600)'
+    )
+
+    parser.add_argument(
+        '--image-quality',
+        type=int,
+        default=80,
+        help='Encoder quality for WebP/JPEG output, 1-100 (default: 80)'
+    )
+
+    parser.add_argument(
+        '--responsive-widths',
+        default='480,960',
+        help='Comma-separated widths of responsive variants, empty for none (default: 480,960)'
+    )
+
+    parser.add_argument(
+        '--transcode-audio',
+        action='store_true',
+        help='Loudness-normalize voice clips to mono Opus + MP3 fallback and record durations (requires ffmpeg)'
+    )
+
+    parser.add_argument(
+        '--opus-bitrate',
+        type=int,
+        default=24,
+        help='Opus bitrate in kbps for transcoded voice clips (default: 24)'
+    )
+
+    parser.add_argument(
+        '--mp3-bitrate',
+        type=int,
+        default=48,
+        help='MP3 fallback bitrate in kbps for transcoded voice clips (default: 48)'
+    )
+
+    parser.add_argument(
+        '--loudness',
+        type=float,
+        default=-16.0,
+        help='Target integrated loudness in LUFS (default: -16)'
+    )
+
+    parser.add_argument(
+        '--audio-workers',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='Concurrent ffmpeg processes (default: number of CPUs)'
+    )
+
+    parser.add_argument(
+        '--ffmpeg',
+        default=shutil.which('ffmpeg'),
+        help='Path to the ffmpeg binary (default: ffmpeg on PATH)'
+    )
+
+    parser.add_argument(
+        '--cache-dir',
+        default=DEFAULT_CACHE_DIR,
+        help=f'Directory for transform caches such as transcoded audio (default: {DEFAULT_CACHE_DIR})'
+    )
+
+    parser.add_argument(
+        '--split',
+        metavar='DIR',
+        help='Also write index.json plus one minified, content-hashed JSON file per scenario to DIR'
+    )
+
+    parser.add_argument(
+        '--precompress',
+        default='',
+        help='Comma-separated pre-compressed siblings for the merged output and split chunks: gzip, br (br requires brotli)'
+    )
+
+    parser.add_argument(
+        '--output-format',
+        choices=['pretty', 'minified', 'binary'],
+        default='pretty',
+        help='Merged output encoding: indented JSON (default), minified JSON, or compact binary '
+             '(experimental: nothing under src/ reads it yet, so use it for --format-report comparisons; '
+             'written next to --output with a .bin suffix, and the new path is printed)'
+    )
+
+    parser.add_argument(
+        '--format-report',
+        action='store_true',
+        help='Print byte sizes and decode times of every output format'
+    )
+
+    parser.add_argument(
+        '--preload-manifest',
+        metavar='PATH',
+        help='Write per-scenario asset order, sizes, MIME types and per-step byte offsets to PATH'
+    )
+
+    parser.add_argument(
+        '--watch', '-w',
+        action='store_true',
+        help='After deploying, keep watching the input directory and rebuild changed files'
+    )
+
+    parser.add_argument(
+        '--debounce',
+        type=float,
+        default=0.3,
+        help='Seconds of quiet before --watch rebuilds after a burst of saves (default: 0.3)'
+    )
+
+    parser.add_argument(
+        '--write-behind',
+        action='store_true',
+        help='Write assets on background threads, overlapping decoding and disk I/O'
+    )
+
+    parser.add_argument(
+        '--write-queue-mb',
+        type=int,
+        default=64,
+        help='Most decoded asset data held waiting for --write-behind writes, in MB (default: 64)'
+    )
+
+    parser.add_argument(
+        '--writer-threads',
+        type=int,
+        default=4,
+        help='Background writer threads for --write-behind (default: 4)'
+    )
+
+    parser.add_argument(
+        '--profile',
+        nargs='?',
+        const=DEFAULT_TRACE_PATH,
+        metavar='PATH',
+        help=f'Time every phase and write a Chrome trace-event JSON (default path: {DEFAULT_TRACE_PATH})'
+    )
+
+    parser.add_argument(
+        '--profile-memory',
+        action='store_true',
+        help='With --profile, also sample tracemalloc peaks per phase (slower)'
+    )
+
+    parser.add_argument(
+        '--verify-assets',
+        action='store_true',
+        help='Byte-compare against already stored assets instead of trusting digest and size'
+    )
+
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Disable the build manifest entirely'
+    )
+
+    parser.add_argument(
+        '--stream', '-s',
+        action='store_true',
+        help='Stream input JSON and decode data URLs chunk by chunk instead of loading whole files'
+    )
+
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        help='Number of worker processes for input files (default: 1, 0 = one per CPU)'
     )
 
     args = parser.parse_args()
+    if args.jobs < 0:
+        parser.error("--jobs must be zero or a positive integer")
+    jobs = args.jobs or os.cpu_count() or 1
+    if args.profile_memory and not args.profile:
+        parser.error("--profile-memory requires --profile")
+    if args.write_queue_mb < 1 or args.writer_threads < 1:
+        parser.error("--write-queue-mb and --writer-threads must be positive integers")
+    write_behind = None
+    if args.write_behind:
+        write_behind = {'max_bytes': args.write_queue_mb * 1024 * 1024, 'workers': args.writer_threads}
+
+    image_options = None
+    if args.optimize_images:
+        if Image is None:
+            print("⚠️  Pillow is not installed; skipping image optimization (pip install Pillow)")
+        else:
+            try:
+                widths = tuple(int(w) for w in args.responsive_widths.split(',') if w.strip())
+            except ValueError:
+                parser.error("--responsive-widths must be a comma-separated list of integers")
+            image_options = {
+                'image_format': args.image_format,
+                'max_dimension': args.max_image_size,
+                'quality': args.image_quality,
+                'widths': widths,
+            }
+
+    audio_options = None
+    if args.transcode_audio:
+        if not args.ffmpeg:
+            print("⚠️  ffmpeg not found; voice clips are kept as-is and only MP3 durations are recorded")
+        audio_options = {
+            'ffmpeg': args.ffmpeg,
+            'cache_dir': args.cache_dir,
+            'opus_bitrate': args.opus_bitrate,
+            'mp3_bitrate': args.mp3_bitrate,
+            'loudness': args.loudness,
+            'workers': max(1, args.audio_workers),
+        }
+
+    precompress = tuple(e.strip() for e in args.precompress.split(',') if e.strip())
+    unknown = set(precompress) - {'gzip', 'br'}
+    if unknown:
+        parser.error(f"Unknown --precompress encoding: {', '.join(sorted(unknown))}")
+    if 'br' in precompress and brotli is None:
+        print("⚠️  brotli is not installed; skipping .br output (pip install brotli)")
 
     # Create deployer and run
-    deployer = AssetDeployer(args.input, args.output, args.assets)
+    deployer = AssetDeployer(args.input, args.output, args.assets, stream=args.stream, jobs=jobs,
+                             manifest_path=None if args.no_cache else args.manifest,
+                             verify_assets=args.verify_assets, image_options=image_options,
+                             audio_options=audio_options, split_dir=args.split, precompress=precompress,
+                             preload_path=args.preload_manifest,
+                             instrumentation=PhaseProfiler(args.profile_memory) if args.profile else None,
+                             output_format=args.output_format, format_report=args.format_report,
+                             write_behind=write_behind)
 
     try:
-        success = deployer.deploy_assets(clean=args.clean)
+        try:
+            success = deployer.deploy_assets(clean=args.clean, force=args.force)
+            if args.watch:
+                deployer.watch(clean=args.clean, debounce=args.debounce)
+        finally:
+            if args.profile:
+                deployer.instrumentation.save(args.profile)
         if success:
             print("\n🎉 Asset deployment completed successfully!")
             sys.exit(0)
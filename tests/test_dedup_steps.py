@@ -0,0 +1,128 @@
+import base64
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# dedup-steps.py is not importable by name because of the dash
+_spec = importlib.util.spec_from_file_location('dedup_steps', REPO_ROOT / 'scripts' / 'dedup-steps.py')
+dedup_steps = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(dedup_steps)
+deploy_assets = dedup_steps.deploy_assets
+
+
+def voice(timestamp, audio, content='hello'):
+    return {'type': 'send-message', 'action': {
+        'from': 'agent', 'to': 'customer', 'timestamp': timestamp, 'content': content, 'type': 'voice',
+        'senderType': 'agent', 'audioUrl': audio}}
+
+
+def scenario(*steps):
+    return {'s': {'id': 's', 'title': 'S', 'steps': list(steps)}}
+
+
+CLIP = 'data:audio/mpeg;base64,' + base64.b64encode(bytes(range(256)) * 40).decode()
+OTHER_CLIP = 'data:audio/mpeg;base64,' + base64.b64encode(bytes(range(255, -1, -1)) * 40).decode()
+
+
+class PayloadRefTest(unittest.TestCase):
+    def test_only_repeated_payloads_become_references(self):
+        data = scenario(voice(0, CLIP), voice(1000, OTHER_CLIP), voice(2000, CLIP))
+        original = json.loads(json.dumps(data))
+        table = dedup_steps.PayloadTable(min_bytes=64)
+        table.count(data)
+        self.assertEqual(table.rewrite(data), 2)
+
+        steps = data['s']['steps']
+        key = table.key_for(CLIP)
+        self.assertEqual(steps[0]['action']['audioUrl'], {dedup_steps.PAYLOAD_REF: key})
+        self.assertEqual(steps[2]['action']['audioUrl'], {dedup_steps.PAYLOAD_REF: key})
+        self.assertEqual(steps[1]['action']['audioUrl'], OTHER_CLIP)
+        # Short and volatile members stay inline even when they repeat
+        self.assertEqual([step['action']['content'] for step in steps], ['hello'] * 3)
+        self.assertEqual(table.values, {key: CLIP})
+
+        self.assertEqual(dedup_steps.expand_payload_refs(data, table.values), original)
+
+    def test_payloads_are_shared_across_files(self):
+        first, second = scenario(voice(0, CLIP)), scenario(voice(0, CLIP, content='bye'))
+        table = dedup_steps.PayloadTable(min_bytes=64)
+        for data in (first, second):
+            table.count(data)
+        self.assertEqual(table.rewrite(first) + table.rewrite(second), 2)
+        self.assertEqual(first['s']['steps'][0]['action']['audioUrl'], second['s']['steps'][0]['action']['audioUrl'])
+
+    def test_expand_only_replaces_bare_references(self):
+        table = {'k': 'payload'}
+        data = {'a': {dedup_steps.PAYLOAD_REF: 'k'}, 'b': [{dedup_steps.PAYLOAD_REF: 'k', 'other': 1}]}
+        self.assertEqual(dedup_steps.expand_payload_refs(data, table),
+                         {'a': 'payload', 'b': [{dedup_steps.PAYLOAD_REF: 'k', 'other': 1}]})
+
+    def test_write_rewritten_round_trips(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            inputs = {'one.json': scenario(voice(0, CLIP), voice(1000, OTHER_CLIP)),
+                      'two.json': scenario(voice(0, CLIP))}
+            files = []
+            for name, data in inputs.items():
+                path = Path(tmp, name)
+                path.write_text(json.dumps(data, indent=2), encoding='utf-8')
+                files.append((path, json.loads(path.read_text(encoding='utf-8'))))
+
+            output_dir = Path(tmp, 'out')
+            output_dir.mkdir()
+            with contextlib.redirect_stdout(io.StringIO()):
+                dedup_steps.write_rewritten(files, output_dir, min_bytes=64)
+
+            table = json.loads((output_dir / 'payloads.json').read_text(encoding='utf-8'))
+            self.assertEqual(list(table.values()), [CLIP])
+            for name, data in inputs.items():
+                rewritten = json.loads((output_dir / name).read_text(encoding='utf-8'))
+                self.assertNotIn(CLIP, json.dumps(rewritten))
+                self.assertEqual(dedup_steps.expand_payload_refs(rewritten, table), data)
+
+    def test_write_rewritten_refuses_clashing_names(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            files = []
+            for directory in ('a', 'b'):
+                os.mkdir(os.path.join(tmp, directory))
+                path = Path(tmp, directory, 'scenario.json')
+                path.write_text(json.dumps(scenario(voice(0, CLIP))), encoding='utf-8')
+                files.append((path, scenario(voice(0, CLIP))))
+            with self.assertRaises(ValueError):
+                dedup_steps.write_rewritten(files, Path(tmp), min_bytes=64)
+            self.assertFalse(os.path.exists(os.path.join(tmp, 'payloads.json')))
+
+
+class DedupIndexTest(unittest.TestCase):
+    def test_data_url_and_deployed_url_are_one_payload(self):
+        asset = deploy_assets.AssetFile(base64.b64decode(CLIP.partition(',')[2]), 'audio/mpeg', None)
+        deployed = f"{deploy_assets.ASSET_URL_PREFIX}/{asset.filename}"
+        hasher = dedup_steps.AssetAwareHasher()
+        self.assertEqual(hasher.fingerprint(CLIP), hasher.fingerprint(deployed))
+        self.assertNotEqual(hasher.fingerprint(OTHER_CLIP), hasher.fingerprint(deployed))
+
+        index = dedup_steps.DedupIndex(min_bytes=32)
+        index.add_file(Path('a.json'), scenario(voice(0, CLIP)))
+        index.add_file(Path('b.json'), scenario(voice(0, deployed)))
+        [(_, entry)] = index.duplicate_payloads()
+        self.assertEqual(entry['field'], 'audioUrl')
+        self.assertEqual([ref[0] for ref in entry['refs']], ['a.json', 'b.json'])
+
+    def test_identical_and_near_duplicate_steps(self):
+        index = dedup_steps.DedupIndex()
+        index.add_file(Path('a.json'), scenario(voice(0, CLIP), voice(0, CLIP),
+                                                voice(5000, CLIP, content='  **Hello**')))
+        [(_, locations)] = index.duplicate_steps()
+        self.assertEqual(locations, [['a.json', 's', 0], ['a.json', 's', 1]])
+        self.assertEqual(len(index.near_duplicates()), 1)
+        self.assertEqual(index.step_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
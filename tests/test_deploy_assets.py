@@ -0,0 +1,237 @@
+import base64
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# deploy-assets.py is not importable by name because of the dash
+_spec = importlib.util.spec_from_file_location('deploy_assets', REPO_ROOT / 'scripts' / 'deploy-assets.py')
+deploy_assets = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(deploy_assets)
+
+
+class FakeOptimizer:
+    """Stands in for ImageOptimizer (Pillow is optional) with fixed outputs."""
+
+    def __init__(self, optimized):
+        self.optimized = optimized
+
+    def handles(self, mime_type):
+        return True
+
+    def optimize(self, data, mime_type):
+        return self.optimized
+
+
+class FailingStore(deploy_assets.AssetStore):
+    """Asset store whose writes fail for the given digests."""
+
+    def __init__(self, root, failing):
+        super().__init__(root)
+        self.failing = failing
+
+    def put(self, asset):
+        if asset.hash in self.failing:
+            raise OSError("disk full")
+        return super().put(asset)
+
+
+class ProcessAssetSrcSetTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.deployer = deploy_assets.AssetDeployer(str(root / 'in'), str(root / 'out.json'), str(root / 'assets'))
+        self.main = deploy_assets.AssetFile(b'main', 'image/webp', None)
+        self.small = deploy_assets.AssetFile(b'small', 'image/webp', None)
+        self.medium = deploy_assets.AssetFile(b'medium', 'image/webp', None)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def process(self, failing):
+        self.deployer.store = FailingStore(self.deployer.assets_dir, failing)
+        self.deployer.image_optimizer = FakeOptimizer(
+            deploy_assets.OptimizedImage(self.main, [(480, self.small), (960, self.medium)], 1600, 900))
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.deployer.process_asset(deploy_assets.AssetFile(b'source', 'image/png', None))
+
+    def test_failed_variant_is_left_out(self):
+        _, url, extra = self.process({self.small.hash})
+        self.assertNotIn('None', extra['imageSrcSet'])
+        self.assertEqual(extra['imageSrcSet'], f"{self.deployer.store.url_for(self.medium)} 960w, {url} 1600w")
+
+    def test_no_srcset_when_every_variant_fails(self):
+        _, url, extra = self.process({self.small.hash, self.medium.hash})
+        self.assertTrue(url)
+        self.assertNotIn('imageSrcSet', extra)
+        self.assertEqual(extra['imageWidth'], 1600)
+
+
+def mp3_frames(count, xing_frames=None):
+    """count MPEG-1 Layer III frames (128 kbps, 44.1 kHz, stereo), the first optionally carrying a Xing header"""
+    frame = bytearray(417)
+    frame[:4] = b'\xff\xfb\x90\x00'
+    first = bytearray(frame)
+    if xing_frames is not None:
+        first[36:48] = b'Xing' + (1).to_bytes(4, 'big') + xing_frames.to_bytes(4, 'big')
+    return b'ID3\x04\x00\x00\x00\x00\x00\x00' + bytes(first) + bytes(frame) * (count - 1)
+
+
+class Mp3DurationTest(unittest.TestCase):
+    def test_xing_frame_count(self):
+        self.assertEqual(deploy_assets.mp3_data_duration_ms(mp3_frames(10, xing_frames=100)), 2612)
+
+    def test_zero_xing_frame_count_falls_back_to_walking_frames(self):
+        # ffmpeg writing to a pipe cannot seek back to fill in the count
+        self.assertEqual(deploy_assets.mp3_data_duration_ms(mp3_frames(10, xing_frames=0)), 261)
+
+    def test_without_xing_header(self):
+        self.assertEqual(deploy_assets.mp3_data_duration_ms(mp3_frames(10)), 261)
+
+    def test_not_mp3(self):
+        self.assertIsNone(deploy_assets.mp3_data_duration_ms(b'RIFF' + bytes(100)))
+
+
+class WrappedBase64Test(unittest.TestCase):
+    """Data URLs whose base64 is wrapped at 76 columns, as MIME encoders write it."""
+
+    payload = b'ID3\x04\x00\x00' + os.urandom(5000)
+    data_url = 'data:audio/mpeg;base64,' + base64.encodebytes(payload).decode('ascii')
+
+    def test_decoder_ignores_line_breaks_at_any_chunk_boundary(self):
+        encoded = self.data_url.split(',', 1)[1].encode('ascii')
+        for size in (1, 3, 7, 77, 4096):
+            decoder = deploy_assets.Base64StreamDecoder()
+            blocks = [decoder.feed(encoded[pos:pos + size]) for pos in range(0, len(encoded), size)]
+            blocks.append(decoder.finish())
+            self.assertEqual(b''.join(blocks), self.payload)
+
+    def test_deploy_in_memory_and_streaming(self):
+        for stream in (False, True):
+            with tempfile.TemporaryDirectory() as tmp:
+                root = Path(tmp)
+                (root / 'in').mkdir()
+                scenario = {'s': {'id': 's', 'title': 'S', 'steps': [
+                    {'type': 'send-message', 'action': {'audioUrl': self.data_url}}]}}
+                (root / 'in' / 's.json').write_text(json.dumps(scenario), encoding='utf-8')
+                deployer = deploy_assets.AssetDeployer(str(root / 'in'), str(root / 'out.json'),
+                                                       str(root / 'assets'), stream=stream)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    data = deployer.process_json_file(root / 'in' / 's.json')
+                url = data['s']['steps'][0]['action']['audioUrl']
+                self.assertTrue(url.startswith(deploy_assets.ASSET_URL_PREFIX), (stream, url))
+                stored = root / 'assets' / url[len(deploy_assets.ASSET_URL_PREFIX) + 1:]
+                self.assertEqual(stored.read_bytes(), self.payload)
+
+
+class CorruptDataUrlTest(unittest.TestCase):
+    """A data URL that cannot be decoded stays as it was, in both modes, and the rest still deploys."""
+
+    good = 'data:audio/mpeg;base64,' + base64.b64encode(b'ID3\x04\x00\x00' + bytes(1000)).decode('ascii')
+    # Longer than several read chunks, and only found to be broken at the very end
+    corrupt = 'data:audio/mpeg;base64,' + base64.b64encode(os.urandom(300_000)).decode('ascii') + 'A'
+
+    def test_corrupt_data_url_is_left_in_place(self):
+        for stream in (False, True):
+            with self.subTest(stream=stream), tempfile.TemporaryDirectory() as tmp:
+                root = Path(tmp)
+                (root / 'in').mkdir()
+                steps = [{'type': 'send-message', 'action': {'content': 'é', 'audioUrl': url}}
+                         for url in (self.good, self.corrupt, self.good)]
+                (root / 'in' / 's.json').write_text(
+                    json.dumps({'s': {'id': 's', 'title': 'S', 'steps': steps}}, indent=2), encoding='utf-8')
+                deployer = deploy_assets.AssetDeployer(str(root / 'in'), str(root / 'out.json'),
+                                                       str(root / 'assets'), stream=stream)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    data = deployer.process_json_file(root / 'in' / 's.json')
+                actions = [step['action'] for step in data['s']['steps']]
+                self.assertEqual(actions[1], {'content': 'é', 'audioUrl': self.corrupt})
+                for action in (actions[0], actions[2]):
+                    self.assertTrue(action['audioUrl'].startswith(deploy_assets.ASSET_URL_PREFIX))
+                self.assertEqual(deployer.stats['failed_assets'], 1)
+                self.assertEqual(len(deployer.replacements), 2)
+                self.assertEqual([path.name for path in (root / 'assets').rglob('*.part')], [])
+
+
+class WatchRebuildTest(unittest.TestCase):
+    def audio_url(self, n):
+        return 'data:audio/mpeg;base64,' + base64.b64encode(b'ID3\x04\x00\x00' + bytes([n]) * 500).decode('ascii')
+
+    def write_input(self, path, *payloads):
+        steps = [{'type': 'send-message', 'action': {'audioUrl': self.audio_url(n)}} for n in payloads]
+        path.write_text(json.dumps({path.stem: {'id': path.stem, 'title': path.stem, 'steps': steps}}),
+                        encoding='utf-8')
+
+    def test_rebuild_counts_only_the_current_build(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / 'in').mkdir()
+            first, second = root / 'in' / 'a.json', root / 'in' / 'b.json'
+            self.write_input(first, 1, 2)
+            self.write_input(second, 3)
+            deployer = deploy_assets.AssetDeployer(str(root / 'in'), str(root / 'out.json'), str(root / 'assets'))
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertTrue(deployer.deploy_assets())
+            self.assertEqual(len(deployer.replacements), 3)
+
+            for n in (4, 5):
+                self.write_input(first, 1, n)
+                out = io.StringIO()
+                with contextlib.redirect_stdout(out):
+                    self.assertTrue(deployer.rebuild([first], []))
+                self.assertEqual(len(deployer.replacements), 3)
+                self.assertEqual(len(deployer.processed_files), 3)
+                # Payload 1 was stored by this file's previous build, not shared with another file
+                self.assertNotIn('Duplicate file found', out.getvalue())
+
+
+class BinaryOutputPathTest(unittest.TestCase):
+    def test_renamed_output_path_is_announced(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                deployer = deploy_assets.AssetDeployer(tmp, str(Path(tmp) / 'merged.json'),
+                                                       str(Path(tmp) / 'assets'), output_format='binary')
+            self.assertEqual(deployer.output_path, Path(tmp) / 'merged.bin')
+            self.assertIn(str(deployer.output_path), out.getvalue())
+
+    def test_explicit_bin_output_is_kept_quietly(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                deployer = deploy_assets.AssetDeployer(tmp, str(Path(tmp) / 'merged.bin'),
+                                                       str(Path(tmp) / 'assets'), output_format='binary')
+            self.assertEqual(deployer.output_path, Path(tmp) / 'merged.bin')
+            self.assertEqual(out.getvalue(), '')
+
+
+class OutputFormatTest(unittest.TestCase):
+    def test_compact_encoding_round_trips(self):
+        data = json.loads((REPO_ROOT / 'src' / 'data' / 'mk_250924.json').read_text(encoding='utf-8'))
+        self.assertEqual(deploy_assets.decode_compact(deploy_assets.encode_compact(data)), data)
+
+    def test_failed_format_report_is_reported_not_raised(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / 'in').mkdir()
+            (root / 'in' / 's.json').write_text(json.dumps({'s': {'id': 's', 'title': 'S', 'steps': []}}),
+                                                encoding='utf-8')
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out), \
+                    mock.patch.object(deploy_assets, 'decode_compact', return_value={}):
+                deployer = deploy_assets.AssetDeployer(str(root / 'in'), str(root / 'out.json'),
+                                                       str(root / 'assets'), format_report=True)
+                self.assertFalse(deployer.deploy_assets())
+            self.assertIn('❌ Error comparing output formats', out.getvalue())
+            self.assertTrue((root / 'out.json').exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import contextlib
+import glob
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, REPO_ROOT)
+import fix_markdown  # noqa: E402
+
+
+class RuleTest(unittest.TestCase):
+    def fix(self, text, *rules):
+        return fix_markdown.MarkdownFixer(rules).fix(text)
+
+    def test_bold_closed_across_lines(self):
+        self.assertEqual(self.fix("intro **first\n**second", 'bold'), "intro **first**\n**second**")
+        self.assertEqual(self.fix("**a \n**  b  ", 'bold'), "**a**\n**b**")
+        # The next line has other emphasis, so the pair rule skips it and each line is closed on its own
+        self.assertEqual(self.fix("**a\n**b *c*", 'bold'), "**a**\n**b *c***")
+
+    def test_unclosed_bold(self):
+        for text, expected in [("**text", "**text**"), ("**text**", "**text**"), ("**a** and **b", "**a** and **b"),
+                               ("  **padded  ", "**padded**"), ("plain", "plain")]:
+            with self.subTest(text=text):
+                self.assertEqual(self.fix(text, 'bold'), expected)
+
+    def test_unclosed_italic(self):
+        for text, expected in [("*text", "*text*"), ("*text*", "*text*"), ("* list item", "* list item"),
+                               ("**bold", "**bold"), ("*", "*")]:
+            with self.subTest(text=text):
+                self.assertEqual(self.fix(text, 'italic'), expected)
+
+    def test_code_span(self):
+        for text, expected in [("run `ls", "run `ls`"), ("run `ls`", "run `ls`"), ("```python", "```python"),
+                               ("a `b` `c", "a `b` `c`")]:
+            with self.subTest(text=text):
+                self.assertEqual(self.fix(text, 'code'), expected)
+
+    def test_list_marker_spacing(self):
+        for text, expected in [("-item", "- item"), ("+item", "+ item"), ("1.item", "1. item"),
+                               ("12)item", "12) item"), ("- item", "- item"), ("---", "---"), ("-1", "-1"),
+                               ("1.5", "1.5"), ("1.", "1."), ("--flag", "--flag")]:
+            with self.subTest(text=text):
+                self.assertEqual(self.fix(text, 'list'), expected)
+
+    def test_rules_apply_only_when_selected(self):
+        text = "*a\n`b\n-c\n**d"
+        self.assertEqual(self.fix(text, 'bold'), "*a\n`b\n-c\n**d**")
+        self.assertEqual(self.fix(text, 'bold', 'italic', 'code', 'list'), "*a*\n`b`\n- c\n**d**")
+
+    def test_unknown_rule(self):
+        with self.assertRaises(ValueError):
+            fix_markdown.MarkdownFixer(['bold', 'underline'])
+
+    def test_non_strings_pass_through(self):
+        self.assertIsNone(fix_markdown.MarkdownFixer().fix(None))
+
+    def test_only_reason_and_content_are_fixed(self):
+        data = {'steps': [{'action': {'content': '**a', 'title': '**a', 'reason': '*b'}}]}
+        fix_markdown.fix_json_object(data, fix_markdown.MarkdownFixer(['bold', 'italic']))
+        self.assertEqual(data, {'steps': [{'action': {'content': '**a**', 'title': '**a', 'reason': '*b*'}}]})
+
+
+class BoldEquivalenceTest(unittest.TestCase):
+    """fix_markdown_bold must keep giving the old regex implementation's results"""
+
+    def test_handwritten_cases(self):
+        for text in ["**a\n**b", "**a\n**b\n**c", "**a\n**b*c", "x **a\n**b\n\n**c", "**\n**", "** a\n** b ",
+                     "*a\n**b", "**a**\n**b", "", "\n", "**a\n**b\n**c\n**d"]:
+            with self.subTest(text=text):
+                self.assertEqual(fix_markdown.fix_markdown_bold(text), fix_markdown.fix_markdown_bold_regex(text))
+
+    def test_scenario_strings_and_mutations(self):
+        corpus = []
+        for path in sorted(glob.glob(os.path.join(REPO_ROOT, 'src', 'data', '*.json'))):
+            with open(path, 'r', encoding='utf-8') as f:
+                corpus.extend(fix_markdown.iter_fixed_fields(json.load(f)))
+        self.assertTrue(corpus)
+        rng = random.Random(0)
+        corpus.extend([mutated for text in corpus[:300] for mutated in fix_markdown.mutations(text, rng, 10)])
+        mismatches = [text for text in corpus
+                      if fix_markdown.fix_markdown_bold(text) != fix_markdown.fix_markdown_bold_regex(text)]
+        self.assertEqual(mismatches[:3], [])
+
+
+class FixFileTest(unittest.TestCase):
+    def test_file_is_fixed_and_backed_up(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'scenario.json')
+            original = json.dumps({'s': {'steps': [{'action': {'content': '**a\n**b'}}]}})
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(original)
+            with contextlib.redirect_stdout(io.StringIO()):
+                fix_markdown.fix_file(path, fix_markdown.MarkdownFixer())
+            with open(path, 'r', encoding='utf-8') as f:
+                self.assertEqual(json.load(f)['s']['steps'][0]['action']['content'], '**a**\n**b**')
+            with open(path + '.backup', 'r', encoding='utf-8') as f:
+                self.assertEqual(f.read(), original)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,574 @@
+import base64
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import scenario_steps  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'data')
+
+
+def load_fixture(name):
+    with open(os.path.join(DATA_DIR, name), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class SpliceSaveTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'scenario.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def remove_step(self, body):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(body)
+        data, source = scenario_steps.load_scenario_document(self.path)
+        expected = json.loads(body)
+        next(iter(expected.values()))['steps'].pop(1)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            scenario_steps.remove_step(data, 1)
+            scenario_steps.save_scenario_json(self.path, data, source)
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f), expected)
+        return output.getvalue()
+
+    def test_compact_file_is_rewritten_not_spliced(self):
+        data = load_fixture('mk_250924.json')
+        output = self.remove_step(json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+        self.assertNotIn('spliced', output)
+
+    def test_pretty_file_is_spliced(self):
+        data = load_fixture('mk_250924.json')
+        output = self.remove_step(json.dumps(data, ensure_ascii=False, indent=2))
+        self.assertIn('spliced', output)
+
+    def save_edited(self, edit):
+        """Save a pretty-printed fixture after edit(data); return the save output"""
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(load_fixture('mk_250924.json'), ensure_ascii=False, indent=2))
+        data, source = scenario_steps.load_scenario_document(self.path)
+        edit(data, next(iter(data.values()))['steps'])
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            scenario_steps.save_scenario_json(self.path, data, source)
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.assertEqual(f.read(), json.dumps(data, ensure_ascii=False, indent=2))
+        return output.getvalue()
+
+    def test_splice_matches_a_full_rewrite(self):
+        new_step = {'type': 'send-message', 'action': {'from': 'a', 'to': 'b', 'content': 'added\nline'}}
+        edits = {
+            'insert': lambda data, steps: steps.insert(3, new_step),
+            'append': lambda data, steps: steps.append(new_step),
+            'remove first': lambda data, steps: steps.pop(0),
+            'remove last': lambda data, steps: steps.pop(),
+            'move': lambda data, steps: steps.insert(0, steps.pop(5)),
+            'edit in place': lambda data, steps: steps[4]['action'].update(timestamp=12345),
+            'replace payload': lambda data, steps: steps[2]['action'].update(
+                audioUrl='data:audio/mpeg;base64,' + 'A' * 4096),
+            'clear': lambda data, steps: steps.clear(),
+        }
+        for name, edit in edits.items():
+            with self.subTest(name):
+                self.assertIn('spliced', self.save_edited(edit))
+
+    def test_change_outside_the_steps_is_a_full_rewrite(self):
+        def retitle(data, steps):
+            next(iter(data.values()))['title'] = 'renamed'
+            steps.pop()
+        self.assertNotIn('spliced', self.save_edited(retitle))
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.data = load_fixture('mk_250924.json')
+        self.steps = next(iter(self.data.values()))['steps']
+        self.before = json.dumps(self.data)
+
+    def apply(self, *lines):
+        return scenario_steps.apply_batch(self.data, scenario_steps.read_batch(lines))
+
+    def test_operations_see_the_result_of_earlier_ones(self):
+        first, second, third = self.steps[:3]
+        original_to = first['action']['to']
+        log = self.apply('{"op": "move", "from": 0, "to": 1}',
+                         '{"op": "remove", "index": 0}',
+                         '{"op": "patch", "index": 0, "patch": {"action": {"to": "someone_else"}}}')
+        self.assertEqual(len(log), 3)
+        steps = next(iter(self.data.values()))['steps']
+        self.assertEqual(steps[0]['type'], first['type'])
+        self.assertEqual(steps[0]['action']['to'], 'someone_else')
+        self.assertEqual(first['action']['to'], original_to)  # step dicts are copied, never modified
+        self.assertIs(steps[1], third)
+        self.assertNotIn(second, steps)
+
+    def test_one_bad_operation_rejects_the_whole_batch(self):
+        with self.assertRaises(ValueError) as caught:
+            self.apply('{"op": "remove", "index": 0}',
+                       '{"op": "remove", "index": 9999}')
+        self.assertIn('line 2', str(caught.exception))
+        self.assertEqual(json.dumps(self.data), self.before)
+
+    def test_patch_that_breaks_the_schema_is_rejected(self):
+        with self.assertRaises(ValueError) as caught:
+            self.apply('{"op": "patch", "index": 0, "patch": {"action": {"from": 123, "bogus": 1}}}')
+        self.assertIn('action.from', str(caught.exception))
+        self.assertIn('action.bogus', str(caught.exception))
+        self.assertEqual(json.dumps(self.data), self.before)
+
+    def test_patch_tolerates_problems_the_step_already_had(self):
+        self.steps[0]['action'].pop('timestamp', None)
+        self.before = json.dumps(self.data)
+        self.apply('{"op": "patch", "index": 0, "patch": {"action": {"to": "someone_else"}}}')
+        self.assertEqual(next(iter(self.data.values()))['steps'][0]['action']['to'], 'someone_else')
+
+
+class FakeOptimizer:
+    """Stands in for ImageOptimizer (Pillow is optional): one 480w variant plus a 960x540 main image."""
+
+    def __init__(self, deploy_assets):
+        self.optimized = deploy_assets.OptimizedImage(
+            deploy_assets.AssetFile(b'main', 'image/webp', None),
+            [(480, deploy_assets.AssetFile(b'small', 'image/webp', None))], 960, 540)
+
+    def handles(self, mime_type):
+        return mime_type.startswith('image/')
+
+    def optimize(self, data, mime_type):
+        return self.optimized
+
+
+class FakeTranscoder:
+    """Stands in for AudioTranscoder (ffmpeg is optional): stores an Opus and an MP3 output per clip."""
+
+    workers = 1
+
+    def __init__(self, deploy_assets):
+        self.deploy_assets = deploy_assets
+
+    def transcode(self, source, store):
+        outputs = [self.deploy_assets.AssetFile(prefix + source.hash.encode(), mime_type, None)
+                   for prefix, mime_type in [(b'opus', 'audio/ogg'), (b'mp3', 'audio/mpeg')]]
+        for output in outputs:
+            store.put(output)
+        return {'outputs': [output.to_dict() for output in outputs], 'duration_ms': 1200, 'cached': False}
+
+
+class StepSchemaTest(unittest.TestCase):
+    def deploy(self, steps):
+        """Run deploy-assets over a one-scenario file and return the deployed steps"""
+        deploy_assets = scenario_steps.deploy_assets_module()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.mkdir(os.path.join(tmp, 'in'))
+            with open(os.path.join(tmp, 'in', 'scenario.json'), 'w', encoding='utf-8') as f:
+                json.dump({'s': {'id': 's', 'title': 'S', 'steps': steps}}, f)
+            deployer = deploy_assets.AssetDeployer(os.path.join(tmp, 'in'), os.path.join(tmp, 'out.json'),
+                                                   os.path.join(tmp, 'assets'))
+            deployer.image_optimizer = FakeOptimizer(deploy_assets)
+            deployer.audio_transcoder = FakeTranscoder(deploy_assets)
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertTrue(deployer.deploy_assets())
+            with open(os.path.join(tmp, 'out.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)['s']['steps']
+
+    def test_fields_written_by_the_deployer_are_declared(self):
+        [step] = self.deploy([{'type': 'send-message', 'action': {
+            'from': 'agent', 'to': 'customer', 'timestamp': 0, 'content': 'hi', 'type': 'voice',
+            'senderType': 'agent',
+            'imageUrl': 'data:image/png;base64,' + base64.b64encode(b'png').decode(),
+            'audioUrl': 'data:audio/mpeg;base64,' + base64.b64encode(b'mp3').decode(),
+        }}])
+        action = step['action']
+        # The deployer really did write every optional field, under its real names
+        self.assertEqual({'imageWidth', 'imageHeight', 'imageSrcSet', 'audioSources', 'audioDuration'} - set(action), set())
+        self.assertEqual([sorted(source) for source in action['audioSources']], [['type', 'url'], ['type', 'url']])
+        self.assertEqual(scenario_steps.check_step(step), [])
+        self.assertEqual(scenario_steps.step_to_dict(scenario_steps.validate_step(step)), step)
+
+    def test_api_response_reason(self):
+        step = {'type': 'api-response', 'action': {
+            'from': 'server', 'to': 'agent', 'timestamp': 0, 'service': 'uber', 'response': '{}', 'reason': 'ok'}}
+        self.assertEqual(scenario_steps.check_step(step), [])
+
+
+def message(timestamp, **action):
+    return {'type': 'send-message', 'action': dict(
+        {'from': 'agent', 'to': 'customer', 'timestamp': timestamp, 'content': 'hi', 'type': 'text',
+         'senderType': 'agent'}, **action)}
+
+
+def timestamps(steps):
+    return [step['action'].get('timestamp') for step in steps]
+
+
+class TimelineTest(unittest.TestCase):
+    def test_check_reports_missing_out_of_order_and_overlapping_steps(self):
+        steps = [message(0, audioDuration=1000), message(500), message(None), message(2000), message(1500)]
+        del steps[2]['action']['timestamp']
+        problems = scenario_steps.check_timeline(steps, scenario_steps.TimelineOptions(gap=100, audio_durations=True))
+        self.assertEqual([i for i, _ in problems], [1, 2, 4])
+        self.assertIn("overlaps step 0", problems[0][1])
+        self.assertIn("missing", problems[1][1])
+        self.assertIn("out of order", problems[2][1])
+
+    def test_durations_only_count_with_audio_durations(self):
+        steps = [message(0, audioDuration=1000), message(500)]
+        self.assertEqual(scenario_steps.check_timeline(steps, scenario_steps.TimelineOptions()), [])
+        self.assertEqual(len(scenario_steps.check_timeline(steps, scenario_steps.TimelineOptions(audio_durations=True))), 1)
+
+    def test_retime_ripples_until_slack_absorbs_the_push(self):
+        steps = [message(0, audioDuration=1000), message(200), message(900), message(5000)]
+        changes = scenario_steps.retime_steps(steps, scenario_steps.TimelineOptions(gap=100, audio_durations=True))
+        self.assertEqual(changes, [(1, 200, 1100), (2, 900, 1200)])
+        self.assertEqual(timestamps(steps), [0, 1100, 1200, 5000])
+        self.assertEqual(scenario_steps.retime_steps(steps, scenario_steps.TimelineOptions(gap=100, audio_durations=True)), [])
+
+    def test_retime_fills_in_missing_timestamps(self):
+        steps = [message(None), message(300), message(None)]
+        for step in steps[::2]:
+            del step['action']['timestamp']
+        changes = scenario_steps.retime_steps(steps, scenario_steps.TimelineOptions(gap=50))
+        self.assertEqual(changes, [(0, None, 0), (2, None, 350)])
+
+    def test_add_with_shift_makes_room(self):
+        data = {'s': {'id': 's', 'steps': [message(0), message(1000), message(3000)]}}
+        with contextlib.redirect_stdout(io.StringIO()):
+            scenario_steps.add_step(data, message(900, audioDuration=500), 1,
+                                    scenario_steps.TimelineOptions(gap=100, audio_durations=True))
+        # 900 + 500 ms clip + 100 ms gap pushes the step at 1000 to 1500, and everything after it too
+        self.assertEqual(timestamps(data['s']['steps']), [0, 900, 1500, 3500])
+
+    def test_add_without_shift_leaves_later_steps(self):
+        data = {'s': {'id': 's', 'steps': [message(0), message(1000)]}}
+        with contextlib.redirect_stdout(io.StringIO()):
+            scenario_steps.add_step(data, message(900, audioDuration=500), 1)
+        self.assertEqual(timestamps(data['s']['steps']), [0, 900, 1000])
+
+    def test_add_with_shift_does_not_pull_steps_earlier(self):
+        data = {'s': {'id': 's', 'steps': [message(0), message(5000)]}}
+        with contextlib.redirect_stdout(io.StringIO()):
+            scenario_steps.add_step(data, message(100), 1, scenario_steps.TimelineOptions(gap=100))
+        self.assertEqual(timestamps(data['s']['steps']), [0, 100, 5000])
+
+    def test_remove_with_shift_closes_the_gap(self):
+        data = {'s': {'id': 's', 'steps': [message(0), message(1000), message(2500), message(4000)]}}
+        with contextlib.redirect_stdout(io.StringIO()):
+            scenario_steps.remove_step(data, 1, shift=True)
+        self.assertEqual(timestamps(data['s']['steps']), [0, 1000, 2500])
+
+    def test_shift_on_the_command_line(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'scenario.json')
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'s': {'id': 's', 'steps': [message(0), message(1000), message(2000)]}}, f)
+            argv = ['manage_steps.py', '--file', path, '--add-step', json.dumps(message(1000)),
+                    '--insert-at', '1', '--shift', '--gap', '250']
+            with mock.patch.object(sys, 'argv', argv), contextlib.redirect_stdout(io.StringIO()):
+                scenario_steps.main()
+            with open(path, 'r', encoding='utf-8') as f:
+                self.assertEqual(timestamps(json.load(f)['s']['steps']), [0, 1000, 1250, 2250])
+
+            argv = ['manage_steps.py', '--file', path, '--timeline', '--gap', '250']
+            with mock.patch.object(sys, 'argv', argv), contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(scenario_steps.main(), 0)
+
+
+class EditSessionErrorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'scenario.json')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'s': {'id': 's', 'title': 'S', 'steps': []}}, f)
+        self.session = scenario_steps.EditSession()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def call(self, method, params):
+        line = json.dumps({'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': params})
+        return json.loads(self.session.handle_line(line))
+
+    def test_bad_params_are_invalid_params(self):
+        for method, params in [('open', {}), ('open', {'file': self.path, 'bogus': 1}),
+                               ('open', {'file': 3}), ('query', {'file': self.path, 'colour': 'red'})]:
+            self.assertEqual(self.call(method, params)['error']['code'], scenario_steps.RPC_INVALID_PARAMS,
+                             (method, params))
+
+    def test_type_error_inside_method_is_internal_error(self):
+        def broken(file):
+            return len(None)
+        self.session.methods['broken'] = broken
+        self.assertEqual(self.call('broken', {'file': self.path})['error']['code'], scenario_steps.RPC_INTERNAL_ERROR)
+
+
+class EditSessionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'scenario.json')
+        self.write({'s': {'id': 's', 'title': 'S', 'steps': [message(0), message(1000, **{'from': 'customer'})]}})
+        self.session = scenario_steps.EditSession()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, data):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+
+    def read(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def call(self, method, **params):
+        response = json.loads(self.session.handle_line(
+            json.dumps({'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': dict(params, file=self.path)})))
+        self.assertEqual(response['id'], 1)
+        return response
+
+    def result(self, method, **params):
+        response = self.call(method, **params)
+        self.assertNotIn('error', response)
+        return response['result']
+
+    def test_open_lists_scenarios(self):
+        self.assertEqual(self.result('open'), {'scenarios': [{'key': 's', 'id': 's', 'title': 'S', 'steps': 2}]})
+
+    def test_edits_are_kept_until_save(self):
+        before = self.read()
+        result = self.result('add', step=message(500, to='restaurant'), at=1)
+        self.assertEqual(result['steps'], 3)
+        self.assertIn('Step inserted at position 1', result['log'])
+        # The query index is rebuilt after the edit, but nothing is written yet
+        self.assertEqual([match['index'] for match in self.result('query', to='restaurant')['matches']], [1])
+        self.assertEqual(self.read(), before)
+        self.assertEqual(self.session.unsaved(), [self.path])
+
+        self.assertEqual(self.result('save')['saved'], [self.path])
+        self.assertEqual(timestamps(self.read()['s']['steps']), [0, 500, 1000])
+        self.assertEqual(self.result('save')['saved'], [])
+        self.assertEqual(self.session.unsaved(), [])
+
+    def test_remove_and_retime(self):
+        self.result('add', step=message(200), shift=True, gap=1000)
+        self.assertEqual(self.result('remove', index=0)['steps'], 2)
+        self.assertEqual(self.result('timeline', gap=1000)['problems'], [{'index': 1, 'message': mock.ANY}])
+        self.assertEqual(self.result('retime', gap=1000)['changes'], [{'index': 1, 'old': 200, 'new': 2000}])
+        self.result('save')
+        self.assertEqual(timestamps(self.read()['s']['steps']), [1000, 2000])
+
+    def test_batch_dry_run_changes_nothing(self):
+        operations = [{'op': 'remove', 'index': 0}, {'op': 'patch', 'index': 0, 'patch': {'action': {'to': 'x'}}}]
+        self.assertEqual(len(self.result('batch', operations=operations, dryRun=True)['applied']), 2)
+        self.assertEqual(self.result('list')['steps'][0]['from'], 'agent')
+        self.assertEqual(self.session.unsaved(), [])
+
+        self.result('batch', operations=operations)
+        self.assertEqual([step['to'] for step in self.result('list')['steps']], ['x'])
+
+    def test_failed_batch_leaves_the_document_alone(self):
+        response = self.call('batch', operations=[{'op': 'remove', 'index': 0}, {'op': 'remove', 'index': 5}])
+        self.assertEqual(response['error']['code'], scenario_steps.RPC_APPLICATION_ERROR)
+        self.assertEqual(len(self.result('list')['steps']), 2)
+        self.assertEqual(self.session.unsaved(), [])
+
+    def test_reloads_a_clean_document_changed_on_disk(self):
+        self.result('open')
+        self.write({'s': {'id': 's', 'title': 'S', 'steps': [message(0)]}})
+        self.assertEqual(len(self.result('list')['steps']), 1)
+
+    def test_refuses_to_reload_over_unsaved_edits(self):
+        self.result('remove', index=0)
+        self.write({'s': {'id': 's', 'title': 'Changed elsewhere', 'steps': []}})
+        self.assertEqual(self.call('list')['error']['code'], scenario_steps.RPC_APPLICATION_ERROR)
+        self.assertEqual(self.call('close')['error']['code'], scenario_steps.RPC_APPLICATION_ERROR)
+        self.assertEqual(self.result('close', discard=True), {'closed': True})
+        self.assertEqual(self.result('open')['scenarios'][0]['title'], 'Changed elsewhere')
+
+    def test_protocol_errors(self):
+        self.assertEqual(json.loads(self.session.handle_line('{'))['error']['code'], scenario_steps.RPC_PARSE_ERROR)
+        self.assertEqual(json.loads(self.session.handle_line('{"id": 1, "method": "open"}'))['error']['code'],
+                         scenario_steps.RPC_INVALID_REQUEST)
+        self.assertEqual(self.call('rename')['error']['code'], scenario_steps.RPC_METHOD_NOT_FOUND)
+        # Notifications get no response, but still run
+        notification = {'jsonrpc': '2.0', 'method': 'remove', 'params': {'file': self.path, 'index': 0}}
+        self.assertIsNone(self.session.handle_line(json.dumps(notification)))
+        self.assertEqual(len(self.result('list')['steps']), 1)
+
+    def test_serve_answers_each_request_line(self):
+        lines = [json.dumps({'jsonrpc': '2.0', 'id': i, 'method': 'open', 'params': {'file': self.path}})
+                 for i in (1, 2)]
+        output = io.StringIO()
+        self.session.serve(lines[:1] + ['\n'] + lines[1:], output.write)
+        self.assertEqual([json.loads(line)['id'] for line in output.getvalue().splitlines()], [1, 2])
+
+
+def contents(steps):
+    return [step['action']['content'] for step in steps]
+
+
+class DiffMergeTest(unittest.TestCase):
+    def setUp(self):
+        self.hasher = scenario_steps.PayloadHasher()
+        self.base = [message(i * 1000, content=name) for i, name in enumerate('abcde')]
+
+    def edited(self, step, **action):
+        return dict(step, action=dict(step['action'], **action))
+
+    def diff(self, new):
+        return [(change.kind, change.old, change.new, change.fields)
+                for change in scenario_steps.diff_steps(self.base, new, self.hasher)]
+
+    def test_identical_arrays_have_no_changes(self):
+        alignment = scenario_steps.align_steps(self.base, list(self.base), self.hasher)
+        self.assertEqual(alignment.old_to_new, {i: i for i in range(5)})
+        self.assertEqual(alignment.stable, set(range(5)))
+        self.assertEqual(self.diff(list(self.base)), [])
+
+    def test_insert_remove_modify_and_move(self):
+        a, b, c, d, e = self.base
+        new = [a, self.edited(b, content='b2'), message(1500, content='x'), d, c]
+        self.assertEqual(self.diff(new), [
+            ('modified', 1, 1, ['$.action.content']),
+            ('inserted', None, 2, []),
+            ('moved', 2, 4, []),
+            ('removed', 4, None, []),
+        ])
+
+    def test_removals_are_reported_before_the_next_anchor(self):
+        a, b, c, d, e = self.base
+        self.assertEqual(self.diff([a, d, e]), [('removed', 1, None, []), ('removed', 2, None, [])])
+
+    def test_steps_with_an_id_align_by_id(self):
+        self.base = [self.edited(step, id=f'step-{i}') for i, step in enumerate(self.base)]
+        a, b, c, d, e = self.base
+        # b is edited and moved: without its id it would look like a removal plus an insertion
+        new = [a, c, d, self.edited(b, content='b2', timestamp=3500), e]
+        self.assertEqual(self.diff(new), [('moved', 1, 3, ['$.action.timestamp', '$.action.content'])])
+
+    def test_duplicate_steps_pair_in_order(self):
+        a, b, c, d, e = self.base
+        self.base = [a, b, a, c]
+        self.assertEqual(self.diff([a, b, c]), [('removed', 2, None, [])])
+
+    def test_scenario_records(self):
+        old = {'s': {'id': 's', 'title': 'S', 'steps': self.base}, 'gone': {'id': 'gone', 'steps': []}}
+        new = {'s': {'id': 's', 'title': 'Renamed', 'steps': self.base[1:]}, 'new': {'id': 'new', 'steps': []}}
+        records = scenario_steps.diff_scenario_files(old, new)
+        self.assertEqual(records, [
+            {'scenario': 's', 'change': 'changed', 'fields': ['$.title']},
+            {'scenario': 's', 'change': 'removed', 'old': 0, 'new': None, 'type': 'send-message'},
+            {'scenario': 'gone', 'change': 'scenario-removed'},
+            {'scenario': 'new', 'change': 'scenario-added'},
+        ])
+        self.assertEqual(scenario_steps.diff_scenario_files(old, new, 's'), records[:2])
+
+    def merge(self, ours, theirs):
+        conflicts = []
+        merged = scenario_steps.merge_steps(self.base, ours, theirs, self.hasher, '$.s.steps', conflicts)
+        return merged, conflicts
+
+    def test_changes_from_both_sides_are_combined(self):
+        a, b, c, d, e = self.base
+        ours = [message(-1, content='ours'), a, b, c, d, e]
+        theirs = [a, self.edited(b, content='b2'), c, d, message(4500, content='theirs')]
+        merged, conflicts = self.merge(ours, theirs)
+        self.assertEqual(conflicts, [])
+        # e was removed on their side only; their insertion follows d, their anchor
+        self.assertEqual(contents(merged), ['ours', 'a', 'b2', 'c', 'd', 'theirs'])
+        self.assertIs(merged[1], a)  # steps taken from ours are the same objects
+
+    def test_their_insertion_goes_after_our_insertions_at_the_same_place(self):
+        a, b, c, d, e = self.base
+        merged, conflicts = self.merge([a, message(500, content='ours'), b, c, d, e],
+                                       [a, message(600, content='theirs'), b, c, d, e])
+        self.assertEqual(conflicts, [])
+        self.assertEqual(contents(merged), ['a', 'ours', 'theirs', 'b', 'c', 'd', 'e'])
+
+    def test_same_insertion_on_both_sides_is_kept_once(self):
+        a, b, c, d, e = self.base
+        x = message(500, content='x')
+        merged, conflicts = self.merge([a, x, b, c, d, e], [a, dict(x), b, c, d, e])
+        self.assertEqual(conflicts, [])
+        self.assertEqual(contents(merged), ['a', 'x', 'b', 'c', 'd', 'e'])
+
+    def test_their_move_is_applied(self):
+        a, b, c, d, e = self.base
+        merged, conflicts = self.merge(list(self.base), [a, c, d, b, e])
+        self.assertEqual(conflicts, [])
+        self.assertEqual(contents(merged), ['a', 'c', 'd', 'b', 'e'])
+
+    def test_conflicts(self):
+        a, b, c, d, e = self.base
+        ours = [a, self.edited(b, content='ours'), c, self.edited(d, content='d2'), e]
+        theirs = [a, self.edited(b, content='theirs'), c, e]
+        _, conflicts = self.merge(ours, theirs)
+        self.assertEqual(conflicts, ['$.s.steps[1]: modified on both sides',
+                                     '$.s.steps[3]: removed on one side, modified on the other'])
+
+    def test_same_edit_on_both_sides_is_not_a_conflict(self):
+        a, b, c, d, e = self.base
+        merged, conflicts = self.merge([a, self.edited(b, content='b2'), c, d, e],
+                                       [a, self.edited(b, content='b2'), c, d, e])
+        self.assertEqual(conflicts, [])
+        self.assertEqual(contents(merged), ['a', 'b2', 'c', 'd', 'e'])
+
+    def test_merge_files(self):
+        base = {'s': {'id': 's', 'title': 'S', 'steps': self.base}}
+        ours = {'s': {'id': 's', 'title': 'Ours', 'steps': self.base[:4]}}
+        theirs = {'s': {'id': 's', 'title': 'S', 'steps': self.base, 'tags': ['demo']},
+                  't': {'id': 't', 'steps': []}}
+        merged, conflicts = scenario_steps.merge_scenario_files(base, ours, theirs)
+        self.assertEqual(conflicts, [])
+        self.assertEqual(merged, {'s': {'id': 's', 'title': 'Ours', 'steps': self.base[:4], 'tags': ['demo']},
+                                  't': {'id': 't', 'steps': []}})
+
+        theirs = {'s': {'id': 's', 'title': 'Ours', 'steps': self.base}}
+        self.assertEqual(scenario_steps.merge_scenario_files(base, ours, theirs)[1], [])
+        theirs = {'s': {'id': 's', 'title': 'Theirs', 'steps': self.base}}
+        _, conflicts = scenario_steps.merge_scenario_files(base, ours, theirs)
+        self.assertEqual(conflicts, ['$.s.title: changed on both sides'])
+
+    def test_command_line(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = {}
+            for name, title in [('base', 'S'), ('ours', 'Ours'), ('theirs', 'Theirs'), ('other', 'S')]:
+                paths[name] = os.path.join(tmp, f'{name}.json')
+                with open(paths[name], 'w', encoding='utf-8') as f:
+                    json.dump({'s': {'id': 's', 'title': title, 'steps': self.base}}, f)
+
+            def run(*args):
+                with mock.patch.object(sys, 'argv', ['manage_steps.py', *args]), \
+                        contextlib.redirect_stdout(io.StringIO()) as output:
+                    return scenario_steps.main(), output.getvalue()
+
+            self.assertEqual(run('--diff', paths['base'], paths['other'])[0], 0)
+            status, output = run('--diff', paths['base'], paths['ours'], '--json')
+            self.assertEqual(status, 1)
+            self.assertEqual(json.loads(output)['fields'], ['$.title'])
+
+            with open(paths['ours'], 'rb') as f:
+                ours_before = f.read()
+            status, output = run('--merge', paths['base'], paths['ours'], paths['theirs'])
+            self.assertEqual(status, 1)
+            self.assertIn('Conflict: $.s.title: changed on both sides', output)
+            with open(paths['ours'], 'rb') as f:
+                self.assertEqual(f.read(), ours_before)
+
+            merged_path = os.path.join(tmp, 'merged.json')
+            status, _ = run('--merge', paths['base'], paths['ours'], paths['other'], '--output', merged_path)
+            self.assertEqual(status, 0)
+            with open(merged_path, 'r', encoding='utf-8') as f:
+                self.assertEqual(json.load(f)['s']['title'], 'Ours')
+
+
+if __name__ == '__main__':
+    unittest.main()